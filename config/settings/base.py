@@ -130,7 +130,8 @@ AUTH_PASSWORD_VALIDATORS = [
 # https://docs.djangoproject.com/en/dev/ref/settings/#middleware
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    # `SessionMiddleware` skipping survey pages, see `ranker.sessions`
+    'ranker.sessions.SessionFreeMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -138,6 +139,9 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# https://docs.djangoproject.com/en/dev/ref/settings/#message-storage
+MESSAGE_STORAGE = 'ranker.sessions.SessionFreeMessageStorage'
+
 # STATIC
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#static-root
@@ -243,3 +247,23 @@ INSTALLED_APPS += ['compressor']
 STATICFILES_FINDERS += ['compressor.finders.CompressorFinder']
 # Your stuff...
 # ------------------------------------------------------------------------------
+# With the survey closed all `/rank/*` URLs show the final "thank you" page.
+RANKER_SURVEY_CLOSED = env.bool('RANKER_SURVEY_CLOSED', default=True)
+# Engine choosing questions for new rankings, see `ranker.assignment`:
+# RandomAssignment, BalancedAssignment or StratifiedAssignment.
+RANKER_ASSIGNMENT_ENGINE = env(
+    'RANKER_ASSIGNMENT_ENGINE',
+    default='ranker.assignment.RandomAssignment',
+)
+# Compile all project templates when the process starts instead of on their
+# first render; only useful with the cached template loader, see
+# `ranker.warmup`.
+RANKER_PRECOMPILE_TEMPLATES = env.bool('RANKER_PRECOMPILE_TEMPLATES',
+                                       default=False)
+# Directory of the write-behind journal of stage submissions; when set, ranks
+# are saved by `apply_journal` command running in the background instead of
+# by the views, see `ranker.journal`.
+RANKER_JOURNAL_DIR = env('RANKER_JOURNAL_DIR', default='')
+# URL prefixes served without sessions (and with messages in cookies only),
+# see `ranker.sessions`.
+RANKER_SESSION_FREE_PATHS = ['/rank/']
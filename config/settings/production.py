@@ -26,9 +26,30 @@ CACHES = {
         #     # http://niwinz.github.io/django-redis/latest/#_memcached_exceptions_behavior
         #     'IGNORE_EXCEPTIONS': True,
         # }
-        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
-        'LOCATION': 'questions_ranker_cache',
-    }
+        # in-process LRU tier in front of a file-based tier shared by all
+        # workers, so cache hits don't query the database
+        'BACKEND': 'ranker.cache.TieredCache',
+        'LOCATION': env('DJANGO_CACHE_LOCATION',
+                        default='/var/tmp/questions_ranker_cache'),
+        'OPTIONS': {
+            'LOCAL_MAX_ENTRIES': env.int('DJANGO_CACHE_LOCAL_MAX_ENTRIES',
+                                         default=1000),
+            'LOCAL_TIMEOUT': env.int('DJANGO_CACHE_LOCAL_TIMEOUT', default=5),
+        },
+    },
+    # rendered static parts of pages (see `ranker.pages`); kept per process,
+    # so that fragments of old templates are gone after a deploy
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template_fragments',
+    },
+    # counters and versions shared by all workers, never evicted and with
+    # atomic `add` and `incr` (see `ranker.cache.StateCache`)
+    'state': {
+        'BACKEND': 'ranker.cache.StateCache',
+        'LOCATION': env('DJANGO_STATE_CACHE_LOCATION',
+                        default='/var/tmp/questions_ranker_state'),
+    },
 }
 
 # SECURITY
@@ -120,6 +141,9 @@ TEMPLATES[0]['OPTIONS']['loaders'] = [  # noqa F405
         ]
     ),
 ]
+# templates are compiled once per worker, at startup (see `ranker.warmup`)
+RANKER_PRECOMPILE_TEMPLATES = env.bool('RANKER_PRECOMPILE_TEMPLATES',
+                                       default=True)
 
 # EMAIL
 # ------------------------------------------------------------------------------
@@ -20,7 +20,15 @@ TEST_RUNNER = "django.test.runner.DiscoverRunner"
 CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": ""
-    }
+    },
+    "template_fragments": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "template_fragments",
+    },
+    "state": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "state",
+    },
 }
 
 # PASSWORDS
@@ -53,3 +61,4 @@ EMAIL_PORT = 1025
 
 # Your stuff...
 # ------------------------------------------------------------------------------
+RANKER_SURVEY_CLOSED = False
@@ -5,6 +5,7 @@ from django.contrib import admin
 from django.views.generic import TemplateView
 from django.views import defaults as default_views
 
+from ranker import api as ranker_api
 from ranker import views as ranker_views
 
 urlpatterns = [
@@ -32,12 +33,19 @@ urlpatterns = [
          TemplateView.as_view(template_name="pages/data_privacy_policy.html"),
          name="data_privacy_policy",
     ),
-    # Below matches all `/rank/*` requests, therefore overwrites other URLs;
-    # this way we can easily close the survey for responders.
-    re_path(r'^rank/',
-            TemplateView.as_view(template_name="ranker/thankyou2.html"),
-            name="thankyou",
-    ),
+]
+
+if settings.RANKER_SURVEY_CLOSED:
+    urlpatterns += [
+        # Below matches all `/rank/*` requests, therefore overwrites other
+        # URLs; this way we can easily close the survey for responders.
+        re_path(r'^rank/',
+                TemplateView.as_view(template_name="ranker/thankyou2.html"),
+                name="thankyou",
+        ),
+    ]
+
+urlpatterns += [
     path("rank/",
          TemplateView.as_view(template_name="pages/rank.html"),
          name="rank_page",
@@ -59,6 +67,12 @@ urlpatterns = [
         ranker_views.rank_demographic,
         name="rank_demographic",
     ),
+    # whole survey in JSON, for a single-page client
+    re_path(
+        r'^rank/(?P<hash_id>[a-z0-9]+)/api/$',
+        ranker_api.survey_api,
+        name="survey_api",
+    ),
     re_path(
         r'^rank/(?P<hash_id>[a-z0-9]+)/(?P<stage>\d+)/$',
         ranker_views.rank_stage,
@@ -1,14 +1,42 @@
+import numpy as np
 from django.contrib import admin
-from django.db.models import Sum, Count, Avg, Min, Max, StdDev, Q, F
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
+from django.utils.http import urlencode
 from django.utils.translation import ugettext_lazy as _
 from .models import (
     Category,
     Question,
     Ranking,
     QuestionSummary,
+    QuestionDemographicSummary,
+    QuestionRankSummary,
     RankingEntry,
     DrawEntry,
 )
+from .analytics import (
+    RANKS,
+    as_python,
+    category_counts,
+    importance_statistics,
+    summary_counts,
+)
+from .crosstab import DEMOGRAPHIC_FIELDS, get_crosstab
+from .export import csv_lines, export_rows, jsonl_lines
+from .summary import TOTAL_FIELD, count_field
+
+
+def add_statistics(objects, pks, counts):
+    """Set importance statistics computed from `counts` (count matrix of
+    `pks`) as attributes of `objects`."""
+    statistics = importance_statistics(counts)
+    row_of = {pk: i for i, pk in enumerate(pks.tolist())}
+    for obj in objects:
+        i = row_of.get(obj.pk)
+        for name, values in statistics.items():
+            value = None if i is None else as_python(values[i])
+            setattr(obj, name, value)
 
 
 @admin.register(Category)
@@ -64,6 +92,27 @@ class RankingAdmin(admin.ModelAdmin):
         'comp_research_involvement',
     ]
     inlines = [EntryInlineAdmin]
+    actions = ['export_csv', 'export_jsonl']
+
+    def export_csv(self, request, queryset):
+        response = StreamingHttpResponse(
+            csv_lines(export_rows(queryset)), content_type='text/csv',
+        )
+        response['Content-Disposition'] = 'attachment; filename="rankings.csv"'
+        return response
+    export_csv.short_description = _("Export entries of selected rankings "
+                                     "as CSV")
+
+    def export_jsonl(self, request, queryset):
+        response = StreamingHttpResponse(
+            jsonl_lines(export_rows(queryset)),
+            content_type='application/x-ndjson',
+        )
+        response['Content-Disposition'] = \
+            'attachment; filename="rankings.jsonl"'
+        return response
+    export_jsonl.short_description = _("Export entries of selected rankings "
+                                       "as JSON Lines")
 
 
 @admin.register(QuestionSummary)
@@ -85,31 +134,102 @@ class QuestionSummaryAdmin(admin.ModelAdmin):
         # gather rank names from field's choices
         ranks = [i[0] for i in RankingEntry.RANK_CHOICES]
         # dict comprehension building annotation data
-        # FIELD_count: Count with filter on `rankingentry__rank`
+        # FIELD_count: rank count from the materialized summary
         metrics = {
-            ('{}_count'.format(k)): Count(
-                'rankingentry__pk',
-                filter=Q(rankingentry__rank=k)
-            )
+            count_field(k): Coalesce(F('rank_summary__' + count_field(k)), 0)
             for k in ranks
         }
-        metrics['total_ranks'] = Count(
-            'rankingentry__pk',
-            filter=Q(rankingentry__rank__isnull=False),
-        )
+        metrics[TOTAL_FIELD] = Coalesce(F('rank_summary__' + TOTAL_FIELD), 0)
 
-        response.context_data['summary'] = (
+        summary = list(
             qs
             .select_related('category')
             .annotate(**metrics)
             .order_by('category', 'pk')
         )
+        questions, counts = summary_counts(
+            QuestionRankSummary.objects.filter(question__in=qs.values('pk'))
+        )
+        add_statistics(summary, questions, counts)
+        response.context_data['summary'] = summary
+
+        categories, counts = category_counts(questions, counts)
+        by_category = Category.objects.in_bulk(categories.tolist())
+        category_summary = [by_category[pk] for pk in categories.tolist()]
+        add_statistics(category_summary, categories, counts)
+        response.context_data['category_summary'] = category_summary
 
         response.context_data['title'] = _("Summary of questions")
 
         return response
 
 
+@admin.register(QuestionDemographicSummary)
+class QuestionDemographicSummaryAdmin(admin.ModelAdmin):
+    """Rank counts of questions among respondents who gave selected answer
+    to one of the demographic questions (`?field=...&value=...`)."""
+    change_list_template = 'admin/question_demographic_change_list.html'
+
+    def changelist_view(self, request, extra_context=None):
+        # the change list rejects unknown query parameters
+        request.GET = request.GET.copy()
+        field = request.GET.pop('field', [None])[-1]
+        value = request.GET.pop('value', [None])[-1]
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            pass
+        crosstab = get_crosstab()
+        if (field, value) not in crosstab.slot_index:
+            field = value = None
+
+        response = super().changelist_view(
+            request,
+            extra_context=extra_context,
+        )
+
+        try:
+            qs = response.context_data['cl'].queryset
+        except (AttributeError, KeyError):
+            return response
+
+        summary = list(
+            qs.select_related('category').order_by('category', 'pk')
+        )
+        pks = np.array([q.pk for q in summary], dtype=np.int_)
+        counts = crosstab.question_counts(pks.tolist(), field, value)
+        for q, row in zip(summary, counts):
+            for rank in RANKS:
+                setattr(q, count_field(rank), int(row[rank]))
+            setattr(q, TOTAL_FIELD, int(row[1:].sum()))
+        add_statistics(summary, pks, counts)
+
+        response.context_data['summary'] = summary
+        response.context_data['filters'] = self.filters(field, value)
+        response.context_data['title'] = _("Summary of questions by "
+                                           "respondents' answers")
+        return response
+
+    @staticmethod
+    def filters(selected_field, selected_value):
+        """Build (field label, [(value label, query string, selected)])
+        list of demographic filters."""
+        filters = [(_("All respondents"), [
+            (_("All"), '?', selected_field is None),
+        ])]
+        for field in DEMOGRAPHIC_FIELDS:
+            model_field = Ranking._meta.get_field(field)
+            filters.append((model_field.verbose_name, [
+                (
+                    label,
+                    '?' + urlencode({'field': field, 'value': value}),
+                    (field, value) == (selected_field, selected_value),
+                )
+                for value, label in model_field.choices
+            ]))
+        return filters
+
+
 @admin.register(DrawEntry)
 class DrawEntryAdmin(admin.ModelAdmin):
     readonly_fields = ['email', 'draw', 'paper']
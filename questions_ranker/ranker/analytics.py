@@ -0,0 +1,205 @@
+"""Vectorized statistics of question ranks.
+
+Integer-coded ranks (see `RankingEntry.RANK_CHOICES`) are kept in NumPy
+arrays, so that even millions of ranking entries take a few megabytes and
+every statistic is computed with a handful of array operations instead of
+Python loops.
+
+Most functions work on a *count matrix*: one row per question, one column per
+rank code, holding number of times the question received that rank.  It can
+be built from raw entries (`load_ranks` + `rank_counts`) or, much cheaper,
+from the materialized `QuestionRankSummary` table (`summary_counts`).
+
+Importance is measured on the ordinal scale 1 ("very unimportant") to 5
+("very important"); "I don't understand" answers and unranked entries are
+not on the scale and are left out of means and variances.
+"""
+from array import array
+
+import numpy as np
+
+from .models import Question, QuestionRankSummary, RankingEntry
+from .summary import count_field
+
+# ranks are stored as small integer codes already (0 is never used by ranks,
+# so it stands for entries not ranked yet)
+UNRANKED = 0
+RANK_CODES = {name: code for code, name in RankingEntry.RANK_NAMES.items()}
+RANKS = sorted(RankingEntry.RANK_NAMES)
+IMPORTANCE_CODES = np.array([
+    RankingEntry.VUNIMPORTANT,
+    RankingEntry.UNIMPORTANT,
+    RankingEntry.INDIFFERENT,
+    RankingEntry.IMPORTANT,
+    RankingEntry.VIMPORTANT,
+])
+IMPORTANCE_SCALE = np.arange(1, len(IMPORTANCE_CODES) + 1)
+DONT_UNDERSTAND = RankingEntry.DONT_UNDERSTAND
+CODES = max(RANKS) + 1
+# two-sided 95% quantile of the normal distribution
+Z_95 = 1.959963984540054
+
+
+def load_ranks(entries=None, chunk_size=10000):
+    """Load (question id, rank code) of `entries` (all ranking entries by
+    default) as two NumPy arrays.
+
+    Rows are streamed with `QuerySet.iterator()` into compact typed arrays,
+    so no Python object per entry is kept in memory."""
+    if entries is None:
+        entries = RankingEntry.objects.all()
+
+    question_ids = array('l')
+    codes = array('b')
+    rows = (
+        entries.order_by()
+               .values_list('question_id', 'rank')
+               .iterator(chunk_size=chunk_size)
+    )
+    for question_id, rank in rows:
+        question_ids.append(question_id)
+        codes.append(rank or UNRANKED)
+
+    return (np.frombuffer(question_ids, dtype=np.int_),
+            np.frombuffer(codes, dtype=np.int8))
+
+
+def rank_counts(question_ids, codes):
+    """Return sorted unique question ids and their count matrix."""
+    if not len(question_ids):
+        return question_ids, np.zeros((0, CODES), dtype=np.int_)
+
+    # question ids are small positive integers, so counting them directly
+    # in a table indexed by id is much faster than sorting (`np.unique`)
+    size = int(question_ids.max()) + 1
+    counts = np.bincount(question_ids * CODES + codes,
+                         minlength=size * CODES).reshape(size, CODES)
+    questions = np.flatnonzero(counts.any(axis=1))
+    return questions, counts[questions]
+
+
+def summary_counts(summaries=None):
+    """Return question ids and count matrix built from `QuestionRankSummary`
+    rows (all of them by default); unranked entries aren't counted there."""
+    if summaries is None:
+        summaries = QuestionRankSummary.objects.all()
+
+    fields = [count_field(rank) for rank in RANKS]
+    rows = np.array(
+        list(summaries.order_by('pk').values_list('pk', *fields)),
+        dtype=np.int_,
+    ).reshape(-1, len(fields) + 1)
+
+    counts = np.zeros((len(rows), CODES), dtype=np.int_)
+    counts[:, RANKS] = rows[:, 1:]
+    return rows[:, 0], counts
+
+
+def importance_statistics(counts):
+    """Compute per-row importance statistics of a count matrix.
+
+    Returns a dictionary of arrays: `n` (answers on the importance scale),
+    `mean`, `variance` (sample variance), `ci_low` and `ci_high` (normal
+    approximation 95% confidence interval of the mean) and
+    `dont_understand` (share of "I don't understand" answers).  Statistics
+    undefined for too few answers are NaN."""
+    scale = counts[:, IMPORTANCE_CODES].astype(float)
+    n = scale.sum(axis=1)
+    answered = n + counts[:, DONT_UNDERSTAND]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = scale @ IMPORTANCE_SCALE / n
+        squares = scale @ IMPORTANCE_SCALE ** 2
+        variance = (squares - n * mean ** 2) / (n - 1)
+        variance[n < 2] = np.nan
+        margin = Z_95 * np.sqrt(variance / n)
+        dont_understand = counts[:, DONT_UNDERSTAND] / answered
+
+    return {
+        'n': n.astype(np.int_),
+        'mean': mean,
+        'variance': variance,
+        'ci_low': mean - margin,
+        'ci_high': mean + margin,
+        'dont_understand': dont_understand,
+    }
+
+
+def bootstrap_ranks(counts, resamples=1000, seed=None):
+    """Estimate stability of question order by mean importance.
+
+    Answers of every question are resampled (with replacement) `resamples`
+    times and questions are ranked by resampled means, 1 being the most
+    important.  Returns a dictionary of arrays: `rank` (order by observed
+    means), `rank_low` and `rank_high` (2.5 and 97.5 percentile of
+    bootstrapped ranks).  Questions without answers are ranked last."""
+    random = np.random.RandomState(seed)
+    scale = counts[:, IMPORTANCE_CODES]
+    n = scale.sum(axis=1)
+
+    means = np.full((resamples, len(counts)), -np.inf)
+    for i in np.flatnonzero(n):
+        # resampling answers is the same as drawing their counts from
+        # multinomial distribution with observed frequencies
+        resampled = random.multinomial(n[i], scale[i] / n[i], size=resamples)
+        means[:, i] = resampled @ IMPORTANCE_SCALE / n[i]
+
+    ranks = order_ranks(means)
+    observed = importance_statistics(counts)['mean']
+    observed = np.where(np.isnan(observed), -np.inf, observed)
+    return {
+        'rank': order_ranks(observed[np.newaxis, :])[0],
+        'rank_low': np.percentile(ranks, 2.5, axis=0),
+        'rank_high': np.percentile(ranks, 97.5, axis=0),
+    }
+
+
+def order_ranks(means):
+    """Rank columns of every row of `means`, highest mean first (1-based);
+    ties are broken by column order."""
+    order = np.argsort(-means, axis=1, kind='stable')
+    ranks = np.empty_like(order)
+    rows = np.arange(means.shape[0])[:, np.newaxis]
+    ranks[rows, order] = np.arange(1, means.shape[1] + 1)
+    return ranks
+
+
+def group_counts(counts, groups):
+    """Sum count matrix rows by `groups` (array with one label per row);
+    returns sorted unique labels and their count matrix."""
+    labels, index = np.unique(groups, return_inverse=True)
+    grouped = np.zeros((len(labels), counts.shape[1]), dtype=counts.dtype)
+    np.add.at(grouped, index, counts)
+    return labels, grouped
+
+
+def category_counts(questions, counts):
+    """Sum count matrix of `questions` by question category; returns sorted
+    category ids and their count matrix."""
+    category_of = dict(Question.objects.values_list('pk', 'category_id'))
+    categories = np.array([category_of[pk] for pk in questions.tolist()],
+                          dtype=np.int_)
+    return group_counts(counts, categories)
+
+
+def question_statistics(questions, counts):
+    """Yield one dictionary of plain Python values per question, combining
+    its counts and importance statistics."""
+    statistics = importance_statistics(counts)
+    for i, question_id in enumerate(questions):
+        row = {'question_id': int(question_id)}
+        row.update({
+            count_field(rank): int(counts[i, rank]) for rank in RANKS
+        })
+        row.update({
+            name: as_python(values[i]) for name, values in statistics.items()
+        })
+        yield row
+
+
+def as_python(value):
+    """Convert NumPy scalar to `int` or `float`, NaN to `None`."""
+    if isinstance(value, np.integer):
+        return int(value)
+    value = float(value)
+    return None if np.isnan(value) else value
@@ -0,0 +1,250 @@
+"""JSON API of the survey, for a single-page survey client.
+
+`GET /rank/<hash_id>/api/` assigns questions on the first visit (like
+`rank_start`) and returns the whole survey of a respondent in one payload::
+
+    {
+        "hash_id": "abc",
+        "stage": 0,
+        "questions": {"2": [[entry id, question, rank], ...], "3": [...]},
+        "choices": {"rank": [[1, "Very unimportant"], ...],
+                    "email": {"draw": [[true, "Yes"], ...], ...},
+                    "demographic": {"teaching_students":
+                                    {"label": "...", "choices": [...]},
+                                    ...}}
+    }
+
+The response sets `csrftoken` cookie; POST requests must send its value in
+`X-CSRFToken` header.
+
+`POST` to the same URL (JSON body) submits any number of consecutive stages
+at once, e.g. everything in a single request, or the email and the first
+set of questions first and the rest later::
+
+    {
+        "email": {"email": "", "draw": false, "paper": false},
+        "ranks": {"<entry id>": 4, ...},
+        "demographic": {"teaching_students": 1, ...}
+    }
+
+Stages are validated with the same forms as the survey pages and saved in
+order, each advancing `Ranking.stage` like the pages do; stages which are
+already submitted are skipped, so a repeated request changes nothing.
+Stage 2 or 3 is submitted when `ranks` include any of its entries; ids of
+entries of other rankings (or not ids at all) are rejected.  The
+response has the current stage, and errors (with status 400) of the first
+invalid stage; stages before it are saved.
+"""
+import json
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.translation import get_language
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_http_methods
+
+from .crosstab import COMPLETED_STAGE
+from .forms import DrawEntryForm, RankingDemographicForm, RankingEntryFormset
+from .journal import apply_pending
+from .models import DrawEntry, Ranking, RankingEntry
+from .summary import rank_changes, update_summary
+from .views import assign_questions, get_started_ranking
+
+# entries of stage N (see `assignment_entries`) are ranked in survey stage N+1
+RANK_STAGES = (2, 3)
+# language -> choices payload, it only depends on the code
+CHOICES = {}
+
+
+def field_choices(model, name):
+    return [[value, str(label)]
+            for value, label in model._meta.get_field(name).choices]
+
+
+def survey_choices():
+    """Return choices of all survey questions, labels in current
+    language."""
+    language = get_language()
+    if language not in CHOICES:
+        CHOICES[language] = {
+            'rank': field_choices(RankingEntry, 'rank'),
+            'email': {
+                name: field_choices(DrawEntry, name)
+                for name in ('draw', 'paper')
+            },
+            'demographic': {
+                name: {
+                    'label': str(Ranking._meta.get_field(name).verbose_name),
+                    'choices': field_choices(Ranking, name),
+                }
+                for name in RankingDemographicForm.Meta.fields
+            },
+        }
+    return CHOICES[language]
+
+
+def survey_payload(ranking):
+    questions = {str(stage): [] for stage in RANK_STAGES}
+    entries = (
+        ranking.rankingentry_set.order_by('pk')
+                                .values_list('pk', 'stage',
+                                             'question__content', 'rank')
+    )
+    for pk, stage, content, rank in entries:
+        questions[str(stage + 1)].append([pk, content, rank])
+    return {
+        'hash_id': ranking.hash_id,
+        'stage': ranking.stage,
+        'questions': questions,
+        'choices': survey_choices(),
+    }
+
+
+def formset_data(entries, ranks):
+    """Build POST data of the stage formset of `entries` ranked with `ranks`
+    (a dictionary of entry id (string) -> rank)."""
+    data = {
+        'form-TOTAL_FORMS': len(entries),
+        'form-INITIAL_FORMS': len(entries),
+        'form-MIN_NUM_FORMS': 0,
+        'form-MAX_NUM_FORMS': 0,
+    }
+    for i, entry in enumerate(entries):
+        data['form-{}-id'.format(i)] = entry.pk
+        data['form-{}-rank'.format(i)] = ranks.get(str(entry.pk), '')
+    return data
+
+
+def form_errors(form):
+    return {field: list(errors) for field, errors in form.errors.items()}
+
+
+def formset_errors(formset):
+    errors = {
+        str(form.instance.pk): list(form.errors['rank'])
+        for form in formset.forms if 'rank' in form.errors
+    }
+    if formset.non_form_errors():
+        errors['__all__'] = list(formset.non_form_errors())
+    return errors
+
+
+# Every `submit_*` function returns a dictionary of errors of an invalid
+# submission, or whether the stage was advanced (it's not when it was
+# submitted concurrently).
+
+def submit_email(ranking, data):
+    form = DrawEntryForm(data)
+    if not form.is_valid():
+        return form_errors(form)
+    if not Ranking.objects.advance_stage(ranking.pk, 1):
+        return False
+    form.save()
+    return True
+
+
+def submit_ranks(ranking, stage, ranks):
+    entries = ranking.rankingentry_set.filter(stage=stage - 1).order_by('pk')
+    # validation overwrites ranks of the entries
+    previous = [(e.pk, e.question_id, e.rank) for e in entries]
+    formset = RankingEntryFormset(formset_data(entries, ranks),
+                                  queryset=entries)
+    if not formset.is_valid():
+        return formset_errors(formset)
+    if not Ranking.objects.advance_stage(ranking.pk, stage):
+        return False
+    ranks = formset.ranks()
+    entries.set_ranks(ranks)
+    update_summary(rank_changes(previous, ranks))
+    return True
+
+
+def submit_demographic(ranking, data):
+    form = RankingDemographicForm(data, instance=ranking)
+    if not form.is_valid():
+        return form_errors(form)
+    return Ranking.objects.advance_stage(ranking.pk, COMPLETED_STAGE, **{
+        name: getattr(form.instance, name)
+        for name in form.changed_data if name in form._meta.fields
+    })
+
+
+def entry_stages(ranking):
+    """Return dictionary mapping primary keys (strings, like keys of
+    `ranks` in the payload) of entries of `ranking` to their stages."""
+    return {str(pk): stage for pk, stage in
+            ranking.rankingentry_set.values_list('pk', 'stage')}
+
+
+def stage_submissions(ranking, payload, entries):
+    """Yield (stage, submit function) of stages sent in `payload`, in
+    order; `entries` are stages of entries (see `entry_stages`)."""
+    if 'email' in payload:
+        yield 1, lambda: submit_email(ranking, payload['email'])
+
+    ranks = payload.get('ranks', {})
+    stages = {entries[pk] for pk in ranks}
+    for stage in RANK_STAGES:
+        if stage - 1 in stages:
+            yield stage, lambda stage=stage: submit_ranks(ranking, stage,
+                                                          ranks)
+
+    if 'demographic' in payload:
+        yield COMPLETED_STAGE, lambda: submit_demographic(
+            ranking, payload['demographic'])
+
+
+@require_http_methods(['GET', 'POST'])
+# the client sends the token back in `X-CSRFToken` header of POST requests
+@ensure_csrf_cookie
+def survey_api(request, hash_id):
+    if request.method == "GET":
+        ranking = get_started_ranking(hash_id)
+        if not ranking.has_entries:
+            assign_questions(ranking)
+        return JsonResponse(survey_payload(ranking))
+
+    try:
+        payload = json.loads(request.body.decode())
+        if not isinstance(payload, dict) or not all(
+                isinstance(payload.get(section, {}), dict)
+                for section in ('email', 'ranks', 'demographic')):
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': "Invalid JSON payload."}, status=400)
+
+    ranking = get_object_or_404(Ranking, hash_id=hash_id)
+    # the API writes directly, after submissions from the write-behind
+    # journal
+    apply_pending(ranking)
+
+    entries = entry_stages(ranking)
+    unknown = [pk for pk in payload.get('ranks', {}) if pk not in entries]
+    if unknown:
+        return JsonResponse({
+            'stage': ranking.stage,
+            'errors': {pk: ["Unknown entry."] for pk in unknown},
+        }, status=400)
+
+    for stage, submit in stage_submissions(ranking, payload, entries):
+        if stage <= ranking.stage:
+            # already submitted
+            continue
+        if stage != ranking.stage + 1:
+            return JsonResponse({
+                'stage': ranking.stage,
+                'errors': {'__all__': ["Stage {} is missing.".format(
+                    ranking.stage + 1)]},
+            }, status=400)
+
+        result = submit()
+        if isinstance(result, dict):
+            # stages saved so far stay saved
+            return JsonResponse({'stage': ranking.stage, 'errors': result},
+                                status=400)
+        elif result:
+            ranking.stage = stage
+        else:
+            ranking.refresh_from_db(fields=['stage'])
+
+    return JsonResponse({'stage': ranking.stage})
@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class RankerConfig(AppConfig):
     name = 'ranker'
+
+    def ready(self):
+        import ranker.signals  # noqa F401
+
+        if settings.RANKER_PRECOMPILE_TEMPLATES:
+            from ranker.warmup import precompile_templates
+            precompile_templates()
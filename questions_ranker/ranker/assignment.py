@@ -0,0 +1,279 @@
+"""Assignment of questions to new rankings.
+
+The engine used by `rank_start` is selected with `RANKER_ASSIGNMENT_ENGINE`
+setting (a dotted path to one of the classes below, or a compatible one).
+Every engine exposes a single method, `assign(count)`, which returns a list
+of `count` distinct active question ids; first half goes to stage 1, second
+half to stage 2.
+"""
+import heapq
+import random
+from array import array
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils.module_loading import import_string
+
+from .cache import state_cache
+from .models import Question, Ranking, RankingEntry
+from .sampling import ActiveQuestionIds, active_question_ids, sample_ids
+
+DEFAULT_ASSIGNMENT_ENGINE = 'ranker.assignment.RandomAssignment'
+QUESTIONS_PER_STAGE = 20
+# balanced engines pick the least exposed questions among this many random
+# candidates per assigned question, instead of looking at all questions
+CANDIDATES_PER_QUESTION = 4
+
+
+class ExposureCounters:
+    """Number of rankings every question was assigned to, kept in the state
+    cache (see `ranker.cache.StateCache`).
+
+    Counters are incremented (`cache.incr`) once an assignment is committed,
+    so no `RankingEntry` rows need to be counted on the request path.  The
+    increments are atomic only if the cache backend makes them so
+    (`StateCache` does, the file-based backend doesn't); otherwise concurrent
+    assignments may lose some, which only makes balancing less exact.  When
+    the cache doesn't hold the counters yet (first use, flush, eviction of the
+    marker key) they are rebuilt from `RankingEntry` table in a single
+    query."""
+    key_prefix = 'ranker:exposure:'
+    seeded_key = 'ranker:exposure:seeded'
+
+    def key(self, question_id):
+        return '{}{}'.format(self.key_prefix, question_id)
+
+    def rebuild(self):
+        counts = (
+            RankingEntry.objects.order_by()
+                                .values_list('question_id')
+                                .annotate(Count('pk'))
+        )
+        cache = state_cache()
+        cache.set_many({
+            self.key(question_id): count for question_id, count in counts
+        }, timeout=None)
+        cache.set(self.seeded_key, True, timeout=None)
+
+    def get_many(self, question_ids):
+        """Return dictionary of exposure counts for given questions."""
+        cache = state_cache()
+        if not cache.get(self.seeded_key):
+            self.rebuild()
+
+        keys = {self.key(pk): pk for pk in question_ids}
+        return {
+            keys[key]: count for key, count in cache.get_many(keys).items()
+        }
+
+    def incr_many(self, question_ids):
+        cache = state_cache()
+        for pk in question_ids:
+            key = self.key(pk)
+            try:
+                cache.incr(key)
+            except ValueError:
+                # missing key: question has not been assigned yet
+                if not cache.add(key, 1, timeout=None):
+                    cache.incr(key)
+
+
+exposure_counters = ExposureCounters()
+
+
+def least_exposed(question_ids, counts, k):
+    """Pick `k` question ids with the lowest exposure counts, breaking ties
+    at random."""
+    return heapq.nsmallest(
+        k, question_ids, key=lambda pk: (counts.get(pk, 0), random.random()),
+    )
+
+
+def allocate(sizes, count):
+    """Split `count` slots between strata proportionally to their `sizes`
+    (dictionary stratum -> size) using largest remainder method."""
+    total = sum(sizes.values())
+    if count > total:
+        raise ValueError("Not enough questions to choose from.")
+
+    quotas = {}
+    remainders = []
+    for stratum, size in sizes.items():
+        exact = count * size / total
+        quotas[stratum] = int(exact)
+        remainders.append((exact - int(exact), random.random(), stratum))
+
+    # hand out slots lost to rounding down, largest remainders first
+    missing = count - sum(quotas.values())
+    for _, _, stratum in sorted(remainders, reverse=True)[:missing]:
+        quotas[stratum] += 1
+    return quotas
+
+
+class ActiveQuestionsByCategory(ActiveQuestionIds):
+    """Versioned snapshot of active question ids grouped by category id."""
+
+    def load_ids(self):
+        strata = defaultdict(lambda: array('l'))
+        questions = (
+            Question.objects.filter(active=True)
+                            .order_by('pk')
+                            .values_list('pk', 'category_id')
+                            .iterator()
+        )
+        for pk, category_id in questions:
+            strata[category_id].append(pk)
+        return dict(strata)
+
+
+active_questions_by_category = ActiveQuestionsByCategory()
+
+
+class RandomAssignment:
+    """Uniformly random assignment."""
+
+    def assign(self, count):
+        return active_question_ids.sample(count)
+
+
+def candidates(ids, count):
+    """Draw random candidates for `count` questions out of `ids`."""
+    return sample_ids(ids, min(len(ids), CANDIDATES_PER_QUESTION * count))
+
+
+class BalancedAssignment:
+    """Assign least exposed questions first, so that all questions reach
+    the same number of responses with as few respondents as possible.
+
+    Only a random sample of candidates (`CANDIDATES_PER_QUESTION` per
+    assigned question) is compared, so the cost of an assignment doesn't
+    grow with the number of questions."""
+    counters = exposure_counters
+
+    def __init__(self):
+        # assignments of this engine not committed yet, e.g. earlier rankings
+        # of the same `preassign_questions` chunk
+        self.uncommitted = Counter()
+
+    def exposure(self, question_ids):
+        """Return dictionary of exposure counts for given questions."""
+        counts = self.counters.get_many(question_ids)
+        for pk in question_ids:
+            if self.uncommitted[pk]:
+                counts[pk] = counts.get(pk, 0) + self.uncommitted[pk]
+        return counts
+
+    def choose(self, count):
+        ids = active_question_ids.get()
+        if count > len(ids):
+            raise ValueError("Not enough questions to choose from.")
+        ids = candidates(ids, count)
+        return least_exposed(ids, self.exposure(ids), count)
+
+    def assign(self, count):
+        question_ids = self.choose(count)
+        # mix order, so that both stages get similarly exposed questions
+        random.shuffle(question_ids)
+        self.uncommitted.update(question_ids)
+        transaction.on_commit(lambda: self.committed(question_ids))
+        return question_ids
+
+    def committed(self, question_ids):
+        self.counters.incr_many(question_ids)
+        self.uncommitted -= Counter(question_ids)
+
+
+class StratifiedAssignment(BalancedAssignment):
+    """Balanced assignment where every ranking gets questions from each
+    category in proportion to category's share of active questions."""
+
+    def choose(self, count):
+        strata = active_questions_by_category.get()
+        quotas = allocate(
+            {category: len(ids) for category, ids in strata.items()},
+            count,
+        )
+        strata = {
+            category: candidates(strata[category], quota)
+            for category, quota in quotas.items() if quota
+        }
+        counts = self.exposure(
+            [pk for ids in strata.values() for pk in ids]
+        )
+
+        question_ids = []
+        for category, ids in strata.items():
+            question_ids.extend(least_exposed(ids, counts, quotas[category]))
+        return question_ids
+
+
+def get_assignment_engine():
+    """Return instance of the engine configured in settings."""
+    path = getattr(settings, 'RANKER_ASSIGNMENT_ENGINE',
+                   DEFAULT_ASSIGNMENT_ENGINE)
+    return import_string(path)()
+
+
+def assignment_entries(ranking_id, question_ids):
+    """Build (unsaved) entries assigning questions to both ranking stages."""
+    return [
+        RankingEntry(
+            ranking_id=ranking_id,
+            question_id=question_id,
+            rank=None,
+            stage=1 + i // QUESTIONS_PER_STAGE,
+        )
+        for i, question_id in enumerate(question_ids)
+    ]
+
+
+def preassign_questions(rankings=None, chunk_size=1000, engine=None):
+    """Assign questions to every ranking (from `rankings` queryset, all
+    rankings by default) that has none yet.
+
+    Rankings are processed in chunks of `chunk_size` ordered by primary key,
+    each chunk in its own transaction with a single `bulk_create`, so memory
+    use doesn't depend on the number of rankings.  Rankings of a chunk are
+    locked while it's assigned, and ones assigned concurrently (by their
+    first visit) are skipped.  Yields number of rankings processed after
+    each chunk."""
+    if rankings is None:
+        rankings = Ranking.objects.all()
+    if engine is None:
+        engine = get_assignment_engine()
+
+    unassigned = (
+        rankings.filter(rankingentry__isnull=True)
+                .order_by('pk')
+                .values_list('pk', flat=True)
+    )
+    processed = 0
+    last_pk = 0
+    while True:
+        ranking_ids = list(unassigned.filter(pk__gt=last_pk)[:chunk_size])
+        if not ranking_ids:
+            break
+
+        with transaction.atomic():
+            # like `ranker.views.assign_questions`: lock the rankings, so
+            # that first visits wait, and skip the ones which got their
+            # questions from a visit in the meantime
+            locked = list(
+                Ranking.objects.select_for_update()
+                               .filter(pk__in=ranking_ids)
+                               .order_by('pk')
+                               .values_list('pk', flat=True)
+            )
+            RankingEntry.objects.bulk_create([
+                entry
+                for ranking_id in unassigned.filter(pk__in=locked)
+                for entry in assignment_entries(
+                    ranking_id, engine.assign(2 * QUESTIONS_PER_STAGE),
+                )
+            ])
+
+        processed += len(ranking_ids)
+        last_pk = ranking_ids[-1]
+        yield processed
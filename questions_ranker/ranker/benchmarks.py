@@ -0,0 +1,861 @@
+"""Micro-benchmarks of the ranker hot paths.
+
+Run with `python manage.py ranker_benchmark <name>`.  Every benchmark returns
+a list of flat dictionaries (one per measured case), so the results can be
+printed as a table or dumped as JSON and compared between releases.
+
+Benchmarks which need data create it inside a transaction that's rolled back
+at the end, so they can be run against any database."""
+import csv
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import tracemalloc
+import uuid
+from array import array
+from contextlib import contextmanager
+
+import numpy as np
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef
+from django.forms import modelformset_factory
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+from django.template.loader import render_to_string
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from questions_ranker.users.models import User
+
+from .analytics import (
+    CODES,
+    bootstrap_ranks,
+    group_counts,
+    importance_statistics,
+    rank_counts,
+)
+from .assignment import assignment_entries
+from .cache import STATE_CACHE
+from .forms import (
+    RANK_CHOICES,
+    RankingDemographicForm,
+    RankingEntryForm,
+    RankingEntryFormset,
+    ranking_rows,
+)
+from .importing import (
+    QUESTION_COLUMNS,
+    generate_hash_ids,
+    hash_id_lines,
+    import_hash_ids,
+    import_questions,
+)
+from .journal import Journal, apply_journal
+from .models import Category, Question, Ranking, RankingEntry
+from .pages import FRAGMENT_CACHE
+from .sampling import (
+    ActiveQuestionIds,
+    active_question_ids,
+    invalidate_active_question_ids,
+)
+from .templatetags import navigation
+from .warmup import page_contexts, precompile_templates, warm_up_pages
+
+BENCHMARKS = {}
+DEMOGRAPHIC_FIELDS = RankingDemographicForm.Meta.fields
+
+
+def benchmark(name):
+    """Register decorated function as benchmark `name`."""
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def time_per_call(func, repeat):
+    """Return average wall time (in seconds) of a single `func()` call."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction that's always rolled back."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+class PreloadedQuestionIds(ActiveQuestionIds):
+    """Active question ids snapshot that never touches the database."""
+
+    def __init__(self, ids):
+        super().__init__()
+        self.ids = ids
+
+    def load_ids(self):
+        return self.ids
+
+
+@benchmark('sampler')
+def sampler_benchmark(repeat=None, sizes=(100, 10 ** 4, 10 ** 6)):
+    """Compare cost of drawing 2*20 question ids for growing question banks:
+    the versioned sampler vs. `random.sample(list(ids), 40)`."""
+    repeat = repeat or 1000
+    results = []
+    for size in sizes:
+        ids = array('l', range(1, size + 1))
+        sampler = PreloadedQuestionIds(ids)
+        sampler.get()  # warm up the snapshot
+        # the old code path used to materialize all ids on every request
+        legacy_repeat = max(1, min(repeat, 10 ** 7 // size))
+
+        results.append({
+            'size': size,
+            'sampler_us': time_per_call(lambda: sampler.sample(2*20),
+                                        repeat) * 10 ** 6,
+            'legacy_us': time_per_call(lambda: random.sample(list(ids), 2*20),
+                                       legacy_repeat) * 10 ** 6,
+        })
+    return results
+
+
+def demographic_data():
+    """POST data answering all demographic questions."""
+    return {
+        field: Ranking._meta.get_field(field).choices[0][0]
+        for field in DEMOGRAPHIC_FIELDS
+    }
+
+
+def stage_data(hash_id, stage, rank=RankingEntry.IMPORTANT):
+    """POST data ranking all questions of given ranking stage."""
+    entries = list(
+        RankingEntry.objects.filter(ranking__hash_id=hash_id, stage=stage - 1)
+                            .order_by('pk')
+                            .values_list('pk', flat=True)
+    )
+    data = {
+        'form-TOTAL_FORMS': len(entries),
+        'form-INITIAL_FORMS': len(entries),
+        'form-MIN_NUM_FORMS': 0,
+        'form-MAX_NUM_FORMS': 0,
+    }
+    for i, pk in enumerate(entries):
+        data['form-{}-id'.format(i)] = pk
+        data['form-{}-rank'.format(i)] = rank
+    return data
+
+
+def respondent_journey(hash_id):
+    """Yield consecutive requests of a respondent completing the survey,
+    including rejected (invalid) submissions.
+
+    Every step is a dictionary with `view`, `stage`, `method`, `valid`, `url`
+    and `data` keys.  Steps are generated lazily, because POST data depends
+    on what previous requests stored in the database."""
+    def step(view, method, url, data=None, stage=None, valid=True):
+        return dict(view=view, stage=stage, method=method, valid=valid,
+                    url=url, data=data)
+
+    yield step('home', 'GET', reverse('home'))
+
+    url = reverse('rank_start', args=[hash_id])
+    yield step('rank_start', 'GET', url, stage=0)
+
+    url = reverse('rank_email', args=[hash_id])
+    yield step('rank_email', 'GET', url, stage=1)
+    yield step('rank_email', 'POST', url, stage=1, valid=False,
+               data={'email': '', 'draw': 'True', 'paper': 'False'})
+    yield step('rank_email', 'POST', url, stage=1,
+               data={'email': '', 'draw': 'False', 'paper': 'False'})
+
+    for stage in (2, 3):
+        url = reverse('rank_stage', args=[hash_id, stage])
+        yield step('rank_stage', 'GET', url, stage=stage)
+        yield step('rank_stage', 'POST', url, stage=stage, valid=False,
+                   data=stage_data(hash_id, stage, rank=''))
+        yield step('rank_stage', 'POST', url, stage=stage,
+                   data=stage_data(hash_id, stage))
+
+    url = reverse('rank_demographic', args=[hash_id])
+    yield step('rank_demographic', 'GET', url, stage=4)
+    yield step('rank_demographic', 'POST', url, stage=4, valid=False,
+               data={})
+    yield step('rank_demographic', 'POST', url, stage=4,
+               data=demographic_data())
+
+    url = reverse('rank_start', args=[hash_id])
+    yield step('rank_start', 'GET', url, stage=5)
+
+
+def run_journey(client, hash_id):
+    """Walk `hash_id` through the survey; return one record per request
+    with number of SQL queries and wall time."""
+    records = []
+    for step in respondent_journey(hash_id):
+        request = getattr(client, step['method'].lower())
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = request(step['url'], step['data'] or {})
+            elapsed = time.perf_counter() - start
+
+        records.append({
+            'view': step['view'],
+            'stage': step['stage'],
+            'method': step['method'],
+            'valid': step['valid'],
+            'status': response.status_code,
+            'queries': len(queries),
+            'time_ms': elapsed * 1000,
+        })
+    return records
+
+
+@benchmark('views')
+def views_benchmark(repeat=None):
+    """Complete the survey `repeat` times with fresh rankings; report median
+    wall time and number of queries of every request."""
+    if settings.RANKER_SURVEY_CLOSED:
+        raise ValueError("Survey is closed (RANKER_SURVEY_CLOSED).")
+    if Question.objects.filter(active=True).count() < 2*20:
+        raise ValueError("At least 40 active questions are needed.")
+
+    repeat = repeat or 20
+    journeys = []
+    with override_settings(ALLOWED_HOSTS=['testserver']), rolled_back():
+        for _ in range(repeat):
+            ranking = Ranking.objects.create(hash_id=uuid.uuid4().hex)
+            journeys.append(run_journey(Client(), ranking.hash_id))
+
+    results = []
+    for records in zip(*journeys):
+        result = dict(records[0])
+        result['time_ms'] = statistics.median(r['time_ms'] for r in records)
+        results.append(result)
+    return results
+
+
+@benchmark('stage_render')
+def stage_render_benchmark(repeat=None):
+    """Time rendering of a stage page with 20 questions, both fresh and
+    redisplayed with validation errors, and the cost of building a formset
+    class (which used to happen on every request)."""
+    repeat = repeat or 50
+    question_ids = list(
+        Question.objects.filter(active=True).values_list('pk', flat=True)[:20]
+    )
+    if len(question_ids) < 20:
+        raise ValueError("At least 20 active questions are needed.")
+
+    request = RequestFactory().get('/')
+
+    def render(data=None):
+        entries = (
+            RankingEntry.objects.filter(ranking=ranking, stage=1)
+                                .select_related('question')
+                                .order_by('pk')
+        )
+        formset = RankingEntryFormset(data, queryset=entries)
+        if data is not None:
+            formset.is_valid()
+        context = {
+            'formset': formset,
+            'rows': ranking_rows(formset),
+            'rank_choices': RANK_CHOICES,
+            'stage': 2,
+        }
+        return render_to_string('ranker/stage.html', context, request)
+
+    with rolled_back():
+        ranking = Ranking.objects.create(hash_id=uuid.uuid4().hex, stage=1)
+        RankingEntry.objects.bulk_create(
+            assignment_entries(ranking.pk, question_ids),
+        )
+        invalid_data = stage_data(ranking.hash_id, 2, rank='')
+
+        return [
+            {
+                'case': 'unbound',
+                'time_ms': time_per_call(render, repeat) * 1000,
+            },
+            {
+                'case': 'invalid',
+                'time_ms': time_per_call(lambda: render(invalid_data),
+                                         repeat) * 1000,
+            },
+            {
+                'case': 'formset_factory',
+                'time_ms': time_per_call(
+                    lambda: modelformset_factory(
+                        RankingEntry, form=RankingEntryForm,
+                        extra=0, max_num=0,
+                    ),
+                    repeat,
+                ) * 1000,
+            },
+        ]
+
+
+@benchmark('analytics')
+def analytics_benchmark(repeat=None, sizes=(10 ** 4, 10 ** 6, 10 ** 7),
+                        questions=500):
+    """Time vectorized statistics over synthetic integer-coded entries:
+    counting, importance statistics, per-category breakdown and 1000
+    bootstrap resamples."""
+    repeat = repeat or 3
+    random = np.random.RandomState(0)
+    results = []
+    for size in sizes:
+        question_ids = random.randint(1, questions + 1, size=size)
+        codes = random.randint(0, CODES, size=size).astype(np.int8)
+        categories = random.randint(1, 10, size=questions)
+        counts = rank_counts(question_ids, codes)[1]
+
+        results.append({
+            'size': size,
+            'counts_ms': time_per_call(
+                lambda: rank_counts(question_ids, codes), repeat) * 1000,
+            'statistics_ms': time_per_call(
+                lambda: importance_statistics(counts), repeat) * 1000,
+            'categories_ms': time_per_call(
+                lambda: group_counts(counts, categories), repeat) * 1000,
+            'bootstrap_ms': time_per_call(
+                lambda: bootstrap_ranks(counts, seed=0), repeat) * 1000,
+        })
+    return results
+
+
+# old (before integer codes) and current way of storing choices
+ENCODINGS = {
+    'text': {
+        'rank': list(RankingEntry.RANK_NAMES.values()),
+        'answer': ['none', 'tens', 'hundreds', 'primary', 'quarter',
+                   'quertertothree', 'morethanthree', 'occasional'],
+        'type': 'varchar(255)',
+    },
+    'integer': {
+        'rank': list(RankingEntry.RANK_NAMES),
+        'answer': [1, 2, 3, 4, 5],
+        'type': 'smallint',
+    },
+}
+
+
+def encoding_database(path, encoding, size, index):
+    """Create SQLite database with `size` entries (and 1 ranking per 40
+    entries) storing ranks and demographic answers with given encoding."""
+    spec = ENCODINGS[encoding]
+    db = sqlite3.connect(path)
+    db.execute(
+        'CREATE TABLE ranking (id integer PRIMARY KEY, {})'.format(', '.join(
+            '{} {}'.format(field, spec['type'])
+            for field in DEMOGRAPHIC_FIELDS
+        ))
+    )
+    db.execute(
+        'CREATE TABLE entry (id integer PRIMARY KEY, ranking_id integer, '
+        'question_id integer, rank {}, stage integer)'.format(spec['type'])
+    )
+    rankings = size // 40 or 1
+    db.executemany(
+        'INSERT INTO ranking VALUES (?, {})'.format(
+            ', '.join('?' * len(DEMOGRAPHIC_FIELDS))),
+        (
+            [pk] + [random.choice(spec['answer']) for _ in DEMOGRAPHIC_FIELDS]
+            for pk in range(1, rankings + 1)
+        ),
+    )
+    db.executemany(
+        'INSERT INTO entry VALUES (?, ?, ?, ?, ?)',
+        (
+            (pk, pk % rankings + 1, random.randint(1, 500),
+             random.choice(spec['rank']), 1 + pk % 2)
+            for pk in range(1, size + 1)
+        ),
+    )
+    if index:
+        db.execute('CREATE INDEX entry_question_rank '
+                   'ON entry (question_id, rank)')
+        db.execute('CREATE INDEX entry_ranking_stage '
+                   'ON entry (ranking_id, stage)')
+    db.commit()
+    return db
+
+
+@benchmark('encoding')
+def encoding_benchmark(repeat=None, sizes=(10 ** 5, 10 ** 6)):
+    """Compare database size and speed of rank counting (the aggregate
+    behind the question summary) with ranks and demographic answers stored
+    as strings (old schema) and as small integers, with and without the
+    (question, rank) and (ranking, stage) indexes.
+
+    Uses standalone SQLite databases in a temporary directory."""
+    repeat = repeat or 5
+    count_ranks = ('SELECT question_id, rank, COUNT(*) FROM entry '
+                   'GROUP BY question_id, rank')
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            for encoding, index in [('text', False), ('integer', False),
+                                    ('integer', True)]:
+                path = os.path.join(directory, '{}-{}-{}.db'.format(
+                    size, encoding, index))
+                db = encoding_database(path, encoding, size, index)
+                results.append({
+                    'size': size,
+                    'encoding': encoding,
+                    'indexes': index,
+                    'file_mb': os.path.getsize(path) / 2 ** 20,
+                    'count_ranks_ms': time_per_call(
+                        lambda: db.execute(count_ranks).fetchall(),
+                        repeat) * 1000,
+                })
+                db.close()
+    return results
+
+
+def generate_questions(count):
+    """Make sure there are at least `count` active questions."""
+    missing = count - Question.objects.filter(active=True).count()
+    if missing <= 0:
+        return
+
+    author = User.objects.create(username='benchmark-' + uuid.uuid4().hex)
+    category = Category.objects.create(name='Benchmark', author=author)
+    Question.objects.bulk_create([
+        Question(content='Question {}'.format(i), category=category,
+                 author=author)
+        for i in range(missing)
+    ])
+    # bulk inserts don't send signals
+    invalidate_active_question_ids()
+
+
+def generate_rankings(count, chunk_size=1000):
+    """Create `count` rankings in random stages, with assigned questions;
+    ranked entries get random ranks.  Meant to be used in `rolled_back()`."""
+    generate_questions(2*20)
+    ranks = list(RankingEntry.RANK_NAMES)
+    for start in range(0, count, chunk_size):
+        stages = [random.randint(0, 4)
+                  for _ in range(min(chunk_size, count - start))]
+        Ranking.objects.bulk_create([
+            Ranking(hash_id=uuid.uuid4().hex, stage=stage)
+            for stage in stages
+        ])
+        rankings = Ranking.objects.order_by('-pk')[:len(stages)]
+
+        entries = []
+        for ranking in rankings:
+            for entry in assignment_entries(ranking.pk,
+                                            active_question_ids.sample(2*20)):
+                if entry.stage < ranking.stage:
+                    entry.rank = random.choice(ranks)
+                entries.append(entry)
+        RankingEntry.objects.bulk_create(entries)
+
+
+def hot_queries(ranking):
+    """Return (name, queryset) pairs of the queries run on every survey
+    request for given ranking, and of the heaviest background ones."""
+    stage = ranking.stage
+    return [
+        ('ranking by hash_id and stage', Ranking.objects.filter(
+            hash_id=ranking.hash_id, stage=stage,
+        )),
+        ('ranking with assignment check', Ranking.objects.annotate(
+            has_entries=Exists(
+                RankingEntry.objects.filter(ranking=OuterRef('pk')),
+            ),
+        ).filter(hash_id=ranking.hash_id)),
+        ('stage entries', RankingEntry.objects.filter(
+            ranking=ranking, stage=stage,
+        ).select_related('question', 'question__category').order_by('pk')),
+        ('completed rankings since', Ranking.objects.filter(
+            stage__gte=4, last_updated_at__gte=ranking.last_updated_at,
+        ).values_list('pk')),
+        ('rank counts', RankingEntry.objects.filter(rank__isnull=False)
+                                            .order_by()
+                                            .values_list('question_id', 'rank')
+                                            .annotate(Count('pk'))),
+    ]
+
+
+# fragment caching and the cached thank-you page turned off
+NO_PAGE_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+    for alias in ('default', FRAGMENT_CACHE)
+}
+# counters and versions aren't a page cache
+NO_PAGE_CACHES[STATE_CACHE] = settings.CACHES[STATE_CACHE]
+
+
+@benchmark('pages')
+def pages_benchmark(repeat=None):
+    """Time GET requests of every survey page (with a ranking in the stage
+    showing it), with page caches (see `ranker.pages`) warmed up and with
+    all caching turned off."""
+    repeat = repeat or 50
+    pages = [
+        ('start', 'rank_start', 0, []),
+        ('email', 'rank_email', 0, []),
+        ('stage', 'rank_stage', 1, [2]),
+        ('demographic', 'rank_demographic', 3, []),
+        ('thankyou', 'rank_start', 4, []),
+    ]
+
+    def measure(url):
+        client = Client()
+        client.get(url)  # warm up
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            client.get(url)
+            times.append(time.perf_counter() - start)
+        return statistics.median(times) * 1000
+
+    results = []
+    with override_settings(ALLOWED_HOSTS=['testserver']), rolled_back():
+        generate_questions(2*20)
+        for page, view, stage, args in pages:
+            ranking = Ranking.objects.create(hash_id=uuid.uuid4().hex,
+                                             stage=stage)
+            RankingEntry.objects.bulk_create(assignment_entries(
+                ranking.pk, active_question_ids.sample(2*20),
+            ))
+            url = reverse(view, args=[ranking.hash_id] + args)
+
+            cached_ms = measure(url)
+            with override_settings(CACHES=NO_PAGE_CACHES):
+                uncached_ms = measure(url)
+            results.append({
+                'page': page,
+                'cached_ms': cached_ms,
+                'uncached_ms': uncached_ms,
+            })
+    return results
+
+
+def template_engine(cached):
+    """Return a copy of the configured Django template engine, with or
+    without the cached template loader (production vs. base settings)."""
+    options = dict(settings.TEMPLATES[0]['OPTIONS'], debug=False)
+    loaders = [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]
+    if cached:
+        loaders = [('django.template.loaders.cached.Loader', loaders)]
+    options['loaders'] = loaders
+    return DjangoTemplates({
+        'NAME': 'benchmark',
+        'DIRS': settings.TEMPLATES[0]['DIRS'],
+        'APP_DIRS': False,
+        'OPTIONS': options,
+    })
+
+
+@benchmark('templates')
+def templates_benchmark(repeat=None):
+    """Time rendering of every ranker page with templates compiled on every
+    render (base settings' loaders) and precompiled with the cached loader
+    (production settings)."""
+    repeat = repeat or 50
+    request = RequestFactory().get('/')
+    uncached = template_engine(cached=False)
+    cached = template_engine(cached=True)
+    start = time.perf_counter()
+    compiled = precompile_templates(cached)
+    warm_up_pages(cached)
+    startup_ms = (time.perf_counter() - start) * 1000
+
+    results = []
+    for name, context in page_contexts():
+        results.append({
+            'template': name,
+            'stage': context.get('stage'),
+            'uncached_ms': time_per_call(
+                lambda: uncached.get_template(name).render(context, request),
+                repeat) * 1000,
+            'cached_ms': time_per_call(
+                lambda: cached.get_template(name).render(context, request),
+                repeat) * 1000,
+        })
+    results.append({
+        'template': 'startup ({} templates)'.format(compiled),
+        'stage': None,
+        'uncached_ms': None,
+        'cached_ms': startup_ms,
+    })
+    return results
+
+
+NAVBAR_TEMPLATE = """{% load navigation %}
+{% navbar_element "Homepage" "home" %}
+{% navbar_element "Data & privacy policy" "data_privacy_policy" %}
+{% navbar_element "Survey" "rank_page" %}
+{% navbar_element_permed "Questions" "admin:index" "ranker.change_question" %}
+{% navbar_element_permed "Rankings" "admin:index" "ranker.change_question,ranker.change_ranking" %}
+{% navbar_element_url "About" "/about/" %}
+"""
+
+
+@benchmark('navigation')
+def navigation_benchmark(repeat=None):
+    """Time rendering of a navigation bar (plain, permission-aware and URL
+    elements) with memoized URLs and elements, and with the memos cleared
+    before every render (i.e. reversing and composing every element)."""
+    repeat = repeat or 1000
+    navbar = engines['django'].from_string(NAVBAR_TEMPLATE)
+    request = RequestFactory().get(reverse('home'))
+    request.user = AnonymousUser()
+
+    def render(clear):
+        if clear:
+            navigation.memoized_reverse.cache_clear()
+            navigation.navbar_template.cache_clear()
+        request.__dict__.pop('_navbar_perms', None)
+        return navbar.render({}, request)
+
+    render(clear=False)  # warm up
+    return [
+        {
+            'case': 'memoized',
+            'time_us': time_per_call(lambda: render(clear=False),
+                                     repeat) * 10 ** 6,
+        },
+        {
+            'case': 'cleared',
+            'time_us': time_per_call(lambda: render(clear=True),
+                                     repeat) * 10 ** 6,
+        },
+    ]
+
+
+def write_questions_csv(path, size, first_pk=1, categories=50):
+    """Write CSV of `size` questions (ids from `first_pk`) in `categories`
+    categories, as used by `import_questions`."""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(QUESTION_COLUMNS)
+        for pk in range(first_pk, first_pk + size):
+            writer.writerow([pk, 'Category {}'.format(pk % categories),
+                             'Generated question {}?'.format(pk)])
+
+
+def legacy_import_questions(path, author):
+    """Per-row import, as `utils.bulk_add_questions` used to do it."""
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            category, _ = Category.objects.get_or_create(
+                name=row['Category'], defaults=dict(author=author),
+            )
+            Question.objects.create(id=int(row['ID']),
+                                    content=row['Question'],
+                                    category=category, author=author)
+
+
+@benchmark('import_questions')
+def import_questions_benchmark(repeat=None, size=10 ** 5, legacy_size=5000):
+    """Import a generated CSV of `size` new questions: batched import (also as dry run, and updating all questions) vs.
+    per-row queries (measured on `legacy_size` rows, it's slow)."""
+    repeat = repeat or 1
+    results = []
+    # generated questions are all new
+    first_pk = (Question.objects.order_by('-pk')
+                                .values_list('pk', flat=True).first() or 0) + 1
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'questions.csv')
+        legacy_path = os.path.join(directory, 'legacy.csv')
+        write_questions_csv(path, size, first_pk)
+        write_questions_csv(legacy_path, legacy_size, first_pk)
+
+        def run(case, rows, func):
+            times = []
+            for _ in range(repeat):
+                with rolled_back():
+                    author = User.objects.create(
+                        username='benchmark-' + uuid.uuid4().hex)
+                    start = time.perf_counter()
+                    func(author)
+                    times.append(time.perf_counter() - start)
+            elapsed = statistics.median(times)
+            results.append({'case': case, 'rows': rows, 'time_s': elapsed,
+                            'rows_per_s': rows / elapsed})
+
+        def batched(author, **kwargs):
+            with open(path, newline='') as f:
+                for _ in import_questions(f, author, **kwargs):
+                    pass
+
+        def update(author):
+            batched(author)
+            with open(path, newline='') as f:
+                lines = (line.replace('Generated', 'Updated') for line in f)
+                for _ in import_questions(lines, author, update=True):
+                    pass
+
+        run('batched', size, batched)
+        run('dry_run', size, lambda author: batched(author, dry_run=True))
+        run('batched + update all', 2 * size, update)
+        run('per_row', legacy_size,
+            lambda author: legacy_import_questions(legacy_path, author))
+    return results
+
+
+@benchmark('import_rankings')
+def import_rankings_benchmark(repeat=None, sizes=(10 ** 4, 10 ** 5)):
+    """Import files of `sizes` random hash ids (with 1% duplicates):
+    throughput and peak memory (traced Python allocations), which stays
+    flat as the input grows."""
+    repeat = repeat or 1
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            path = os.path.join(directory, '{}.txt'.format(size))
+            with open(path, 'w') as f:
+                for i, hash_id in enumerate(generate_hash_ids(size)):
+                    f.write(hash_id + '\n')
+                    if i % 100 == 0:
+                        f.write(hash_id + '\n')
+
+            times, peaks = [], []
+            for _ in range(repeat):
+                with rolled_back(), open(path) as f:
+                    tracemalloc.start()
+                    start = time.perf_counter()
+                    for _ in import_hash_ids(hash_id_lines(f)):
+                        pass
+                    times.append(time.perf_counter() - start)
+                    peaks.append(tracemalloc.get_traced_memory()[1])
+                    tracemalloc.stop()
+
+            elapsed = statistics.median(times)
+            results.append({
+                'size': size,
+                'time_s': elapsed,
+                'ids_per_s': size / elapsed,
+                'peak_mb': max(peaks) / 2 ** 20,
+            })
+    return results
+
+
+@benchmark('journal')
+def journal_benchmark(repeat=None):
+    """Time valid stage submissions saved by the view and appended to the
+    write-behind journal (see `ranker.journal`), and applying the journal
+    afterwards, per submission."""
+    if settings.RANKER_SURVEY_CLOSED:
+        raise ValueError("Survey is closed (RANKER_SURVEY_CLOSED).")
+
+    repeat = repeat or 200
+    results = []
+    with override_settings(ALLOWED_HOSTS=['testserver']), rolled_back(), \
+            tempfile.TemporaryDirectory() as directory:
+        generate_questions(2*20)
+        for mode, journal_dir in (('write-through', ''),
+                                  ('journal', directory)):
+            submissions = []
+            for _ in range(repeat):
+                ranking = Ranking.objects.create(hash_id=uuid.uuid4().hex,
+                                                 stage=1)
+                RankingEntry.objects.bulk_create(assignment_entries(
+                    ranking.pk, active_question_ids.sample(2*20),
+                ))
+                submissions.append((
+                    reverse('rank_stage', args=[ranking.hash_id, 2]),
+                    stage_data(ranking.hash_id, 2),
+                ))
+
+            client = Client()
+            times = []
+            queries = 0
+            with override_settings(RANKER_JOURNAL_DIR=journal_dir):
+                for url, data in submissions:
+                    with CaptureQueriesContext(connection) as captured:
+                        start = time.perf_counter()
+                        client.post(url, data)
+                        times.append(time.perf_counter() - start)
+                    queries += len(captured)
+
+            start = time.perf_counter()
+            if journal_dir:
+                for _ in apply_journal(Journal(journal_dir)):
+                    pass
+            apply_ms = (time.perf_counter() - start) / repeat * 1000
+
+            results.append({
+                'mode': mode,
+                'submit_ms': statistics.median(times) * 1000,
+                'submit_queries': queries / repeat,
+                'apply_ms': apply_ms,
+            })
+    return results
+
+
+def run_api_survey(client, hash_id):
+    """Complete the survey of `hash_id` through the JSON API, in a single
+    submission; return (number of queries, wall time) of both requests."""
+    url = reverse('survey_api', args=[hash_id])
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        survey = client.get(url).json()
+        client.post(url, json.dumps({
+            'email': {'email': '', 'draw': False, 'paper': False},
+            'ranks': {
+                pk: RankingEntry.IMPORTANT
+                for stage in ('2', '3')
+                for pk, _, _ in survey['questions'][stage]
+            },
+            'demographic': demographic_data(),
+        }), content_type='application/json')
+        elapsed = time.perf_counter() - start
+    return len(queries), elapsed
+
+
+@benchmark('api')
+def api_benchmark(repeat=None):
+    """Complete the survey `repeat` times through the survey pages (only
+    valid requests) and through the JSON API; report median requests,
+    queries and wall time per completed survey."""
+    if settings.RANKER_SURVEY_CLOSED:
+        raise ValueError("Survey is closed (RANKER_SURVEY_CLOSED).")
+
+    repeat = repeat or 20
+    pages, api = [], []
+    with override_settings(ALLOWED_HOSTS=['testserver']), rolled_back():
+        generate_questions(2*20)
+        for _ in range(repeat):
+            ranking = Ranking.objects.create(hash_id=uuid.uuid4().hex)
+            records = [
+                record for record in run_journey(Client(), ranking.hash_id)
+                if record['valid'] and record['view'] != 'home'
+            ]
+            pages.append((len(records),
+                          sum(record['queries'] for record in records),
+                          sum(record['time_ms'] for record in records)))
+
+            ranking = Ranking.objects.create(hash_id=uuid.uuid4().hex)
+            queries, elapsed = run_api_survey(Client(), ranking.hash_id)
+            api.append((2, queries, elapsed * 1000))
+
+    return [
+        {
+            'mode': mode,
+            'requests': statistics.median(r[0] for r in results),
+            'queries': statistics.median(r[1] for r in results),
+            'time_ms': statistics.median(r[2] for r in results),
+        }
+        for mode, results in (('pages', pages), ('api', api))
+    ]
@@ -0,0 +1,240 @@
+"""Two-tier cache backend needing no external service.
+
+Every process (e.g. gunicorn worker) keeps recently used values in a small
+in-memory LRU tier in front of a file-based tier shared by all processes on
+the host.  Reads are served from memory most of the time; writes go through
+to the shared tier.
+
+Values in the local tier live at most `LOCAL_TIMEOUT` seconds, which bounds
+staleness of values changed by other processes.  Changes that must be seen
+everywhere at once (e.g. saved questions, see `ranker.signals`) call
+`invalidate_local_caches()`, which bumps a generation file in the shared
+directory; every process drops its local tier when it notices a new
+generation.  Counters (`incr`/`decr`) always go to the shared tier; like with
+the file-based backend they aren't atomic between processes.  The shared tier
+holds at most `MAX_ENTRIES` (`SHARED_MAX_ENTRIES` by default) values and
+evicts random ones beyond that, so state which must not be lost (counters,
+versions) is kept in `StateCache` (the `state` alias) instead.
+
+Configuration::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'ranker.cache.TieredCache',
+            'LOCATION': '/var/tmp/questions_ranker_cache',
+            'OPTIONS': {'LOCAL_MAX_ENTRIES': 1000, 'LOCAL_TIMEOUT': 5},
+        },
+        'state': {
+            'BACKEND': 'ranker.cache.StateCache',
+            'LOCATION': '/var/tmp/questions_ranker_state',
+        },
+    }
+"""
+import fcntl
+import os
+import pickle
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+
+GENERATION_FILE = 'generation'
+SHARED_MAX_ENTRIES = 100000
+# alias of the cache holding counters and versions, see `StateCache`
+STATE_CACHE = 'state'
+STATE_LOCK_FILE = 'state.lock'
+
+
+class TieredCache(BaseCache):
+
+    def __init__(self, location, params):
+        params = dict(params)
+        options = dict(params.get('OPTIONS', {}))
+        self.local_max_entries = int(options.pop('LOCAL_MAX_ENTRIES', 1000))
+        self.local_timeout = float(options.pop('LOCAL_TIMEOUT', 5))
+        options.setdefault('MAX_ENTRIES', SHARED_MAX_ENTRIES)
+        params['OPTIONS'] = options
+        super().__init__(params)
+
+        self.shared = FileBasedCache(location, params)
+        self.generation_path = os.path.join(location, GENERATION_FILE)
+        self.generation = None
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+
+    # local tier
+
+    def current_generation(self):
+        # the generation file is replaced (never rewritten in place), so its
+        # inode changes even when mtime resolution is too coarse
+        try:
+            stat = os.stat(self.generation_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def local_get(self, key):
+        generation = self.current_generation()
+        with self.lock:
+            if generation != self.generation:
+                self.local.clear()
+                self.generation = generation
+                return None, False
+
+            try:
+                expiry, pickled = self.local[key]
+            except KeyError:
+                return None, False
+            if expiry < time.monotonic():
+                del self.local[key]
+                return None, False
+            self.local.move_to_end(key)
+        return pickle.loads(pickled), True
+
+    def local_set(self, key, value, timeout):
+        local_timeout = self.local_timeout
+        if timeout is not None:
+            local_timeout = min(local_timeout, timeout)
+        if local_timeout <= 0:
+            self.local_delete(key)
+            return
+
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.local[key] = (time.monotonic() + local_timeout, pickled)
+            self.local.move_to_end(key)
+            while len(self.local) > self.local_max_entries:
+                self.local.popitem(last=False)
+
+    def local_delete(self, key):
+        with self.lock:
+            self.local.pop(key, None)
+
+    def invalidate_local(self):
+        """Make all processes drop their local tiers."""
+        directory = os.path.dirname(self.generation_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=directory)
+        os.close(fd)
+        os.replace(path, self.generation_path)
+        with self.lock:
+            self.local.clear()
+
+    # cache API
+
+    def local_timeout_of(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return timeout
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version)
+        if added:
+            self.local_set(self.make_key(key, version), value,
+                           self.local_timeout_of(timeout))
+        return added
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_key(key, version)
+        self.validate_key(local_key)
+        value, found = self.local_get(local_key)
+        if found:
+            return value
+
+        missing = object()
+        value = self.shared.get(key, missing, version)
+        if value is missing:
+            return default
+        self.local_set(local_key, value, None)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version)
+        self.local_set(self.make_key(key, version), value,
+                       self.local_timeout_of(timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        self.local_delete(self.make_key(key, version))
+        self.shared.delete(key, version)
+
+    def has_key(self, key, version=None):
+        if self.local_get(self.make_key(key, version))[1]:
+            return True
+        return self.shared.has_key(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version)
+        self.local_delete(self.make_key(key, version))
+        return value
+
+    def clear(self):
+        self.shared.clear()
+        self.invalidate_local()
+
+
+class StateCache(FileBasedCache):
+    """File-based cache for state which must not be lost, like counters and
+    versions, shared by all processes on the host.
+
+    Entries are never evicted to make room (`MAX_ENTRIES` doesn't apply), and
+    `add`, `incr` and `decr` are atomic between processes: they hold
+    an exclusive lock on a lock file in the cache directory.  Unlike with
+    the file-based backend, `incr` keeps the expiry of the value."""
+
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self.lock_path = os.path.join(self._dir, STATE_LOCK_FILE)
+
+    @contextmanager
+    def locked(self):
+        self._createdir()
+        with open(self.lock_path, 'a') as lock:
+            # released when the file is closed
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _cull(self):
+        pass
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self.locked():
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        with self.locked():
+            try:
+                with open(self._key_to_file(key, version), 'rb') as f:
+                    expiry = pickle.load(f)
+                    value = pickle.loads(zlib.decompress(f.read()))
+            except (FileNotFoundError, EOFError):
+                expiry, value = 0, None
+            if expiry is not None and expiry < time.time():
+                raise ValueError("Key '{}' not found".format(key))
+
+            value += delta
+            self.set(key, value,
+                     None if expiry is None else expiry - time.time(),
+                     version)
+            return value
+
+
+def state_cache():
+    """Return the cache holding counters and versions."""
+    return caches[STATE_CACHE]
+
+
+def invalidate_local_caches():
+    """Drop local tiers of the default cache in all processes, if it's
+    a `TieredCache`."""
+    invalidate = getattr(cache, 'invalidate_local', None)
+    if invalidate is not None:
+        invalidate()
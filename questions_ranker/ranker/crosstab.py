@@ -0,0 +1,180 @@
+"""Question x rank x demographic answer counts.
+
+Only completed rankings (stage 4 and up) are counted: demographic questions
+are answered in the last stage, and afterwards the survey doesn't let
+respondents change anything.  This makes the cross-tab append-only, so it's
+kept in cache and refreshed incrementally with rankings completed since the
+last refresh, i.e. updated after a watermark.  Deleting rankings or entries
+(or editing completed rankings) drops the cached cross-tab and the next use
+rebuilds it from scratch.
+
+Counts of all demographic fields are gathered in a single scan of ranking
+entries joined with their rankings, instead of one conditional aggregate per
+field, value and rank."""
+from array import array
+from datetime import timedelta
+
+import numpy as np
+from django.core.cache import cache
+
+from .analytics import CODES, UNRANKED
+from .forms import RankingDemographicForm
+from .models import Ranking, RankingEntry
+
+CACHE_KEY = 'ranker:crosstab'
+DEMOGRAPHIC_FIELDS = RankingDemographicForm.Meta.fields
+COMPLETED_STAGE = 4
+# rankings completed in transactions still running during a refresh may end
+# up with a timestamp a bit older than the watermark; look back that far
+REFRESH_OVERLAP = timedelta(minutes=5)
+# slot counting all completed rankings, regardless of demographic answers
+ALL = (None, None)
+
+
+def demographic_slots():
+    """Return list of (field, value) pairs counted by the cross-tab."""
+    slots = [ALL]
+    for field in DEMOGRAPHIC_FIELDS:
+        slots.extend(
+            (field, value)
+            for value, _ in Ranking._meta.get_field(field).choices
+        )
+    return slots
+
+
+class CrossTab:
+    """Counts of ranks every question received from respondents who gave
+    particular demographic answers.
+
+    `counts` is an array indexed by slot (see `demographic_slots`), question
+    row (see `question_rows`) and rank code (see `ranker.analytics`)."""
+
+    def __init__(self):
+        self.slots = demographic_slots()
+        self.slot_index = {slot: i for i, slot in enumerate(self.slots)}
+        self.question_rows = {}
+        self.counts = np.zeros((len(self.slots), 0, CODES), dtype=np.int32)
+        # `last_updated_at` of the newest counted ranking
+        self.watermark = None
+        # ranking id -> `last_updated_at` of rankings counted within
+        # `REFRESH_OVERLAP` before the watermark, which are read again
+        self.recent = {}
+
+    def refresh(self):
+        """Count entries of rankings completed since the last refresh;
+        return number of newly counted rankings."""
+        rankings = Ranking.objects.filter(stage__gte=COMPLETED_STAGE)
+        if self.watermark is not None:
+            rankings = rankings.filter(
+                last_updated_at__gte=self.watermark - REFRESH_OVERLAP,
+            )
+
+        entries = (
+            RankingEntry.objects.filter(ranking__in=rankings)
+                                .order_by()
+                                .values_list(
+                                    'ranking_id', 'ranking__last_updated_at',
+                                    'question_id', 'rank',
+                                    *['ranking__' + field
+                                      for field in DEMOGRAPHIC_FIELDS])
+        )
+        return self.add(entries.iterator())
+
+    def add(self, rows):
+        """Count rows of (ranking id, ranking update time, question id, rank,
+        *demographic answers), skipping rankings counted before; return
+        number of new rankings."""
+        # slot lookups per field; unknown answers (e.g. none) are skipped
+        lookups = {field: {} for field in DEMOGRAPHIC_FIELDS}
+        for slot, (field, value) in enumerate(self.slots):
+            if field is not None:
+                lookups[field][value] = slot
+        lookups = [lookups[field] for field in DEMOGRAPHIC_FIELDS]
+        all_slot = self.slot_index[ALL]
+
+        slots, questions, codes = array('l'), array('l'), array('b')
+        new_rankings = {}
+        for ranking_id, updated_at, question_id, rank, *answers in rows:
+            if ranking_id in self.recent:
+                continue
+            new_rankings[ranking_id] = updated_at
+            row = self.question_row(question_id)
+            code = rank or UNRANKED
+
+            slots.append(all_slot)
+            for lookup, answer in zip(lookups, answers):
+                if answer in lookup:
+                    slots.append(lookup[answer])
+            added = len(slots) - len(questions)
+            questions.extend([row] * added)
+            codes.extend([code] * added)
+
+        self.grow()
+        shape = self.counts.shape
+        index = np.ravel_multi_index(
+            (np.frombuffer(slots, dtype=np.int_),
+             np.frombuffer(questions, dtype=np.int_),
+             np.frombuffer(codes, dtype=np.int8)),
+            shape,
+        )
+        self.counts += np.bincount(
+            index, minlength=self.counts.size,
+        ).reshape(shape).astype(self.counts.dtype)
+
+        self.move_watermark(new_rankings)
+        return len(new_rankings)
+
+    def move_watermark(self, new_rankings):
+        self.recent.update(
+            (pk, updated_at) for pk, updated_at in new_rankings.items()
+            if updated_at is not None
+        )
+        if not self.recent:
+            return
+        self.watermark = max(self.recent.values())
+        cutoff = self.watermark - REFRESH_OVERLAP
+        self.recent = {pk: updated_at
+                       for pk, updated_at in self.recent.items()
+                       if updated_at >= cutoff}
+
+    def question_row(self, question_id):
+        return self.question_rows.setdefault(question_id,
+                                             len(self.question_rows))
+
+    def grow(self):
+        """Make room in `counts` for questions seen for the first time."""
+        missing = len(self.question_rows) - self.counts.shape[1]
+        if missing:
+            self.counts = np.concatenate([
+                self.counts,
+                np.zeros((len(self.slots), missing, CODES),
+                         dtype=self.counts.dtype),
+            ], axis=1)
+
+    def question_counts(self, question_ids, field=None, value=None):
+        """Return count matrix (see `ranker.analytics`) of given questions
+        ranked by respondents who answered `value` to `field`, or by all
+        respondents if `field` isn't given."""
+        slot = self.slot_index[field, value]
+        counts = np.zeros((len(question_ids), CODES), dtype=np.int_)
+        for i, question_id in enumerate(question_ids):
+            row = self.question_rows.get(question_id)
+            if row is not None:
+                counts[i] = self.counts[slot, row]
+        return counts
+
+
+def get_crosstab():
+    """Return cached cross-tab, refreshed with newly completed rankings."""
+    crosstab = cache.get(CACHE_KEY)
+    if crosstab is None:
+        crosstab = CrossTab()
+        crosstab.refresh()
+        cache.set(CACHE_KEY, crosstab, timeout=None)
+    elif crosstab.refresh():
+        cache.set(CACHE_KEY, crosstab, timeout=None)
+    return crosstab
+
+
+def invalidate_crosstab():
+    cache.delete(CACHE_KEY)
@@ -0,0 +1,205 @@
+"""Streaming export of raw rankings for analysis.
+
+Every exported row is a single ranking entry joined with its ranking, question
+and category.  Rows are read with `QuerySet.iterator()`, i.e. in chunks from
+a server-side cursor where the database supports it, and written out as they
+come, so memory use doesn't depend on the size of the dataset.
+
+Instead of raw entries, per-question statistics (see `ranker.analytics`) can
+be exported, too.
+
+Parquet output needs `pyarrow`, which is an optional dependency."""
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+from .analytics import (
+    RANKS,
+    bootstrap_ranks,
+    load_ranks,
+    question_statistics,
+    rank_counts,
+)
+from .models import RankingEntry
+from .summary import count_field
+
+# (column name, `RankingEntry` lookup) pairs, in output order
+EXPORT_COLUMNS = (
+    ('ranking_id', 'ranking_id'),
+    ('hash_id', 'ranking__hash_id'),
+    ('ranking_stage', 'ranking__stage'),
+    ('ranking_created_at', 'ranking__created_at'),
+    ('ranking_last_updated_at', 'ranking__last_updated_at'),
+    ('teaching_children_in_schools', 'ranking__teaching_children_in_schools'),
+    ('teaching_teens_in_schools', 'ranking__teaching_teens_in_schools'),
+    ('teaching_students', 'ranking__teaching_students'),
+    ('teaching_adults', 'ranking__teaching_adults'),
+    ('teaching_children_free_range', 'ranking__teaching_children_free_range'),
+    ('teaching_teens_free_range', 'ranking__teaching_teens_free_range'),
+    ('teaching_adults_free_range', 'ranking__teaching_adults_free_range'),
+    ('daily_home_computer', 'ranking__daily_home_computer'),
+    ('daily_school_computer', 'ranking__daily_school_computer'),
+    ('daily_smartphone', 'ranking__daily_smartphone'),
+    ('daily_broadband', 'ranking__daily_broadband'),
+    ('daily_lowspeed', 'ranking__daily_lowspeed'),
+    ('comp_research_involvement', 'ranking__comp_research_involvement'),
+    ('entry_id', 'pk'),
+    ('entry_stage', 'stage'),
+    ('rank', 'rank'),
+    ('question_id', 'question_id'),
+    ('question_content', 'question__content'),
+    ('question_active', 'question__active'),
+    ('category_id', 'question__category_id'),
+    ('category_name', 'question__category__name'),
+)
+COLUMNS = [name for name, _ in EXPORT_COLUMNS]
+STATISTICS_COLUMNS = (
+    ['question_id']
+    + [count_field(rank) for rank in RANKS]
+    + ['n', 'mean', 'variance', 'ci_low', 'ci_high', 'dont_understand',
+       'rank', 'rank_low', 'rank_high']
+)
+EXPORT_FORMATS = ('csv', 'jsonl', 'parquet')
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def lookup_field(lookup):
+    """Return the model field `RankingEntry` `lookup` refers to."""
+    model = RankingEntry
+    *relations, name = lookup.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.pk if name == 'pk' else model._meta.get_field(name)
+
+
+# columns of small integer codes, i.e. ranks and demographic answers
+SMALL_INTEGER_COLUMNS = [
+    name for name, lookup in EXPORT_COLUMNS
+    if isinstance(lookup_field(lookup), models.PositiveSmallIntegerField)
+]
+
+
+def export_rows(rankings=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield a tuple of `COLUMNS` values for every entry of `rankings`
+    (a `Ranking` queryset, all rankings by default)."""
+    entries = RankingEntry.objects.all()
+    if rankings is not None:
+        entries = entries.filter(ranking__in=rankings)
+
+    return (
+        entries.order_by('ranking_id', 'pk')
+               .values_list(*[lookup for _, lookup in EXPORT_COLUMNS])
+               .iterator(chunk_size=chunk_size)
+    )
+
+
+def statistics_rows(rankings=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield a tuple of `STATISTICS_COLUMNS` values for every question
+    ranked in `rankings` (all rankings by default)."""
+    entries = RankingEntry.objects.all()
+    if rankings is not None:
+        entries = entries.filter(ranking__in=rankings)
+
+    questions, counts = rank_counts(*load_ranks(entries, chunk_size))
+    ranks = bootstrap_ranks(counts)
+    for i, row in enumerate(question_statistics(questions, counts)):
+        row.update(
+            rank=int(ranks['rank'][i]),
+            rank_low=float(ranks['rank_low'][i]),
+            rank_high=float(ranks['rank_high'][i]),
+        )
+        yield tuple(row[column] for column in STATISTICS_COLUMNS)
+
+
+def csv_lines(rows, columns=COLUMNS):
+    """Yield CSV header and then one line per row."""
+    buffer = LineBuffer()
+    writer = csv.writer(buffer)
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def jsonl_lines(rows, columns=COLUMNS):
+    """Yield one JSON object per row, each in its own line."""
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + '\n'
+
+
+class LineBuffer:
+    """File-like object whose `write` returns what it was given, so that
+    `csv.writer` can produce lines one at a time."""
+
+    def write(self, value):
+        return value
+
+
+def write_parquet(rows, path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write rows to Parquet file at `path`, one row group per chunk.
+
+    Raises `ImportError` when pyarrow isn't installed."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # column types are fixed up front, so that a chunk full of NULLs
+    # (e.g. unranked entries) doesn't change the schema
+    string, integer, small = pa.string(), pa.int64(), pa.int16()
+    timestamp = pa.timestamp('us', tz='UTC')
+    types = {
+        'ranking_id': integer, 'ranking_stage': integer,
+        'ranking_created_at': timestamp,
+        'ranking_last_updated_at': timestamp,
+        'entry_id': integer, 'entry_stage': integer,
+        'question_id': integer, 'question_active': pa.bool_(),
+        'category_id': integer,
+    }
+    types.update(dict.fromkeys(SMALL_INTEGER_COLUMNS, small))
+    schema = pa.schema([
+        pa.field(name, types.get(name, string)) for name in COLUMNS
+    ])
+
+    written = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunked(rows, chunk_size):
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [
+                    pa.array(column, type=field.type)
+                    for column, field in zip(columns, schema)
+                ],
+                schema=schema,
+            ))
+            written += len(chunk)
+    return written
+
+
+def chunked(iterable, size):
+    """Yield lists of at most `size` consecutive items of `iterable`."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_lines(rows, output, fmt, columns=COLUMNS):
+    """Write rows to text stream `output` as CSV or JSON Lines; return
+    number of rows written."""
+    written = 0
+
+    def counted():
+        nonlocal written
+        for written, row in enumerate(rows, start=1):
+            yield row
+
+    for line in LINE_FORMATS[fmt](counted(), columns):
+        output.write(line)
+    return written
+
+
+LINE_FORMATS = {'csv': csv_lines, 'jsonl': jsonl_lines}
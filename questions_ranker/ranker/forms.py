@@ -1,3 +1,5 @@
+from collections import namedtuple
+
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Submit
 from django import forms
@@ -39,8 +41,115 @@ class RankingEntryForm(forms.ModelForm):
         }
 
 
+class FetchedModelChoiceField(forms.ModelChoiceField):
+    """Model choice field looking up submitted primary keys in a dictionary
+    of already fetched objects instead of querying the database."""
+    def __init__(self, objects, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.objects = objects
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return self.objects[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError(self.error_messages['invalid_choice'],
+                                  code='invalid_choice')
+
+
+class BaseRankingEntryFormset(forms.BaseModelFormSet):
+    """Formset of all entries in a ranking stage."""
+
+    def entries_by_pk(self):
+        if not hasattr(self, '_entries_by_pk'):
+            self._entries_by_pk = {
+                entry.pk: entry for entry in self.get_queryset()
+            }
+        return self._entries_by_pk
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        # the default field would run one query per form to validate the id;
+        # this one accepts only entries from the formset's queryset
+        pk_name = self.model._meta.pk.name
+        field = form.fields[pk_name]
+        form.fields[pk_name] = FetchedModelChoiceField(
+            self.entries_by_pk(),
+            queryset=field.queryset,
+            initial=field.initial,
+            required=False,
+            widget=field.widget,
+        )
+
+    def clean(self):
+        super().clean()
+        submitted = {
+            form.cleaned_data['id'].pk
+            for form in self.forms
+            if form.cleaned_data.get('id')
+        }
+        if submitted != set(self.entries_by_pk()):
+            raise ValidationError(
+                _("Please rank all of the questions provided."),
+            )
+
+    def ranks(self):
+        """Return dictionary mapping entry primary keys to selected ranks."""
+        return {
+            form.cleaned_data['id'].pk: form.cleaned_data['rank']
+            for form in self.forms
+        }
+
+
+# built once: `modelformset_factory` creates new classes with each call
+RankingEntryFormset = forms.modelformset_factory(
+    RankingEntry,
+    form=RankingEntryForm,
+    formset=BaseRankingEntryFormset,
+    extra=0, max_num=0,
+)
+
+# rank values as strings, to be compared with the submitted ones
+RANK_CHOICES = [
+    (str(value), label) for value, label in RankingEntry.RANK_CHOICES
+]
+
+RankingRow = namedtuple('RankingRow', ['prefix', 'entry', 'rank', 'errors'])
+
+
+def ranking_rows(formset):
+    """Yield rows of the ranking table, one per entry in the formset.
+
+    Rows are rendered by hand in `ranker/stage.html`, so forms are not
+    created at all for an unbound formset, and radio buttons don't go through
+    widget templates.  Selected rank is a string, just like in POST data."""
+    if formset.is_bound:
+        for form in formset.forms:
+            rank = form['rank'].value()
+            yield RankingRow(form.prefix, form.instance,
+                             '' if rank is None else str(rank),
+                             form['rank'].errors)
+    else:
+        for i, entry in enumerate(formset.get_queryset()):
+            yield RankingRow(formset.add_prefix(i), entry,
+                             '' if entry.rank is None else str(entry.rank),
+                             [])
+
+
+class SubmissionKeyField(forms.CharField):
+    """Hidden idempotency key of a form submission, see
+    `ranker.idempotency`; the view reads it from POST data on its own."""
+    widget = forms.HiddenInput
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('required', False)
+        super().__init__(**kwargs)
+
+
 class DrawEntryForm(forms.ModelForm):
     helper = Bootstrap4Helper()
+    submission_key = SubmissionKeyField()
 
     class Meta:
         fields = ('email', 'draw', 'paper')
@@ -52,21 +161,24 @@ class DrawEntryForm(forms.ModelForm):
 
     def clean_draw(self):
         draw = self.cleaned_data['draw']
-        email = self.cleaned_data['email']
-        if draw is True and not email:
+        # missing when the address itself is invalid
+        email = self.cleaned_data.get('email')
+        if draw is True and not email and 'email' not in self.errors:
             raise ValidationError(_("No e-mail provided."))
         return draw
 
     def clean_paper(self):
         paper = self.cleaned_data['paper']
-        email = self.cleaned_data['email']
-        if paper is True and not email:
+        # missing when the address itself is invalid
+        email = self.cleaned_data.get('email')
+        if paper is True and not email and 'email' not in self.errors:
             raise ValidationError(_("No e-mail provided."))
         return paper
 
 
 class RankingDemographicForm(forms.ModelForm):
     helper = Bootstrap4HelperNonHorizontal()
+    submission_key = SubmissionKeyField()
 
     class Meta:
         fields = (
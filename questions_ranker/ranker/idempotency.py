@@ -0,0 +1,76 @@
+"""Idempotent submissions of survey forms.
+
+Every survey form carries a random submission key in a hidden field
+(`submission_key`), generated when the form is shown.  When a submission is
+accepted, the URL it redirected to is stored in the default cache under the
+ranking's hash id and the key, once the transaction commits.  A repeated POST
+with the same key (e.g. resent by a browser on a flaky connection, or
+a double click) is redirected to the stored URL right away: it isn't
+validated again and doesn't touch the database.
+
+Submissions without a key (e.g. from pages rendered before a deploy) are
+processed as usual; concurrent duplicates, which can't find a stored result
+yet, are stopped by `Ranking.objects.advance_stage`.
+"""
+import re
+import secrets
+from functools import partial, wraps
+
+from django.core.cache import cache
+from django.db import transaction
+from django.shortcuts import redirect
+
+KEY_FIELD = 'submission_key'
+# see `new_submission_key`
+KEY_RE = re.compile(r'[A-Za-z0-9_-]{16,64}\Z')
+KEY_BYTES = 16
+RESULT_KEY = 'ranker:submission:{}:{}'
+# long enough for any retry, short enough not to pile up in the cache
+RESULT_TIMEOUT = 24 * 60 * 60
+
+
+def new_submission_key():
+    return secrets.token_urlsafe(KEY_BYTES)
+
+
+def submission_key(request):
+    """Return submission key sent with POST `request`, or `None` if there's
+    no valid key."""
+    if request.method != "POST":
+        return None
+    key = request.POST.get(KEY_FIELD, '')
+    return key if KEY_RE.match(key) else None
+
+
+def form_submission_key(request):
+    """Return key for a form shown in response to `request`: the submitted
+    one, so that a form shown again with errors keeps its key, or a new
+    one."""
+    return submission_key(request) or new_submission_key()
+
+
+def idempotent(view):
+    """Answer repeated submissions of view `view(request, hash_id, ...)` with
+    the stored redirect of the first accepted one.
+
+    The view runs in its own transaction (instead of the request
+    transaction), so that a replayed submission doesn't even start one."""
+    @wraps(view)
+    def wrapper(request, hash_id, *args, **kwargs):
+        key = submission_key(request)
+        if key is not None:
+            url = cache.get(RESULT_KEY.format(hash_id, key))
+            if url is not None:
+                return redirect(url)
+
+        with transaction.atomic():
+            response = view(request, hash_id, *args, **kwargs)
+            # accepted submissions redirect, rejected ones show the form
+            if key is not None and response.status_code == 302:
+                transaction.on_commit(partial(
+                    cache.add, RESULT_KEY.format(hash_id, key),
+                    response.url, RESULT_TIMEOUT,
+                ))
+        return response
+
+    return transaction.non_atomic_requests(wrapper)
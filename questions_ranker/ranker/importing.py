@@ -0,0 +1,249 @@
+"""Bulk import of questions and rankings.
+
+Questions are read from a CSV file with `ID`, `Category` and `Question`
+columns, as a stream, and saved in batches: every batch takes a query to
+find which questions exist already, one `bulk_create` for the new ones and
+a few CASE updates (in raw SQL) for the changed ones, instead of a few queries per row.
+Categories are loaded into a name -> id mapping once; new ones are created
+with one `bulk_create` per batch.
+
+`bulk_create` doesn't send `post_save` signals, so the importer does what
+`ranker.signals` would: creates rank summary rows of new questions and
+invalidates cached question ids.
+
+Rankings are imported (or generated) as a stream of hash ids, too.  Ids are
+deduplicated within a batch in memory and against the database with one
+query per batch, so memory use doesn't depend on the number of ids.
+"""
+import csv
+import re
+import secrets
+from collections import Counter
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from .cache import invalidate_local_caches
+from .export import chunked
+from .models import Category, Question, QuestionRankSummary, Ranking
+from .sampling import invalidate_active_question_ids
+
+QUESTION_COLUMNS = ('ID', 'Category', 'Question')
+DEFAULT_BATCH_SIZE = 1000
+# hash ids are a part of survey URLs, see `config.urls`
+HASH_ID_RE = re.compile(r'[a-z0-9]+\Z')
+HASH_ID_MAX_LENGTH = Ranking._meta.get_field('hash_id').max_length
+# 16 random bytes -> 32 hexadecimal digits
+HASH_ID_BYTES = 16
+
+
+def question_rows(lines):
+    """Yield (id, category name, content) tuples read from CSV `lines`.
+
+    Raises `ValueError` for a missing column or a malformed row."""
+    reader = csv.DictReader(lines, delimiter=',', quotechar='"')
+    missing = set(QUESTION_COLUMNS) - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError("Missing CSV columns: {}.".format(
+            ', '.join(sorted(missing))))
+
+    for row in reader:
+        try:
+            pk = int(row['ID'])
+        except (TypeError, ValueError):
+            raise ValueError("Line {}: invalid ID {!r}.".format(
+                reader.line_num, row['ID']))
+        category, content = row['Category'], row['Question']
+        if not category or not content:
+            raise ValueError("Line {}: empty category or question.".format(
+                reader.line_num))
+        yield pk, category, content
+
+
+class QuestionImporter:
+    """Save streamed question rows in batches.
+
+    Existing questions (by ID) are updated when `update` is set and skipped
+    otherwise; questions that don't change are never written."""
+
+    def __init__(self, author, update=False, batch_size=DEFAULT_BATCH_SIZE):
+        self.author = author
+        self.update = update
+        self.batch_size = batch_size
+        self.stats = Counter()
+        self.categories = {}
+        # lowest id wins when category names are duplicated
+        for pk, name in Category.objects.order_by('-pk') \
+                                        .values_list('pk', 'name'):
+            self.categories[name] = pk
+
+    def run(self, rows):
+        """Import `rows` (see `question_rows`); yield statistics after every
+        batch."""
+        for batch in chunked(rows, self.batch_size):
+            # the last row with a given ID wins
+            batch = {pk: (category, content)
+                     for pk, category, content in batch}
+            self.stats['rows'] += len(batch)
+            self.add_categories(category for category, _ in batch.values())
+            self.save_batch(batch)
+            yield self.stats
+
+    def add_categories(self, names):
+        new = {name for name in names if name not in self.categories}
+        if not new:
+            return
+        Category.objects.bulk_create([
+            Category(name=name, author=self.author) for name in sorted(new)
+        ])
+        self.categories.update(
+            Category.objects.filter(name__in=new).values_list('name', 'pk')
+        )
+        self.stats['categories_created'] += len(new)
+
+    def save_batch(self, batch):
+        existing = {
+            pk: (category_id, content)
+            for pk, category_id, content in Question.objects.filter(
+                pk__in=batch,
+            ).values_list('pk', 'category_id', 'content')
+        }
+
+        created = [pk for pk in batch if pk not in existing]
+        Question.objects.bulk_create([
+            Question(pk=pk, content=batch[pk][1],
+                     category_id=self.categories[batch[pk][0]],
+                     author=self.author)
+            for pk in created
+        ])
+        QuestionRankSummary.objects.bulk_create([
+            QuestionRankSummary(question_id=pk) for pk in created
+        ])
+        self.stats['created'] += len(created)
+
+        changed = {
+            pk: (self.categories[category], content)
+            for pk, (category, content) in batch.items()
+            if pk in existing
+            and existing[pk] != (self.categories[category], content)
+        }
+        if not self.update:
+            self.stats['skipped'] += len(existing)
+            return
+        self.update_questions(changed)
+        self.stats['updated'] += len(changed)
+        self.stats['unchanged'] += len(existing) - len(changed)
+
+    def update_questions(self, changed):
+        """Update category and content of `changed` questions (a dictionary
+        of pk -> (category id, content)) with as few queries as the database
+        allows."""
+        # the ORM spends much more time building a CASE expression with
+        # a `When` per question than the database spends running it
+        meta = Question._meta
+        quote = connection.ops.quote_name
+        columns = {
+            name: quote(meta.get_field(name).column)
+            for name in ('id', 'category', 'content', 'author')
+        }
+        size = connection.ops.bulk_batch_size(
+            ['id', 'category', 'id', 'content', 'id'], list(changed),
+        )
+        with connection.cursor() as cursor:
+            for pks in chunked(changed, size):
+                cases = ' '.join(['WHEN %s THEN %s'] * len(pks))
+                cursor.execute(
+                    'UPDATE {table} SET '
+                    '{category} = CASE {id} {cases} END, '
+                    '{content} = CASE {id} {cases} END, '
+                    '{author} = %s '
+                    'WHERE {id} IN ({pks})'.format(
+                        table=quote(meta.db_table), cases=cases,
+                        pks=', '.join(['%s'] * len(pks)), **columns
+                    ),
+                    [value for pk in pks for value in (pk, changed[pk][0])]
+                    + [value for pk in pks for value in (pk, changed[pk][1])]
+                    + [self.author.pk] + pks,
+                )
+
+
+def import_questions(lines, author, update=False,
+                     batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """Import questions from CSV `lines` in a single transaction, rolled
+    back for a dry run; yield statistics (a `Counter`) after every batch."""
+    with transaction.atomic():
+        importer = QuestionImporter(author, update, batch_size)
+        yield from importer.run(question_rows(lines))
+
+        if dry_run:
+            transaction.set_rollback(True)
+            return
+
+        # questions were inserted with explicit ids
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(),
+                                                         [Question]):
+                cursor.execute(sql)
+
+    invalidate_active_question_ids()
+    invalidate_local_caches()
+
+
+def hash_id_lines(lines):
+    """Yield hash ids from `lines` (e.g. a file object), one per non-blank
+    line."""
+    for line in lines:
+        hash_id = line.strip()
+        if hash_id:
+            yield hash_id
+
+
+def generate_hash_ids(count, nbytes=HASH_ID_BYTES):
+    """Yield `count` cryptographically random hash ids."""
+    for _ in range(count):
+        yield secrets.token_hex(nbytes)
+
+
+def valid_hash_id(hash_id):
+    return (len(hash_id) <= HASH_ID_MAX_LENGTH
+            and HASH_ID_RE.match(hash_id) is not None)
+
+
+def import_hash_ids(hash_ids, batch_size=DEFAULT_BATCH_SIZE, output=None):
+    """Create a ranking (in stage 0) for every hash id from `hash_ids`
+    stream; yield statistics (a `Counter`) after every batch.
+
+    Invalid ids, duplicates and ids of existing rankings are skipped (an id
+    repeated in a later batch counts as existing, not duplicate).  Every batch is saved in its own transaction.
+    Created ids are written, one per line, to `output` text stream if it's
+    given."""
+    stats = Counter()
+    for batch in chunked(hash_ids, batch_size):
+        stats['rows'] += len(batch)
+        unique = []
+        seen = set()
+        for hash_id in batch:
+            if not valid_hash_id(hash_id):
+                stats['invalid'] += 1
+            elif hash_id in seen:
+                stats['duplicate'] += 1
+            else:
+                seen.add(hash_id)
+                unique.append(hash_id)
+
+        with transaction.atomic():
+            existing = set(Ranking.objects.filter(
+                hash_id__in=unique,
+            ).values_list('hash_id', flat=True))
+            created = [hash_id for hash_id in unique
+                       if hash_id not in existing]
+            Ranking.objects.bulk_create([
+                Ranking(hash_id=hash_id, stage=0) for hash_id in created
+            ])
+        stats['existing'] += len(existing)
+        stats['created'] += len(created)
+
+        if output is not None:
+            for hash_id in created:
+                output.write(hash_id + '\n')
+        yield stats
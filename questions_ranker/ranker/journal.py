@@ -0,0 +1,317 @@
+"""Write-behind journal of stage submissions.
+
+With `RANKER_JOURNAL_DIR` set, `rank_stage` doesn't write accepted ranks to
+the database.  It appends a record (hash id, ranking id, stage and ranks) to
+an append-only journal file in that directory, fsyncs it and responds right
+away.  A separate applier process (`apply_journal` command) drains the
+journal into `Ranking` and `RankingEntry` in large batches: a few queries
+and a single transaction per batch instead of one transaction per
+submission.
+
+The applier remembers how far the journal was applied in a checkpoint file,
+written after every committed batch.  After a crash it starts again from the
+checkpoint, so records of the last batch may be applied twice; that's
+harmless, because every record moves its ranking from the previous stage
+(like `Ranking.objects.advance_stage`) and is skipped once the ranking moved
+on.  For the same reason only the first of duplicated submissions of
+a stage (e.g. from two tabs) is applied.  Once everything is applied the
+journal is truncated.
+
+Until a record is applied, the database has a stale stage of its ranking;
+`pending_stage` returns the stage including unapplied records.  These are
+found in a small per-ranking file (`pending/<hash id>`), which gets a copy of
+every record appended for the ranking and is cleared of records the applier
+(or `apply_pending`) has applied, so a request reads only records of its own
+ranking, however long the journal is.  Writes which need the database to be
+up to date first apply pending records of their ranking with
+`apply_pending`.
+
+Appends from many processes are serialized with `flock`, so the journal
+directory must be on a local filesystem shared by all processes (i.e. one
+host).
+"""
+import fcntl
+import json
+import os
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .export import chunked
+from .models import Ranking, RankingEntry
+from .summary import rank_changes, update_summary
+
+JOURNAL_FILE = 'ranks.journal'
+CHECKPOINT_FILE = 'ranks.checkpoint'
+APPLIER_LOCK_FILE = 'applier.lock'
+PENDING_DIR = 'pending'
+DEFAULT_BATCH_SIZE = 1000
+
+
+def record_line(record):
+    return '\n{}\n'.format(json.dumps(record, separators=(',', ':')))
+
+
+def journal_enabled():
+    return bool(settings.RANKER_JOURNAL_DIR)
+
+
+def get_journal():
+    return Journal(settings.RANKER_JOURNAL_DIR)
+
+
+class Journal:
+    """Append-only journal of stage submissions in `directory`.
+
+    Every record is a line of JSON, written with a leading newline as well:
+    a line torn by a crash (never acknowledged) is then skipped instead of
+    swallowing the next record."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, JOURNAL_FILE)
+        self.checkpoint_path = os.path.join(directory, CHECKPOINT_FILE)
+        self.lock_path = os.path.join(directory, APPLIER_LOCK_FILE)
+        self.pending_directory = os.path.join(directory, PENDING_DIR)
+
+    @contextmanager
+    def locked(self):
+        """Hold the exclusive lock of the journal, yield its descriptor
+        (opened for appending)."""
+        os.makedirs(self.pending_directory, exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield fd
+        finally:
+            os.close(fd)
+
+    def append(self, record):
+        """Durably append `record` (a JSON-serializable dictionary with
+        `hash_id` and `stage`)."""
+        line = record_line(record)
+        with self.locked() as fd:
+            os.write(fd, line.encode())
+            os.fsync(fd)
+            # not synced: the journal is the source of truth, a record lost
+            # from the index by a crash only shows up once it's applied
+            with open(self.pending_path(record['hash_id']), 'a') as f:
+                f.write(line)
+
+    def checkpoint(self):
+        """Return offset of the first record not applied yet."""
+        try:
+            with open(self.checkpoint_path) as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def set_checkpoint(self, offset):
+        # replaced, not rewritten, so that a crash can't leave it half-written
+        temporary = self.checkpoint_path + '.tmp'
+        with open(temporary, 'w') as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.checkpoint_path)
+
+    def records(self, start=None):
+        """Yield (end offset, record) of complete records after `start`
+        (the checkpoint by default) appended before the call."""
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            # the checkpoint and the size are read together, so that
+            # `truncate` can't reset one of them in between; once it empties
+            # the file (everything was applied) reading simply stops early
+            fcntl.flock(f, fcntl.LOCK_SH)
+            start = self.checkpoint() if start is None else start
+            end = os.fstat(f.fileno()).st_size
+            fcntl.flock(f, fcntl.LOCK_UN)
+            if start >= end:
+                return
+
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b'\n') or offset + len(line) > end:
+                    # being written right now, or after the call
+                    return
+                offset += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # blank separator, or torn by a crash
+                    continue
+                yield offset, record
+
+    def pending_path(self, hash_id):
+        return os.path.join(self.pending_directory, hash_id)
+
+    def pending(self, hash_id):
+        """Return records of ranking `hash_id` which may not be applied."""
+        try:
+            with open(self.pending_path(hash_id)) as f:
+                lines = f.read().split('\n')
+        except FileNotFoundError:
+            return []
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # blank separator, or being written right now
+                pass
+        return records
+
+    def clear_pending(self, stages):
+        """Drop records which can't be applied anymore from the pending
+        index, given `stages`, a dictionary mapping hash ids to current
+        stages of their rankings (`None` for deleted rankings)."""
+        with self.locked():
+            for hash_id, stage in stages.items():
+                path = self.pending_path(hash_id)
+                records = [
+                    record for record in self.pending(hash_id)
+                    if stage is not None and record['stage'] > stage
+                ]
+                if not records:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    continue
+                temporary = path + '.tmp'
+                with open(temporary, 'w') as f:
+                    f.writelines(record_line(record) for record in records)
+                os.replace(temporary, path)
+
+    def truncate(self):
+        """Empty the journal if all of it is applied."""
+        try:
+            fd = os.open(self.path, os.O_WRONLY)
+        except FileNotFoundError:
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if os.fstat(fd).st_size != self.checkpoint():
+                return
+            # a crash between these two replays the whole journal, which
+            # applies nothing
+            self.set_checkpoint(0)
+            os.ftruncate(fd, 0)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def journal_ranks(ranking, stage, ranks):
+    """Record submission of `stage` of `ranking` with `ranks` (a dictionary
+    mapping entry primary key to rank)."""
+    get_journal().append({
+        'hash_id': ranking.hash_id,
+        'ranking': ranking.pk,
+        'stage': stage,
+        'ranks': ranks,
+    })
+
+
+def pending_stage(ranking):
+    """Return stage of `ranking` including submissions not applied yet."""
+    if not journal_enabled():
+        return ranking.stage
+    return max([ranking.stage] + [
+        record['stage'] for record in get_journal().pending(ranking.hash_id)
+    ])
+
+
+def apply_records(records):
+    """Apply journal `records` in a single transaction; return statistics
+    (a `Counter`) of applied and skipped records."""
+    # stage -> ranking id -> ranks; the first submission of a stage wins
+    stages = defaultdict(dict)
+    for record in records:
+        stages[record['stage']].setdefault(record['ranking'], {
+            int(pk): rank for pk, rank in record['ranks'].items()
+        })
+
+    stats = Counter(records=len(records))
+    ranks = {}
+    with transaction.atomic():
+        # ascending stages, so that a ranking can advance a few stages
+        for stage, submissions in sorted(stages.items()):
+            ready = list(
+                Ranking.objects.select_for_update()
+                               .filter(pk__in=submissions, stage=stage - 1)
+                               .values_list('pk', flat=True)
+            )
+            Ranking.objects.filter(pk__in=ready).update(
+                stage=stage,
+                last_updated_at=timezone.now(),
+            )
+            for pk in ready:
+                ranks.update(submissions[pk])
+            stats['applied'] += len(ready)
+
+        size = connection.ops.bulk_batch_size(['pk', 'rank'], list(ranks))
+        for pks in chunked(ranks, size):
+            chunk = {pk: ranks[pk] for pk in pks}
+            previous = list(RankingEntry.objects.filter(pk__in=pks)
+                            .values_list('pk', 'question_id', 'rank'))
+            RankingEntry.objects.set_ranks(chunk)
+            update_summary(rank_changes(previous, chunk))
+    stats['skipped'] = len(records) - stats['applied']
+    return stats
+
+
+def apply_pending(ranking):
+    """Apply unapplied records of `ranking`, e.g. before writing its next
+    stage directly."""
+    if journal_enabled():
+        journal = get_journal()
+        records = journal.pending(ranking.hash_id)
+        if records:
+            apply_records(records)
+            ranking.refresh_from_db(fields=['stage'])
+            journal.clear_pending({ranking.hash_id: ranking.stage})
+
+
+def applied_stages(records):
+    """Return dictionary mapping hash ids of `records` to current stages of
+    their rankings (`None` for deleted rankings)."""
+    stages = dict.fromkeys(record['hash_id'] for record in records)
+    stages.update(Ranking.objects.filter(hash_id__in=list(stages))
+                                 .values_list('hash_id', 'stage'))
+    return stages
+
+
+class AlreadyApplying(Exception):
+    pass
+
+
+def apply_journal(journal=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Apply all records past the checkpoint, `batch_size` records per
+    transaction; yield statistics (a `Counter`) after every batch.
+
+    Raises `AlreadyApplying` if another applier is running."""
+    journal = journal or get_journal()
+    os.makedirs(journal.directory, exist_ok=True)
+    with open(journal.lock_path, 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise AlreadyApplying(journal.directory)
+
+        stats = Counter()
+        for batch in chunked(journal.records(), batch_size):
+            records = [record for _, record in batch]
+            stats.update(apply_records(records))
+            journal.set_checkpoint(batch[-1][0])
+            journal.clear_pending(applied_stages(records))
+            yield stats
+        journal.truncate()
@@ -0,0 +1,347 @@
+"""Load test replaying complete respondent journeys.
+
+Every simulated respondent gets a fresh ranking and walks it through the
+survey (see `ranker.benchmarks.respondent_journey`, without the rejected
+submissions), pausing for a random think time between requests.  A number of
+respondents are active at the same time, each in its own thread.
+
+Requests go through one of two drivers:
+
+* `ClientDriver` calls the views in-process with Django test client, i.e.
+  without any server;
+* `HTTPDriver` talks to a running server (`runserver`, gunicorn) over HTTP,
+  keeping cookies and sending CSRF tokens like a browser.
+
+Both need access to the database used by the views, because POST data of
+stages is built from the assigned ranking entries; this works offline with
+SQLite and with a local PostgreSQL.
+
+Besides latency of every request, database lock contention is measured:
+requests failing with lock errors (e.g. SQLite's "database is locked") are
+counted, and on PostgreSQL sessions waiting for a lock are sampled during the
+test.  Lock errors are recognized in-process only: behind `HTTPDriver` they
+are plain 500 responses, counted as server errors together with any other
+failure of the server.
+
+Simulated respondents leave their draw entries under an address of the
+reserved `.invalid` domain (see `journey_email`), so that these can be told
+apart from entries of real respondents.
+"""
+import http.cookiejar
+import io
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from queue import Empty, Queue
+
+import numpy as np
+from django.db import OperationalError, connection, connections
+from django.test import Client
+
+from .benchmarks import respondent_journey
+from .importing import generate_hash_ids, import_hash_ids
+
+PERCENTILES = (50, 90, 99)
+# fragments of database error messages caused by lock contention
+LOCK_ERRORS = ('locked', 'deadlock', 'lock timeout', 'could not serialize')
+LOCK_SAMPLE_INTERVAL = 0.1
+LOCK_RETRY_DELAY = 0.01
+# accepted submissions redirect to the next page; anything else (e.g. the form
+# shown again with errors) means the journey can't go on
+POST_STATUS = 302
+# domain of draw entry addresses of simulated respondents, reserved by
+# RFC 2606, i.e. never used by real ones
+JOURNEY_EMAIL_DOMAIN = 'example.invalid'
+
+
+class ThreadClient(Client):
+    """Test client that can be used alongside clients of other threads."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.thread = threading.get_ident()
+
+    def store_exc_info(self, **kwargs):
+        # view exceptions are signalled to clients of all threads
+        if threading.get_ident() == self.thread:
+            super().store_exc_info(**kwargs)
+
+
+class ClientDriver:
+    """Send requests in-process, with Django test client."""
+
+    def __init__(self):
+        self.client = ThreadClient()
+
+    def request(self, method, url, data=None):
+        """Send request; return response status code."""
+        send = getattr(self.client, method.lower())
+        return send(url, data or {}).status_code
+
+
+class NoRedirectHandler(urllib.request.HTTPRedirectHandler):
+
+    def redirect_request(self, *args, **kwargs):
+        # redirects are separate steps of the journey
+        return None
+
+
+class HTTPDriver:
+    """Send requests over HTTP to a server at `base_url`, with cookies of
+    a single respondent."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies),
+            NoRedirectHandler(),
+        )
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def request(self, method, url, data=None):
+        """Send request; return response status code."""
+        body = None
+        if method == 'POST':
+            data = dict(data or {}, csrfmiddlewaretoken=self.csrf_token())
+            body = urllib.parse.urlencode(data).encode()
+        request = urllib.request.Request(
+            self.base_url + url, data=body, method=method,
+            # Django checks referer of secure requests
+            headers={'Referer': self.base_url + url},
+        )
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+def journey_email(hash_id):
+    """Draw entry address of simulated respondent of ranking `hash_id`."""
+    return 'loadtest-{}@{}'.format(hash_id, JOURNEY_EMAIL_DOMAIN)
+
+
+def journey_steps(hash_id):
+    """Valid requests of a respondent completing the survey, leaving
+    `journey_email` in the draw entry.
+
+    POST data is read from the database as the journey goes on; reads failed
+    on a lock error are repeated, they aren't part of the measurement."""
+    generated = 0
+    while True:
+        try:
+            for index, step in enumerate(respondent_journey(hash_id)):
+                if index < generated:
+                    continue
+                generated = index + 1
+                if not step['valid']:
+                    continue
+                if step['view'] == 'rank_email' and step['method'] == 'POST':
+                    step['data'] = dict(step['data'],
+                                        email=journey_email(hash_id))
+                yield step
+            return
+        except OperationalError as e:
+            if not is_lock_error(e):
+                raise
+            time.sleep(LOCK_RETRY_DELAY)
+
+
+def create_rankings(count):
+    """Create `count` rankings with random hash ids; return the ids."""
+    output = io.StringIO()
+    for _ in import_hash_ids(generate_hash_ids(count), output=output):
+        pass
+    return output.getvalue().split()
+
+
+def is_lock_error(error):
+    message = str(error).lower()
+    return any(fragment in message for fragment in LOCK_ERRORS)
+
+
+class LockSampler(threading.Thread):
+    """Count PostgreSQL sessions waiting for a lock, every `interval`
+    seconds, until stopped."""
+
+    def __init__(self, interval=LOCK_SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            with connection.cursor() as cursor:
+                while not self.stopped.wait(self.interval):
+                    cursor.execute(
+                        "SELECT count(*) FROM pg_stat_activity "
+                        "WHERE wait_event_type = 'Lock'"
+                    )
+                    self.samples.append(cursor.fetchone()[0])
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class LoadTest:
+    """Walk `hash_ids` through the survey with `concurrency` respondents at
+    a time, waiting uniformly random 0-2x `think_time` seconds between
+    requests of a respondent.
+
+    `driver` is called once per respondent and must return an object with
+    `request(method, url, data)` method (see `ClientDriver`)."""
+
+    def __init__(self, hash_ids, driver=ClientDriver, concurrency=10,
+                 think_time=0.0, seed=None):
+        self.hash_ids = hash_ids
+        self.driver = driver
+        self.concurrency = concurrency
+        self.think_time = think_time
+        self.random = random.Random(seed)
+        self.records = []
+        self.lock = threading.Lock()
+        self.lock_samples = []
+        self.duration = 0.0
+
+    def run(self):
+        queue = Queue()
+        for hash_id in self.hash_ids:
+            queue.put(hash_id)
+
+        sampler = None
+        if connection.vendor == 'postgresql':
+            sampler = LockSampler()
+            sampler.start()
+
+        workers = [
+            threading.Thread(target=self.worker, args=(queue,))
+            for _ in range(min(self.concurrency, len(self.hash_ids)))
+        ]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.duration = time.perf_counter() - start
+
+        if sampler is not None:
+            sampler.stop()
+            self.lock_samples = sampler.samples
+        return self
+
+    def worker(self, queue):
+        try:
+            while True:
+                try:
+                    hash_id = queue.get_nowait()
+                except Empty:
+                    return
+                self.respondent(hash_id)
+        finally:
+            # every thread has its own database connection
+            connections.close_all()
+
+    def respondent(self, hash_id):
+        driver = self.driver()
+        for step in journey_steps(hash_id):
+            if self.think_time:
+                with self.lock:
+                    pause = self.random.uniform(0, 2 * self.think_time)
+                time.sleep(pause)
+
+            error = None
+            start = time.perf_counter()
+            try:
+                status = driver.request(step['method'], step['url'],
+                                        step['data'])
+            except Exception as e:
+                # e.g. database errors raised by views called in-process
+                status, error = None, e
+            elapsed = time.perf_counter() - start
+
+            failed = error is not None or status >= 500 or (
+                step['method'] == 'POST' and status != POST_STATUS
+            )
+            with self.lock:
+                self.records.append({
+                    'view': step['view'],
+                    'stage': step['stage'],
+                    'method': step['method'],
+                    'status': status,
+                    'time': elapsed,
+                    'failed': failed,
+                    'lock_error': error is not None and is_lock_error(error),
+                    'server_error': status is not None and status >= 500,
+                })
+            if failed:
+                # the rest of the journey depends on this step
+                return
+
+    def report(self):
+        """Return one row per (view, stage, method) with latency
+        percentiles in ms, and a `total` row with throughput and lock
+        contention.
+
+        `lock_errors` are only known for views called in-process; over HTTP
+        they are among `server_errors` (responses with 5xx status)."""
+        groups = defaultdict(list)
+        for record in self.records:
+            groups[record['view'], record['stage'],
+                   record['method']].append(record)
+
+        rows = [
+            self.summary(records, view=view, stage=stage, method=method)
+            for (view, stage, method), records in groups.items()
+        ]
+        total = self.summary(self.records, view='total', stage=None,
+                             method=None)
+        duration = self.duration or float('nan')
+        total.update({
+            'requests_per_s': len(self.records) / duration,
+            'journeys_per_s': sum(
+                1 for record in self.records
+                if record['view'] == 'rank_start' and record['stage'] == 5
+                and not record['failed']
+            ) / duration,
+        })
+        if self.lock_samples:
+            total.update({
+                'lock_waits_mean': float(np.mean(self.lock_samples)),
+                'lock_waits_max': int(max(self.lock_samples)),
+            })
+        rows.append(total)
+        return rows
+
+    @staticmethod
+    def summary(records, **row):
+        times = np.array([record['time'] for record in records]) * 1000
+        row['requests'] = len(records)
+        row['failed'] = sum(record['failed'] for record in records)
+        row['lock_errors'] = sum(record['lock_error'] for record in records)
+        row['server_errors'] = sum(
+            record['server_error'] for record in records
+        )
+        for percentile in PERCENTILES:
+            row['p{}_ms'.format(percentile)] = (
+                float(np.percentile(times, percentile)) if len(times)
+                else None
+            )
+        row['max_ms'] = float(times.max()) if len(times) else None
+        return row
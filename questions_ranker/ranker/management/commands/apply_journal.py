@@ -0,0 +1,62 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ranker.journal import (
+    DEFAULT_BATCH_SIZE,
+    AlreadyApplying,
+    apply_journal,
+    journal_enabled,
+)
+
+
+class Command(BaseCommand):
+    help = ("Apply stage submissions from the write-behind journal "
+            "(RANKER_JOURNAL_DIR) to the database, continuously unless "
+            "--once is given.  Records not applied before a crash are "
+            "applied on the next start.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help="Number of records applied in one transaction.",
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help="Seconds between checks for new records.",
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Apply records in the journal and exit.",
+        )
+
+    def handle(self, *args, **options):
+        if not journal_enabled():
+            raise CommandError("Write-behind journal is disabled "
+                               "(RANKER_JOURNAL_DIR).")
+
+        total = Counter()
+        try:
+            while True:
+                stats = Counter()
+                for stats in apply_journal(
+                        batch_size=options['batch_size']):
+                    if options['verbosity'] > 1:
+                        self.stdout.write("{records} records applied".format(
+                            **stats))
+                total.update(stats)
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except AlreadyApplying as e:
+            raise CommandError(
+                "Journal in {} is being applied by another process.".format(e)
+            )
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            "Applied {} and skipped {} journal records.".format(
+                total['applied'], total['skipped'])
+        ))
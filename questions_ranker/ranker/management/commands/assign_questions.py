@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ranker.assignment import preassign_questions
+
+
+class Command(BaseCommand):
+    help = ("Assign stage 1 and stage 2 questions to all rankings that don't "
+            "have them yet, so that first visit doesn't have to.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help="Number of rankings processed in one transaction.",
+        )
+
+    def handle(self, *args, **options):
+        processed = 0
+        try:
+            for processed in preassign_questions(
+                    chunk_size=options['chunk_size']):
+                if options['verbosity'] > 1:
+                    self.stdout.write("{} rankings assigned".format(processed))
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            "Assigned questions to {} rankings.".format(processed)
+        ))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ranker.benchmarks import generate_rankings, hot_queries, rolled_back
+from ranker.models import Ranking
+
+
+class Command(BaseCommand):
+    help = ("Show database query plans of the survey hot path queries, run "
+            "against a generated dataset (rolled back afterwards).")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rankings', type=int, default=10000,
+            help="Number of rankings to generate (each gets 40 entries).",
+        )
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help="Execute queries and show actual timings (PostgreSQL).",
+        )
+
+    def handle(self, *args, **options):
+        explain_options = {}
+        if options['analyze']:
+            explain_options['analyze'] = True
+
+        with rolled_back():
+            generate_rankings(options['rankings'])
+            # let the query planner see the generated data
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            ranking = Ranking.objects.filter(stage=2).order_by('?').first()
+            if ranking is None:
+                raise CommandError("No ranking in stage 2 was generated.")
+
+            for name, queryset in hot_queries(ranking):
+                try:
+                    plan = queryset.explain(**explain_options)
+                except ValueError as e:
+                    raise CommandError(str(e))
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                self.stdout.write(str(queryset.query))
+                self.stdout.write(plan)
+                self.stdout.write('')
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ranker.export import (
+    COLUMNS,
+    DEFAULT_CHUNK_SIZE,
+    EXPORT_FORMATS,
+    STATISTICS_COLUMNS,
+    export_rows,
+    statistics_rows,
+    write_lines,
+    write_parquet,
+)
+
+
+class Command(BaseCommand):
+    help = ("Export all ranking entries joined with their rankings, questions "
+            "and categories. Rows are streamed, so memory use is constant.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', choices=EXPORT_FORMATS, default='csv', dest='fmt',
+        )
+        parser.add_argument(
+            '--output', '-o', default='-',
+            help="Output file ('-', the default, means standard output; "
+                 "not allowed for Parquet).",
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help="Number of rows fetched from the database at once.",
+        )
+        parser.add_argument(
+            '--statistics', action='store_true',
+            help="Export per-question rank statistics instead of entries.",
+        )
+
+    def handle(self, *args, **options):
+        fmt, output = options['fmt'], options['output']
+        if options['statistics']:
+            rows = statistics_rows(chunk_size=options['chunk_size'])
+            columns = STATISTICS_COLUMNS
+        else:
+            rows = export_rows(chunk_size=options['chunk_size'])
+            columns = COLUMNS
+
+        if fmt == 'parquet':
+            if options['statistics']:
+                raise CommandError("Statistics can be exported as CSV or "
+                                   "JSON Lines only.")
+            if output == '-':
+                raise CommandError("Parquet export needs --output file.")
+            try:
+                written = write_parquet(rows, output,
+                                        chunk_size=options['chunk_size'])
+            except ImportError:
+                raise CommandError("Parquet export requires pyarrow.")
+        elif output == '-':
+            written = write_lines(rows, self.stdout, fmt, columns)
+        else:
+            with open(output, 'w', newline='', encoding='utf-8') as f:
+                written = write_lines(rows, f, fmt, columns)
+
+        # keep standard output clean for the exported data
+        self.stderr.write("Exported {} rows.".format(written))
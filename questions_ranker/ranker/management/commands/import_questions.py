@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from questions_ranker.users.models import User
+from ranker.importing import DEFAULT_BATCH_SIZE, import_questions
+
+
+class Command(BaseCommand):
+    help = ("Import questions from a CSV file with ID, Category and Question "
+            "columns; existing questions are skipped unless --update is "
+            "given.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('filename')
+        parser.add_argument(
+            '--update', action='store_true',
+            help="Update category and content of existing questions.",
+        )
+        parser.add_argument(
+            '--author', default='admin',
+            help="Username of the author of imported questions and "
+                 "categories.",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help="Number of rows saved at once.",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Roll back all changes at the end.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            author = User.objects.get(username=options['author'])
+        except User.DoesNotExist:
+            raise CommandError("User {!r} doesn't exist.".format(
+                options['author']))
+
+        stats = {}
+        try:
+            with open(options['filename'], newline='') as lines:
+                for stats in import_questions(
+                        lines, author, update=options['update'],
+                        batch_size=options['batch_size'],
+                        dry_run=options['dry_run']):
+                    if options['verbosity'] > 0:
+                        self.stdout.write("{} rows processed".format(
+                            stats['rows']))
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        summary = ', '.join(
+            '{} {}'.format(stats.get(key, 0), key.replace('_', ' '))
+            for key in ('created', 'updated', 'unchanged', 'skipped',
+                        'categories_created')
+        )
+        if options['dry_run']:
+            summary = "Dry run, rolled back: " + summary
+        self.stdout.write(self.style.SUCCESS(summary + '.'))
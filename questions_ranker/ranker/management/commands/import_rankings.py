@@ -0,0 +1,98 @@
+import sys
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ranker.assignment import preassign_questions
+from ranker.importing import (
+    DEFAULT_BATCH_SIZE,
+    generate_hash_ids,
+    hash_id_lines,
+    import_hash_ids,
+)
+
+
+@contextmanager
+def unclosed(value):
+    """Context manager yielding `value`, which is left open (like
+    `contextlib.nullcontext` of Python 3.7)."""
+    yield value
+
+
+class Command(BaseCommand):
+    help = ("Create rankings from a file with one hash id per line ('-' for "
+            "standard input), or with N generated random hash ids.  Invalid "
+            "(not matching [a-z0-9]+), duplicate and existing ids are "
+            "skipped.")
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group()
+        source.add_argument('filename', nargs='?')
+        source.add_argument(
+            '--generate', type=int, metavar='N',
+            help="Generate N cryptographically random hash ids.",
+        )
+        parser.add_argument(
+            '--output', '-o',
+            help="Write created hash ids to this file ('-' for standard "
+                 "output), e.g. to send out generated survey links.",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help="Number of hash ids saved in one transaction.",
+        )
+        parser.add_argument(
+            '--assign', action='store_true',
+            help="Pre-assign questions to new rankings.",
+        )
+
+    def handle(self, *args, **options):
+        if options['filename'] is None and options['generate'] is None:
+            raise CommandError("Give a filename or --generate N.")
+
+        # results go to stderr, so that created ids can be piped
+        log = self.stderr if options['output'] == '-' else self.stdout
+        try:
+            with self.open_input(options) as lines, \
+                    self.open_output(options['output']) as output:
+                if options['generate'] is not None:
+                    hash_ids = generate_hash_ids(options['generate'])
+                else:
+                    hash_ids = hash_id_lines(lines)
+
+                stats = {}
+                for stats in import_hash_ids(
+                        hash_ids, batch_size=options['batch_size'],
+                        output=output):
+                    if options['verbosity'] > 1:
+                        log.write("{} hash ids processed".format(
+                            stats['rows']))
+        except OSError as e:
+            raise CommandError(str(e))
+
+        log.write(self.style.SUCCESS(', '.join(
+            '{} {}'.format(stats.get(key, 0), key)
+            for key in ('created', 'existing', 'duplicate', 'invalid')
+        ) + '.'))
+
+        if options['assign']:
+            assigned = 0
+            try:
+                for assigned in preassign_questions():
+                    pass
+            except ValueError as e:
+                raise CommandError(str(e))
+            log.write("Assigned questions to {} rankings.".format(assigned))
+
+    @staticmethod
+    def open_input(options):
+        if options['filename'] in (None, '-'):
+            return unclosed(sys.stdin)
+        return open(options['filename'])
+
+    def open_output(self, path):
+        if path is None:
+            return unclosed(None)
+        if path == '-':
+            return unclosed(self.stdout)
+        return open(path, 'w')
@@ -0,0 +1,109 @@
+import json
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from ranker.loadtest import (
+    ClientDriver,
+    HTTPDriver,
+    LoadTest,
+    create_rankings,
+    journey_email,
+)
+from ranker.models import DrawEntry, Ranking, RankingEntry
+from ranker.summary import removal_changes, update_summary
+
+
+class Command(BaseCommand):
+    help = ("Simulate concurrent respondents completing the survey and report "
+            "throughput, latency percentiles per view and database lock "
+            "contention.  Creates rankings for the respondents and deletes "
+            "them afterwards; use a test deployment.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--respondents', type=int, default=50,
+            help="Number of survey journeys.",
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=10,
+            help="Number of respondents active at the same time.",
+        )
+        parser.add_argument(
+            '--think-time', type=float, default=0.0,
+            help="Mean pause (in seconds) between requests of a respondent.",
+        )
+        parser.add_argument(
+            '--url',
+            help="Base URL of a running server using the same database, "
+                 "e.g. http://127.0.0.1:8000; views are called in-process "
+                 "if not provided.",
+        )
+        parser.add_argument(
+            '--seed', type=int, default=None,
+            help="Seed of the think time generator.",
+        )
+        parser.add_argument(
+            '--keep', action='store_true',
+            help="Keep generated rankings and draw entries.",
+        )
+        parser.add_argument(
+            '--json', action='store_true', dest='as_json',
+            help="Output results as JSON.",
+        )
+
+    def handle(self, *args, **options):
+        if options['url']:
+            driver = partial(HTTPDriver, options['url'])
+        elif settings.RANKER_SURVEY_CLOSED:
+            raise CommandError("Survey is closed (RANKER_SURVEY_CLOSED).")
+        else:
+            driver = ClientDriver
+
+        hash_ids = create_rankings(options['respondents'])
+        try:
+            with override_settings(
+                    ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ['testserver']):
+                test = LoadTest(
+                    hash_ids, driver=driver,
+                    concurrency=options['concurrency'],
+                    think_time=options['think_time'], seed=options['seed'],
+                ).run()
+        finally:
+            if not options['keep']:
+                self.clean_up(hash_ids)
+
+        rows = test.report()
+        if options['as_json']:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+
+        for row in rows:
+            self.stdout.write('  '.join(
+                '{}={}'.format(key, self.format_value(value))
+                for key, value in row.items()
+            ))
+
+    @staticmethod
+    @transaction.atomic
+    def clean_up(hash_ids):
+        """Delete rankings of `hash_ids` with their rank counts and draw
+        entries."""
+        changes = removal_changes(
+            RankingEntry.objects.filter(ranking__hash_id__in=hash_ids)
+        )
+        Ranking.objects.filter(hash_id__in=hash_ids).delete()
+        update_summary(changes)
+        # real respondents may have entered the draw in the meantime
+        DrawEntry.objects.filter(
+            email__in=[journey_email(hash_id) for hash_id in hash_ids],
+        ).delete()
+
+    @staticmethod
+    def format_value(value):
+        if isinstance(value, float):
+            return '{:.2f}'.format(value)
+        return value
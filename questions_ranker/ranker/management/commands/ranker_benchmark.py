@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ranker.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = "Run one of the ranker micro-benchmarks and print its results."
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(BENCHMARKS))
+        parser.add_argument(
+            '--repeat', type=int, default=None,
+            help="Number of measured calls per case (benchmark's default "
+                 "if not provided).",
+        )
+        parser.add_argument(
+            '--json', action='store_true', dest='as_json',
+            help="Output results as JSON.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            results = BENCHMARKS[options['name']](repeat=options['repeat'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['as_json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for row in results:
+            self.stdout.write('  '.join(
+                '{}={}'.format(key, self.format_value(value))
+                for key, value in row.items()
+            ))
+
+    @staticmethod
+    def format_value(value):
+        if isinstance(value, float):
+            return '{:.2f}'.format(value)
+        return value
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from ranker.summary import rebuild_summary
+
+
+class Command(BaseCommand):
+    help = "Recompute materialized per-question rank counts from scratch."
+
+    def handle(self, *args, **options):
+        questions = rebuild_summary()
+        self.stdout.write(self.style.SUCCESS(
+            "Rebuilt rank summary of {} questions.".format(questions)
+        ))
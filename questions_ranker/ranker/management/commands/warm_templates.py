@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from ranker.warmup import precompile_templates, warm_up_pages
+
+
+class Command(BaseCommand):
+    help = ("Compile all project templates and render every ranker page "
+            "once, showing render times; fails on broken templates.  Useful "
+            "as a deploy check: caches filled this way belong to this "
+            "process only (workers precompile templates on their own, see "
+            "RANKER_PRECOMPILE_TEMPLATES).")
+
+    def handle(self, *args, **options):
+        compiled = precompile_templates()
+        self.stdout.write("Compiled {} templates.".format(compiled))
+
+        for name, elapsed in warm_up_pages():
+            self.stdout.write("{}: {:.2f} ms".format(name, elapsed * 1000))
+        self.stdout.write(self.style.SUCCESS("Templates are warm."))
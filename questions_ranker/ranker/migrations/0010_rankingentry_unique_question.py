@@ -0,0 +1,46 @@
+# Generated by Django 2.1.5 on 2026-10-18 11:03
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def remove_duplicate_entries(apps, schema_editor):
+    """Keep one entry of every question assigned to a ranking more than once
+    (by concurrent first visits): the ranked one, or the first one if none
+    is ranked."""
+    RankingEntry = apps.get_model('ranker', 'RankingEntry')
+    duplicated = (
+        RankingEntry.objects.order_by()
+                            .values_list('ranking_id', 'question_id')
+                            .annotate(entries=Count('pk'))
+                            .filter(entries__gt=1)
+    )
+    for ranking_id, question_id, _ in list(duplicated):
+        entries = list(
+            RankingEntry.objects.filter(ranking_id=ranking_id,
+                                        question_id=question_id)
+                                .order_by('pk')
+                                .values_list('pk', 'rank')
+        )
+        ranked = [pk for pk, rank in entries if rank]
+        keep = ranked[0] if ranked else entries[0][0]
+        RankingEntry.objects.filter(
+            pk__in=[pk for pk, _ in entries if pk != keep],
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ranker', '0009_auto_20181025_1759'),
+    ]
+
+    operations = [
+        # the unique constraint can't be added while duplicates exist
+        migrations.RunPython(remove_duplicate_entries,
+                             migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='rankingentry',
+            unique_together={('ranking', 'question')},
+        ),
+    ]
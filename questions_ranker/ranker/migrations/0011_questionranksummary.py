@@ -0,0 +1,53 @@
+# Generated by Django 2.1.5 on 2026-10-18 11:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_summary(apps, schema_editor):
+    Question = apps.get_model('ranker', 'Question')
+    RankingEntry = apps.get_model('ranker', 'RankingEntry')
+    QuestionRankSummary = apps.get_model('ranker', 'QuestionRankSummary')
+    summaries = {
+        question_id: QuestionRankSummary(question_id=question_id)
+        for question_id in Question.objects.values_list('pk', flat=True)
+    }
+    counts = (
+        RankingEntry.objects.filter(rank__isnull=False)
+                            .order_by()
+                            .values_list('question_id', 'rank')
+                            .annotate(models.Count('pk'))
+    )
+    for question_id, rank, count in counts:
+        summary = summaries[question_id]
+        setattr(summary, '{}_count'.format(rank), count)
+        summary.total_ranks += count
+    QuestionRankSummary.objects.bulk_create(summaries.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ranker', '0010_rankingentry_unique_question'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionRankSummary',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rank_summary', serialize=False, to='ranker.Question', verbose_name='Question')),
+                ('vunimportant_count', models.PositiveIntegerField(default=0, verbose_name='Very unimportant')),
+                ('unimportant_count', models.PositiveIntegerField(default=0, verbose_name='Unimportant')),
+                ('indifferent_count', models.PositiveIntegerField(default=0, verbose_name='Indifferent')),
+                ('important_count', models.PositiveIntegerField(default=0, verbose_name='Important')),
+                ('vimportant_count', models.PositiveIntegerField(default=0, verbose_name='Very important')),
+                ('dont_understand_count', models.PositiveIntegerField(default=0, verbose_name="I don't understand")),
+                ('total_ranks', models.PositiveIntegerField(default=0, verbose_name='Total')),
+            ],
+            options={
+                'verbose_name': 'Question rank summary',
+                'verbose_name_plural': 'Question rank summaries',
+            },
+        ),
+        migrations.RunPython(build_summary, migrations.RunPython.noop),
+    ]
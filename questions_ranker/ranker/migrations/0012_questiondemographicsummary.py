@@ -0,0 +1,25 @@
+# Generated by Django 2.1.5 on 2026-10-18 11:17
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ranker', '0011_questionranksummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionDemographicSummary',
+            fields=[
+            ],
+            options={
+                'verbose_name': 'Question demographic summary',
+                'verbose_name_plural': 'Questions demographic summary',
+                'proxy': True,
+                'indexes': [],
+            },
+            bases=('ranker.question',),
+        ),
+    ]
@@ -0,0 +1,158 @@
+# Generated by Django 2.1.5 on 2026-10-18 11:19
+
+from django.db import migrations, models
+
+
+TIME_SPENT = {'none': 1, 'tens': 2, 'hundreds': 3, 'primary': 4}
+DAILY_ACCESS = {
+    'none': 1, 'quarter': 2, 'quertertothree': 3, 'morethanthree': 4,
+}
+DEMOGRAPHIC_CODES = {
+    'teaching_children_in_schools': TIME_SPENT,
+    'teaching_teens_in_schools': TIME_SPENT,
+    'teaching_students': TIME_SPENT,
+    'teaching_adults': TIME_SPENT,
+    'teaching_children_free_range': TIME_SPENT,
+    'teaching_teens_free_range': TIME_SPENT,
+    'teaching_adults_free_range': TIME_SPENT,
+    'daily_home_computer': DAILY_ACCESS,
+    'daily_school_computer': DAILY_ACCESS,
+    'daily_smartphone': DAILY_ACCESS,
+    'daily_broadband': DAILY_ACCESS,
+    'daily_lowspeed': DAILY_ACCESS,
+    'comp_research_involvement': {
+        'none': 1, 'rare': 2, 'regular': 3, 'occasional': 4, 'primary': 5,
+    },
+}
+RANK_CODES = {
+    'vunimportant': 1, 'unimportant': 2, 'indifferent': 3, 'important': 4,
+    'vimportant': 5, 'dont_understand': 6,
+}
+
+
+def recode(model, field, mapping):
+    # one UPDATE per choice, so rows are never loaded
+    for old, new in mapping.items():
+        model.objects.filter(**{field: old}).update(**{field: new})
+
+
+def encode(apps, schema_editor):
+    """Replace choice strings with codes (still as strings); the following
+    AlterField operations convert columns to integers."""
+    Ranking = apps.get_model('ranker', 'Ranking')
+    RankingEntry = apps.get_model('ranker', 'RankingEntry')
+    for field, codes in DEMOGRAPHIC_CODES.items():
+        mapping = {slug: str(code) for slug, code in codes.items()}
+        mapping[''] = None  # not answered yet
+        recode(Ranking, field, mapping)
+    recode(RankingEntry, 'rank',
+           {slug: str(code) for slug, code in RANK_CODES.items()})
+
+
+def decode(apps, schema_editor):
+    Ranking = apps.get_model('ranker', 'Ranking')
+    RankingEntry = apps.get_model('ranker', 'RankingEntry')
+    for field, codes in DEMOGRAPHIC_CODES.items():
+        mapping = {str(code): slug for slug, code in codes.items()}
+        mapping[None] = ''
+        recode(Ranking, field, mapping)
+    recode(RankingEntry, 'rank',
+           {str(code): slug for slug, code in RANK_CODES.items()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ranker', '0012_questiondemographicsummary'),
+    ]
+
+    operations = [
+        # demographic answers which weren't given yet become NULLs
+        *[
+            migrations.AlterField(
+                model_name='ranking',
+                name=field,
+                field=models.CharField(default='', max_length=50, null=True),
+            )
+            for field in DEMOGRAPHIC_CODES
+        ],
+        migrations.RunPython(encode, decode),
+        migrations.AlterField(
+            model_name='ranking',
+            name='comp_research_involvement',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'I have no involvement.'), (2, "I sometimes read results from studies or go to presentations but don't do any research myself."), (3, "I regularly read results from studies or go to presentations but don't do any research myself."), (4, 'I occasionally dabble in computing education research myself.'), (5, 'Computing education research is my primary occuption.')], default=None, help_text='Select the option that best describes you.', null=True, verbose_name='How involved you are personally in computing education research?'),
+        ),
+        migrations.AlterField(
+            model_name='ranking',
+            name='daily_broadband',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'None'), (2, 'Less than a quarter'), (3, 'One quarter to three quarters'), (4, 'More than three quarters')], default=None, null=True, verbose_name='What fraction of your learners has daily access to high-speed / broadband internet?'),
+        ),
+        migrations.AlterField(
+            model_name='ranking',
+            name='daily_home_computer',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'None'), (2, 'Less than a quarter'), (3, 'One quarter to three quarters'), (4, 'More than three quarters')], default=None, null=True, verbose_name='What fraction of your learners has daily access to laptop or computer at home?'),
+        ),
+        migrations.AlterField(
+            model_name='ranking',
+            name='daily_lowspeed',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'None'), (2, 'Less than a quarter'), (3, 'One quarter to three quarters'), (4, 'More than three quarters')], default=None, null=True, verbose_name='What fraction of your learners has daily access to only low-speed internet?'),
+        ),
+        migrations.AlterField(
+            model_name='ranking',
+            name='daily_school_computer',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'None'), (2, 'Less than a quarter'), (3, 'One quarter to three quarters'), (4, 'More than three quarters')], default=None, null=True, verbose_name='What fraction of your learners has daily access to school or library computer?'),
+        ),
+        migrations.AlterField(
+            model_name='ranking',
+            name='daily_smartphone',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'None'), (2, 'Less than a quarter'), (3, 'One quarter to three quarters'), (4, 'More than three quarters')], default=None, null=True, verbose_name='What fraction of your learners has daily access to tablet or smartphone?'),
+        ),
+        migrations.AlterField(
+            model_name='ranking',
+            name='teaching_adults',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'None'), (2, 'Tens of hours'), (3, 'Hundreds of hours'), (4, 'Primary activity')], default=None, null=True, verbose_name='How much time you have spent in the last five years teaching adults in workplaces (e.g. staff training)?'),
+        ),
+        migrations.AlterField(
+            model_name='ranking',
+            name='teaching_adults_free_range',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'None'), (2, 'Tens of hours'), (3, 'Hundreds of hours'), (4, 'Primary activity')], default=None, null=True, verbose_name='How much time you have spent in the last five years teaching adults in free-range programs (i.e. outside traditional classrooms)?'),
+        ),
+        migrations.AlterField(
+            model_name='ranking',
+            name='teaching_children_free_range',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'None'), (2, 'Tens of hours'), (3, 'Hundreds of hours'), (4, 'Primary activity')], default=None, null=True, verbose_name='How much time you have spent in the last five years teaching children in free-range programs (i.e. outside traditional classrooms)?'),
+        ),
+        migrations.AlterField(
+            model_name='ranking',
+            name='teaching_children_in_schools',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'None'), (2, 'Tens of hours'), (3, 'Hundreds of hours'), (4, 'Primary activity')], default=None, null=True, verbose_name='How much time you have spent in the last five years teaching children in schools?'),
+        ),
+        migrations.AlterField(
+            model_name='ranking',
+            name='teaching_students',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'None'), (2, 'Tens of hours'), (3, 'Hundreds of hours'), (4, 'Primary activity')], default=None, null=True, verbose_name='How much time you have spent in the last five years teaching college/university students?'),
+        ),
+        migrations.AlterField(
+            model_name='ranking',
+            name='teaching_teens_free_range',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'None'), (2, 'Tens of hours'), (3, 'Hundreds of hours'), (4, 'Primary activity')], default=None, null=True, verbose_name='How much time you have spent in the last five years teaching teens in free-range programs (i.e. outside traditional classrooms)?'),
+        ),
+        migrations.AlterField(
+            model_name='ranking',
+            name='teaching_teens_in_schools',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'None'), (2, 'Tens of hours'), (3, 'Hundreds of hours'), (4, 'Primary activity')], default=None, null=True, verbose_name='How much time you have spent in the last five years teaching teens in schools?'),
+        ),
+        migrations.AlterField(
+            model_name='rankingentry',
+            name='rank',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Very unimportant'), (2, 'Unimportant'), (3, 'Indifferent'), (4, 'Important'), (5, 'Very important'), (6, "I don't understand")], null=True, verbose_name='Selected rank'),
+        ),
+        migrations.AddIndex(
+            model_name='rankingentry',
+            index=models.Index(fields=['question', 'rank'], name='ranker_rank_questio_1fc14d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rankingentry',
+            index=models.Index(fields=['ranking', 'stage'], name='ranker_rank_ranking_245ec6_idx'),
+        ),
+    ]
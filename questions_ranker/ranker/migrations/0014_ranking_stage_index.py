@@ -0,0 +1,17 @@
+# Generated by Django 2.1.5 on 2026-10-18 11:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ranker', '0013_integer_codes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ranking',
+            index=models.Index(fields=['stage', 'last_updated_at'], name='ranker_rank_stage_832961_idx'),
+        ),
+    ]
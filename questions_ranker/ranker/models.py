@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from questions_ranker.users.models import User
 
@@ -93,6 +94,23 @@ class Question(ActiveMixin, CreatedUpdatedMixin, AuthoredMixin, models.Model):
         return "Question #{}: {}".format(self.pk, title)
 
 
+class RankingQuerySet(models.QuerySet):
+    def advance_stage(self, pk, stage, **fields):
+        """Move ranking `pk` from the previous stage to `stage`, setting
+        `fields` (e.g. answers of the stage) at the same time.
+
+        It's a single UPDATE conditional on the previous stage, so only one
+        of concurrent submissions of a stage (e.g. from two tabs, or
+        a retried request) can succeed.  Returns `False` and writes nothing
+        if the ranking isn't in the previous stage anymore."""
+        return bool(self.filter(pk=pk, stage=stage - 1).update(
+            stage=stage,
+            # `update` doesn't set `auto_now` fields
+            last_updated_at=timezone.now(),
+            **fields
+        ))
+
+
 class Ranking(CreatedUpdatedMixin, models.Model):
     """A ranking, ie. list of questions with their rank, contributed by
     a user."""
@@ -114,52 +132,53 @@ class Ranking(CreatedUpdatedMixin, models.Model):
         Question, through='RankingEntry',
     )
 
+    # demographic answers are stored as small integer codes
     TIME_SPENT_CHOICES = (
-        ('none', _("None")),
-        ('tens', _("Tens of hours")),
-        ('hundreds', _("Hundreds of hours")),
-        ('primary', _("Primary activity")),
+        (1, _("None")),
+        (2, _("Tens of hours")),
+        (3, _("Hundreds of hours")),
+        (4, _("Primary activity")),
     )
-    teaching_children_in_schools = models.CharField(
-        null=False, blank=False, default="", max_length=50,
+    teaching_children_in_schools = models.PositiveSmallIntegerField(
+        null=True, blank=False, default=None,
         choices=TIME_SPENT_CHOICES,
         verbose_name=_("How much time you have spent in the last five years "
                        "teaching children in schools?"),
     )
-    teaching_teens_in_schools = models.CharField(
-        null=False, blank=False, default="", max_length=50,
+    teaching_teens_in_schools = models.PositiveSmallIntegerField(
+        null=True, blank=False, default=None,
         choices=TIME_SPENT_CHOICES,
         verbose_name=_("How much time you have spent in the last five years "
                        "teaching teens in schools?"),
     )
-    teaching_students = models.CharField(
-        null=False, blank=False, default="", max_length=50,
+    teaching_students = models.PositiveSmallIntegerField(
+        null=True, blank=False, default=None,
         choices=TIME_SPENT_CHOICES,
         verbose_name=_("How much time you have spent in the last five years "
                        "teaching college/university students?"),
     )
-    teaching_adults = models.CharField(
-        null=False, blank=False, default="", max_length=50,
+    teaching_adults = models.PositiveSmallIntegerField(
+        null=True, blank=False, default=None,
         choices=TIME_SPENT_CHOICES,
         verbose_name=_("How much time you have spent in the last five years "
                        "teaching adults in workplaces (e.g. staff training)?"),
     )
-    teaching_children_free_range = models.CharField(
-        null=False, blank=False, default="", max_length=50,
+    teaching_children_free_range = models.PositiveSmallIntegerField(
+        null=True, blank=False, default=None,
         choices=TIME_SPENT_CHOICES,
         verbose_name=_("How much time you have spent in the last five years "
                        "teaching children in free-range programs (i.e. "
                        "outside traditional classrooms)?"),
     )
-    teaching_teens_free_range = models.CharField(
-        null=False, blank=False, default="", max_length=50,
+    teaching_teens_free_range = models.PositiveSmallIntegerField(
+        null=True, blank=False, default=None,
         choices=TIME_SPENT_CHOICES,
         verbose_name=_("How much time you have spent in the last five years "
                        "teaching teens in free-range programs (i.e. "
                        "outside traditional classrooms)?"),
     )
-    teaching_adults_free_range = models.CharField(
-        null=False, blank=False, default="", max_length=50,
+    teaching_adults_free_range = models.PositiveSmallIntegerField(
+        null=True, blank=False, default=None,
         choices=TIME_SPENT_CHOICES,
         verbose_name=_("How much time you have spent in the last five years "
                        "teaching adults in free-range programs (i.e. "
@@ -167,60 +186,62 @@ class Ranking(CreatedUpdatedMixin, models.Model):
     )
 
     DAILY_ACCESS_CHOICES = (
-        ('none', _("None")),
-        ('quarter', _("Less than a quarter")),
-        ('quertertothree', _("One quarter to three quarters")),
-        ('morethanthree', _("More than three quarters")),
+        (1, _("None")),
+        (2, _("Less than a quarter")),
+        (3, _("One quarter to three quarters")),
+        (4, _("More than three quarters")),
     )
-    daily_home_computer = models.CharField(
-        null=False, blank=False, default="", max_length=50,
+    daily_home_computer = models.PositiveSmallIntegerField(
+        null=True, blank=False, default=None,
         choices=DAILY_ACCESS_CHOICES,
         verbose_name=_("What fraction of your learners has daily access to "
                        "laptop or computer at home?"),
     )
-    daily_school_computer = models.CharField(
-        null=False, blank=False, default="", max_length=50,
+    daily_school_computer = models.PositiveSmallIntegerField(
+        null=True, blank=False, default=None,
         choices=DAILY_ACCESS_CHOICES,
         verbose_name=_("What fraction of your learners has daily access to "
                        "school or library computer?"),
     )
-    daily_smartphone = models.CharField(
-        null=False, blank=False, default="", max_length=50,
+    daily_smartphone = models.PositiveSmallIntegerField(
+        null=True, blank=False, default=None,
         choices=DAILY_ACCESS_CHOICES,
         verbose_name=_("What fraction of your learners has daily access to "
                        "tablet or smartphone?"),
     )
-    daily_broadband = models.CharField(
-        null=False, blank=False, default="", max_length=50,
+    daily_broadband = models.PositiveSmallIntegerField(
+        null=True, blank=False, default=None,
         choices=DAILY_ACCESS_CHOICES,
         verbose_name=_("What fraction of your learners has daily access to "
                        "high-speed / broadband internet?"),
     )
-    daily_lowspeed = models.CharField(
-        null=False, blank=False, default="", max_length=50,
+    daily_lowspeed = models.PositiveSmallIntegerField(
+        null=True, blank=False, default=None,
         choices=DAILY_ACCESS_CHOICES,
         verbose_name=_("What fraction of your learners has daily access to "
                        "only low-speed internet?"),
     )
 
     PERSONAL_INVOLVEMENT_CHOICES = (
-        ('none', _("I have no involvement.")),
-        ('rare', _("I sometimes read results from studies or go to "
+        (1, _("I have no involvement.")),
+        (2, _("I sometimes read results from studies or go to "
                    "presentations but don't do any research myself.")),
-        ('regular', _("I regularly read results from studies or go to "
+        (3, _("I regularly read results from studies or go to "
                       "presentations but don't do any research myself.")),
-        ('occasional', _("I occasionally dabble in computing education "
+        (4, _("I occasionally dabble in computing education "
                          "research myself.")),
-        ('primary', _("Computing education research is my primary occuption.")),
+        (5, _("Computing education research is my primary occuption.")),
     )
-    comp_research_involvement = models.CharField(
-        null=False, blank=False, default="", max_length=50,
+    comp_research_involvement = models.PositiveSmallIntegerField(
+        null=True, blank=False, default=None,
         choices=PERSONAL_INVOLVEMENT_CHOICES,
         verbose_name=_("How involved you are personally in "
                        "computing education research?"),
         help_text=_("Select the option that best describes you."),
     )
 
+    objects = RankingQuerySet.as_manager()
+
     def __str__(self):
         return "Person ranking #{} ({}, compl. stage {})".format(
             self.pk, self.hash_id, self.stage,
@@ -229,6 +250,33 @@ class Ranking(CreatedUpdatedMixin, models.Model):
     class Meta:
         verbose_name = "Person ranking"
         verbose_name_plural = "Person rankings"
+        # lookups by `hash_id` (with or without `stage`) use the unique index
+        indexes = [
+            # rankings completed since given time, e.g. cross-tab refresh
+            models.Index(fields=['stage', 'last_updated_at']),
+        ]
+
+
+class RankingEntryQuerySet(models.QuerySet):
+    def set_ranks(self, ranks):
+        """Update ranks of many entries with a single UPDATE query.
+
+        `ranks` is a dictionary mapping entry primary key to its new rank.
+        Returns number of updated entries."""
+        if not ranks:
+            return 0
+
+        pks_by_rank = {}
+        for pk, rank in ranks.items():
+            pks_by_rank.setdefault(rank, []).append(pk)
+
+        return self.filter(pk__in=ranks).update(rank=models.Case(
+            *[
+                models.When(pk__in=pks, then=models.Value(rank))
+                for rank, pks in pks_by_rank.items()
+            ],
+            output_field=self.model._meta.get_field('rank'),
+        ))
 
 
 class RankingEntry(models.Model):
@@ -243,17 +291,32 @@ class RankingEntry(models.Model):
         null=False, blank=False,
         verbose_name=_("Question"),
     )
+    # ranks are stored as small integer codes; importance ranks are ordered
+    VUNIMPORTANT = 1
+    UNIMPORTANT = 2
+    INDIFFERENT = 3
+    IMPORTANT = 4
+    VIMPORTANT = 5
+    DONT_UNDERSTAND = 6
     RANK_CHOICES = (
-        ('vunimportant', _("Very unimportant")),
-        ('unimportant', _("Unimportant")),
-        ('indifferent', _("Indifferent")),
-        ('important', _("Important")),
-        ('vimportant', _("Very important")),
-        ('dont_understand', _("I don't understand")),
-    )
-    rank = models.CharField(
+        (VUNIMPORTANT, _("Very unimportant")),
+        (UNIMPORTANT, _("Unimportant")),
+        (INDIFFERENT, _("Indifferent")),
+        (IMPORTANT, _("Important")),
+        (VIMPORTANT, _("Very important")),
+        (DONT_UNDERSTAND, _("I don't understand")),
+    )
+    # short names of ranks, e.g. in `QuestionRankSummary` field names
+    RANK_NAMES = {
+        VUNIMPORTANT: 'vunimportant',
+        UNIMPORTANT: 'unimportant',
+        INDIFFERENT: 'indifferent',
+        IMPORTANT: 'important',
+        VIMPORTANT: 'vimportant',
+        DONT_UNDERSTAND: 'dont_understand',
+    }
+    rank = models.PositiveSmallIntegerField(
         null=True, blank=False,
-        max_length=255,
         choices=RANK_CHOICES,
         verbose_name=_("Selected rank"),
     )
@@ -263,9 +326,20 @@ class RankingEntry(models.Model):
         help_text=_("Number of round of questions"),
     )
 
+    objects = RankingEntryQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("Ranking entry")
         verbose_name_plural = _("Ranking entries")
+        # a question can be assigned to a ranking only once (one assignment
+        # per ranking is ensured by `ranker.views.assign_questions`)
+        unique_together = ('ranking', 'question')
+        indexes = [
+            # rank counts of questions, e.g. `rebuild_summary`
+            models.Index(fields=['question', 'rank']),
+            # entries of a ranking stage, e.g. `rank_stage`
+            models.Index(fields=['ranking', 'stage']),
+        ]
 
 
 class DrawEntry(models.Model):
@@ -295,9 +369,61 @@ class DrawEntry(models.Model):
         verbose_name_plural = _("Draw entries")
 
 
+class QuestionRankSummary(models.Model):
+    """Number of times a question received each rank.
+
+    Kept up to date incrementally by `ranker.summary`, so that the summary of
+    questions doesn't have to aggregate all ranking entries."""
+    question = models.OneToOneField(
+        Question, on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='rank_summary',
+        verbose_name=_("Question"),
+    )
+    vunimportant_count = models.PositiveIntegerField(
+        null=False, blank=False, default=0,
+        verbose_name=_("Very unimportant"),
+    )
+    unimportant_count = models.PositiveIntegerField(
+        null=False, blank=False, default=0,
+        verbose_name=_("Unimportant"),
+    )
+    indifferent_count = models.PositiveIntegerField(
+        null=False, blank=False, default=0,
+        verbose_name=_("Indifferent"),
+    )
+    important_count = models.PositiveIntegerField(
+        null=False, blank=False, default=0,
+        verbose_name=_("Important"),
+    )
+    vimportant_count = models.PositiveIntegerField(
+        null=False, blank=False, default=0,
+        verbose_name=_("Very important"),
+    )
+    dont_understand_count = models.PositiveIntegerField(
+        null=False, blank=False, default=0,
+        verbose_name=_("I don't understand"),
+    )
+    total_ranks = models.PositiveIntegerField(
+        null=False, blank=False, default=0,
+        verbose_name=_("Total"),
+    )
+
+    class Meta:
+        verbose_name = _("Question rank summary")
+        verbose_name_plural = _("Question rank summaries")
+
+
 class QuestionSummary(Question):
     class Meta:
         # with `proxy = True` there's no "physical" database table created
         proxy = True
         verbose_name = 'Question summary'
         verbose_name_plural = 'Questions summary'
+
+
+class QuestionDemographicSummary(Question):
+    class Meta:
+        proxy = True
+        verbose_name = 'Question demographic summary'
+        verbose_name_plural = 'Questions demographic summary'
@@ -0,0 +1,61 @@
+"""Caching of survey pages.
+
+Invariant parts of survey pages (intro text, table headers) are wrapped in
+`{% cache %}` fragments keyed by stage and language.  Django keeps them in
+the `template_fragments` cache, which is configured to be local to every
+process: fragments depend on templates only, so they can't go stale until
+the next deploy, which starts new processes with empty caches.
+
+Completed rankings (stage 4 and up) can't be changed anymore and all of them
+show the same thank-you page, so `rank_start` serves them a response
+rendered once per process and language, without touching the database.
+Completed hash ids are remembered in the default (shared) cache; the marker
+is dropped when the ranking is deleted or moved back to an earlier stage
+(see `ranker.signals`).  Pages with messages to show (e.g. right after the
+last stage) are always rendered, so that messages aren't lost or leaked to
+other respondents.
+"""
+from django.contrib import messages
+from django.core.cache import cache, caches
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils import translation
+from django.utils.translation import ugettext as _
+
+FRAGMENT_CACHE = 'template_fragments'
+COMPLETED_KEY = 'ranker:completed:{}'
+THANKYOU_KEY = 'ranker:thankyou:{}'
+
+
+def is_completed(hash_id):
+    return cache.get(COMPLETED_KEY.format(hash_id), False)
+
+
+def mark_completed(hash_id):
+    cache.set(COMPLETED_KEY.format(hash_id), True, timeout=None)
+
+
+def forget_completed(hash_id):
+    cache.delete(COMPLETED_KEY.format(hash_id))
+
+
+def render_thankyou(request):
+    """Return thank-you page response, reusing the cached page when there
+    are no messages to show."""
+    context = {
+        'title': _("Thank you for participation"),
+        'page_header': _("Thank you!"),
+    }
+    # `len` loads pending messages without marking them as shown
+    if len(messages.get_messages(request)):
+        return HttpResponse(
+            render_to_string("ranker/thankyou.html", context, request),
+        )
+
+    pages = caches[FRAGMENT_CACHE]
+    key = THANKYOU_KEY.format(translation.get_language())
+    content = pages.get(key)
+    if content is None:
+        content = render_to_string("ranker/thankyou.html", context, request)
+        pages.set(key, content, timeout=None)
+    return HttpResponse(content)
@@ -0,0 +1,85 @@
+"""Random sampling of active question ids.
+
+Every worker process keeps a compact array of active question ids together
+with the version it was built for.  The version lives in the state cache
+(see `ranker.cache.StateCache`) and is replaced whenever questions change
+(see `ranker.signals`), so a draw costs one cache lookup and O(k) work
+instead of a full scan of the questions table.
+"""
+import random
+import uuid
+from array import array
+
+from .cache import state_cache
+from .models import Question
+
+VERSION_CACHE_KEY = 'ranker:active_question_ids:version'
+
+
+def new_version():
+    return uuid.uuid4().hex
+
+
+def sample_ids(ids, k):
+    """Draw `k` distinct items of `ids` (a sequence) in O(k).
+
+    Raises `ValueError` if there are fewer than `k` items."""
+    # `random.sample` over a range picks indices without materializing
+    # the population
+    return [ids[i] for i in random.sample(range(len(ids)), k)]
+
+
+def invalidate_active_question_ids():
+    """Mark every process-local snapshot of active question ids as stale."""
+    state_cache().set(VERSION_CACHE_KEY, new_version(), timeout=None)
+
+
+class ActiveQuestionIds:
+    """Versioned, process-local snapshot of active question ids."""
+
+    def __init__(self):
+        # (version, ids) pair is replaced as a whole so that concurrent
+        # threads never see ids from one version tagged with another
+        self._snapshot = (None, array('l'))
+
+    def current_version(self):
+        cache = state_cache()
+        version = cache.get(VERSION_CACHE_KEY)
+        if version is None:
+            # empty (or flushed) cache: start a new version; `add` makes sure
+            # all processes agree on the same one
+            cache.add(VERSION_CACHE_KEY, new_version(), timeout=None)
+            version = cache.get(VERSION_CACHE_KEY)
+        return version
+
+    def load_ids(self):
+        return array(
+            'l',
+            Question.objects.filter(active=True)
+                            .order_by('pk')
+                            .values_list('pk', flat=True)
+                            .iterator()
+        )
+
+    def get(self):
+        """Return array of active question ids, reloading it if stale."""
+        version = self.current_version()
+        snapshot_version, ids = self._snapshot
+        if version is None or version != snapshot_version:
+            ids = self.load_ids()
+            self._snapshot = (version, ids)
+        return ids
+
+    def sample(self, k):
+        """Draw `k` distinct active question ids in O(k).
+
+        Raises `ValueError` if there are fewer than `k` active questions."""
+        return sample_ids(self.get(), k)
+
+
+active_question_ids = ActiveQuestionIds()
+
+
+def sample_question_ids(k):
+    """Draw `k` distinct, randomly chosen ids of active questions."""
+    return active_question_ids.sample(k)
@@ -0,0 +1,69 @@
+"""Session-free survey pages.
+
+Respondents are anonymous and identified by the hash id in the URL, so
+survey pages (`RANKER_SESSION_FREE_PATHS`, `/rank/` by default) don't need
+sessions.  `SessionFreeMiddleware`, used in place of Django's
+`SessionMiddleware`, gives requests for them an empty session which is never
+loaded or saved, so they never touch the session table, even when the
+browser sends a session cookie (e.g. of a researcher logged in to the
+admin).  Users are anonymous there.
+
+Flash messages of survey pages are carried in a signed cookie only
+(`SessionFreeMessageStorage`), instead of falling back to the session when
+they don't fit in the cookie; survey messages are short.
+"""
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.base import SessionBase
+from django.contrib.sessions.middleware import SessionMiddleware
+
+
+def is_session_free(request):
+    return request.path_info.startswith(
+        tuple(settings.RANKER_SESSION_FREE_PATHS),
+    )
+
+
+class NoSession(SessionBase):
+    """Session that is always empty and is never saved."""
+
+    def exists(self, session_key):
+        return False
+
+    def create(self):
+        pass
+
+    def save(self, must_create=False):
+        pass
+
+    def delete(self, session_key=None):
+        pass
+
+    def load(self):
+        return {}
+
+
+class SessionFreeMiddleware(SessionMiddleware):
+    """`SessionMiddleware` skipped for session-free paths."""
+
+    def process_request(self, request):
+        if is_session_free(request):
+            request.session = NoSession()
+        else:
+            super().process_request(request)
+
+    def process_response(self, request, response):
+        if is_session_free(request):
+            return response
+        return super().process_response(request, response)
+
+
+class SessionFreeMessageStorage(FallbackStorage):
+    """Cookie storage with session fallback, except for session-free paths
+    which only use the cookie."""
+
+    def __init__(self, request, *args, **kwargs):
+        if is_session_free(request):
+            self.storage_classes = (CookieStorage,)
+        super().__init__(request, *args, **kwargs)
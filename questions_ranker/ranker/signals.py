@@ -0,0 +1,77 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_local_caches
+from .crosstab import COMPLETED_STAGE, invalidate_crosstab
+from .models import (
+    Category,
+    Question,
+    QuestionDemographicSummary,
+    QuestionRankSummary,
+    QuestionSummary,
+    Ranking,
+    RankingEntry,
+)
+from .pages import forget_completed
+from .sampling import invalidate_active_question_ids
+
+# questions are saved through proxy models too (e.g. in the admin); receivers
+# are connected to each sender, so that deletes of other models can still be
+# done without sending signals for every row
+QUESTION_MODELS = (Question, QuestionSummary, QuestionDemographicSummary)
+CATALOG_MODELS = QUESTION_MODELS + (Category,)
+
+
+def receiver_of(signals, senders):
+    """Like `receiver`, connecting to every sender from `senders`."""
+    def decorator(func):
+        for sender in senders:
+            receiver(signals, sender=sender)(func)
+        return func
+    return decorator
+
+
+@receiver_of([post_save, post_delete], QUESTION_MODELS)
+def question_changed(sender, **kwargs):
+    # any saved question could have been (de)activated; processes reading
+    # the new version before the commit would load the old ids
+    transaction.on_commit(invalidate_active_question_ids)
+
+
+@receiver_of([post_save, post_delete], CATALOG_MODELS)
+def catalog_changed(sender, **kwargs):
+    # values derived from questions and categories (e.g. question ids
+    # snapshots, cached pages) must not be served by other processes
+    transaction.on_commit(invalidate_local_caches)
+
+
+@receiver_of([post_save], QUESTION_MODELS)
+def question_created(sender, instance, created, **kwargs):
+    # summary rows exist up front, so that saving ranks is a single UPDATE
+    if created:
+        QuestionRankSummary.objects.get_or_create(question_id=instance.pk)
+
+
+@receiver(post_delete, sender=Ranking)
+@receiver(post_delete, sender=RankingEntry)
+def ranking_deleted(sender, **kwargs):
+    # the cross-tab is only ever added to; removed counts need a rebuild
+    invalidate_crosstab()
+
+
+@receiver(post_save, sender=Ranking)
+def completed_ranking_saved(sender, instance, **kwargs):
+    # the survey doesn't save completed rankings; one saved elsewhere (e.g.
+    # edited in the admin) would be counted again by an incremental refresh
+    if instance.stage >= COMPLETED_STAGE:
+        invalidate_crosstab()
+
+
+@receiver(post_save, sender=Ranking)
+@receiver(post_delete, sender=Ranking)
+def ranking_reopened(sender, instance, signal, **kwargs):
+    # deleted rankings and rankings moved back (e.g. in the admin) mustn't
+    # be served the cached thank-you page
+    if signal is post_delete or instance.stage < COMPLETED_STAGE:
+        forget_completed(instance.hash_id)
@@ -0,0 +1,125 @@
+"""Maintenance of the materialized per-question rank counts.
+
+`QuestionRankSummary` rows are updated incrementally whenever ranks are
+saved (see `rank_stage`), with a single UPDATE query per submission, and
+when rankings are deleted by code aware of it (see `removal_changes`).
+Changes made behind its back (e.g. rankings deleted in the admin) are fixed
+with `rebuild_summary`, also available as `rebuild_question_summary` command.
+"""
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, When
+
+from .models import Question, QuestionRankSummary, RankingEntry
+
+TOTAL_FIELD = 'total_ranks'
+
+
+def count_field(rank):
+    """Name of `QuestionRankSummary` field counting given rank (code)."""
+    return '{}_count'.format(RankingEntry.RANK_NAMES[rank])
+
+
+def rank_changes(previous, ranks):
+    """Compute summary changes caused by setting new `ranks` (a dictionary
+    mapping entry pk to rank) on entries whose current state is given as
+    `previous`, an iterable of (entry pk, question id, rank) tuples.
+
+    Returns counter of (question id, field name) -> change."""
+    changes = Counter()
+    for pk, question_id, old_rank in previous:
+        if pk not in ranks or ranks[pk] == old_rank:
+            continue
+        new_rank = ranks[pk]
+
+        if old_rank is not None:
+            changes[question_id, count_field(old_rank)] -= 1
+            changes[question_id, TOTAL_FIELD] -= 1
+        if new_rank is not None:
+            changes[question_id, count_field(new_rank)] += 1
+            changes[question_id, TOTAL_FIELD] += 1
+    return changes
+
+
+def removal_changes(entries):
+    """Compute summary changes caused by deleting `entries` (a
+    `RankingEntry` queryset); see `rank_changes`."""
+    previous = list(
+        entries.filter(rank__isnull=False)
+               .values_list('pk', 'question_id', 'rank')
+    )
+    return rank_changes(previous, {pk: None for pk, _, _ in previous})
+
+
+def update_summary(changes):
+    """Apply `changes` (see `rank_changes`) with a single UPDATE query.
+
+    Summary rows are created together with questions; should any be missing
+    anyway, they are created on the fly."""
+    # field -> change -> question ids
+    grouped = defaultdict(lambda: defaultdict(list))
+    for (question_id, field), change in changes.items():
+        if change:
+            grouped[field][change].append(question_id)
+    if not grouped:
+        return
+
+    question_ids = {
+        question_id
+        for by_change in grouped.values()
+        for question_ids in by_change.values()
+        for question_id in question_ids
+    }
+    updates = {
+        field: Case(
+            *[
+                When(question_id__in=ids, then=F(field) + change)
+                for change, ids in by_change.items()
+            ],
+            default=F(field),
+        )
+        for field, by_change in grouped.items()
+    }
+
+    summaries = QuestionRankSummary.objects.filter(question_id__in=question_ids)
+    if summaries.update(**updates) == len(question_ids):
+        return
+
+    # some questions are ranked for the first time
+    existing = set(summaries.values_list('question_id', flat=True))
+    try:
+        with transaction.atomic():
+            QuestionRankSummary.objects.bulk_create([
+                QuestionRankSummary(question_id=question_id)
+                for question_id in question_ids - existing
+            ])
+    except IntegrityError:
+        # rows were created concurrently
+        pass
+    QuestionRankSummary.objects.filter(
+        question_id__in=question_ids - existing,
+    ).update(**updates)
+
+
+@transaction.atomic
+def rebuild_summary():
+    """Recompute summary rows of all questions from ranking entries."""
+    summaries = {
+        question_id: QuestionRankSummary(question_id=question_id)
+        for question_id in Question.objects.values_list('pk', flat=True)
+    }
+    counts = (
+        RankingEntry.objects.filter(rank__isnull=False)
+                            .order_by()
+                            .values_list('question_id', 'rank')
+                            .annotate(Count('pk'))
+    )
+    for question_id, rank, count in counts:
+        summary = summaries[question_id]
+        setattr(summary, count_field(rank), count)
+        summary.total_ranks += count
+
+    QuestionRankSummary.objects.all().delete()
+    QuestionRankSummary.objects.bulk_create(summaries.values())
+    return len(summaries)
@@ -1,11 +1,16 @@
+from functools import lru_cache
+
 from django import template
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.urls import get_script_prefix, get_urlconf, reverse
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
-from django.urls import reverse
 
 register = template.Library()
 
 
+@lru_cache(maxsize=256)
 def navbar_template(title, url, active=False, disabled=False,
                     dropdown=False):
     """Compose Bootstrap v4 <li> element for top navigation bar.
@@ -14,6 +19,9 @@ def navbar_template(title, url, active=False, disabled=False,
     * active: to highlight currently visited tab
     * disabled: to disable access, for example for users without specific
       permissions.
+
+    Navigation bar is the same on every page except for the active link, so
+    composed elements are memoized per (title, url, state).
     """
     screen_reader = ''
     classes = []
@@ -35,6 +43,49 @@ def navbar_template(title, url, active=False, disabled=False,
                        title=title, screen_reader=screen_reader)
 
 
+@lru_cache(maxsize=256)
+def memoized_reverse(url_name, script_prefix, urlconf):
+    # `reverse` reads the script prefix itself, it's only a part of the key
+    return reverse(url_name, urlconf=urlconf)
+
+
+@receiver(setting_changed)
+def clear_reverse_cache(setting, **kwargs):
+    if setting == 'ROOT_URLCONF':
+        memoized_reverse.cache_clear()
+
+
+def navbar_reverse(url_name):
+    """`reverse(url_name)` memoized per URL name, script prefix (which
+    depends on the request) and URL configuration."""
+    return memoized_reverse(url_name, get_script_prefix(), get_urlconf())
+
+
+def is_active(context, url):
+    # error pages (e.g. 500.html) are rendered without request
+    request = context.get('request')
+    return request is not None and request.path == url
+
+
+def has_perms(context, perms):
+    """Check if current user has all of `perms` (a comma-separated string
+    of permissions or a single permission).
+
+    Every permission is checked once per request, no matter how many
+    navigation bar elements need it."""
+    request = context['request']
+    checked = getattr(request, '_navbar_perms', None)
+    if checked is None:
+        checked = request._navbar_perms = {}
+
+    for perm in perms.split(','):
+        if perm not in checked:
+            checked[perm] = perm in context['perms']
+        if not checked[perm]:
+            return False
+    return True
+
+
 @register.simple_tag(takes_context=True)
 def navbar_element(context, title, url_name, dropdown=False):
     """
@@ -42,10 +93,9 @@ def navbar_element(context, title, url_name, dropdown=False):
     accessibility elements.  This tag takes a URL name (with no arguments) that
     is later reversed into proper URL.
     """
-    url = reverse(url_name)
-    active = context['request'].path == url
-    return mark_safe(navbar_template(title, url, active=active,
-                                     dropdown=dropdown))
+    url = navbar_reverse(url_name)
+    active = is_active(context, url)
+    return navbar_template(title, url, active=active, dropdown=dropdown)
 
 
 @register.simple_tag(takes_context=True)
@@ -57,18 +107,11 @@ def navbar_element_permed(context, title, url_name, perms, dropdown=False):
     `perms` can be a comma-separated string of permissions or a single
     permission.
     """
-    url = reverse(url_name)
-    active = context['request'].path == url
-
-    # check permissions
-    perms_ctx = context['perms']
-    perms = perms.split(',')
-    # True for every perm (from perms_ctx) that's granted to the user
-    perms = map(lambda x: x in perms_ctx, perms)
-    disabled = not all(perms)  # or: enabled = all(perms)
-
-    return mark_safe(navbar_template(title, url, active=active,
-                                     dropdown=dropdown))
+    url = navbar_reverse(url_name)
+    active = is_active(context, url)
+    disabled = not has_perms(context, perms)
+    return navbar_template(title, url, active=active, disabled=disabled,
+                           dropdown=dropdown)
 
 
 @register.simple_tag(takes_context=True)
@@ -77,6 +120,5 @@ def navbar_element_url(context, title, url, dropdown=False):
     Insert Bootstrap's `<li><a>...</a></li>` with specific classes and
     accessibility elements.  This tag takes a pre-made URL as an argument.
     """
-    active = context['request'].path == url
-    return mark_safe(navbar_template(title, url, active=active,
-                                     dropdown=dropdown))
+    active = is_active(context, url)
+    return navbar_template(title, url, active=active, dropdown=dropdown)
@@ -0,0 +1,22 @@
+import pytest
+from django.core.cache import caches
+
+from ranker.cache import STATE_CACHE
+from ranker.pages import FRAGMENT_CACHE
+from .factories import QuestionFactory
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # versioned snapshots kept in cache would outlive rolled back test data
+    for alias in ('default', FRAGMENT_CACHE, STATE_CACHE):
+        caches[alias].clear()
+    yield
+    for alias in ('default', FRAGMENT_CACHE, STATE_CACHE):
+        caches[alias].clear()
+
+
+@pytest.fixture
+def questions():
+    # enough for an assignment (2*20) with a few to spare
+    return QuestionFactory.create_batch(45)
@@ -0,0 +1,31 @@
+from factory import DjangoModelFactory, Faker, Sequence, SubFactory
+
+from questions_ranker.users.tests.factories import UserFactory
+from ranker.models import Category, Question, Ranking
+
+
+class CategoryFactory(DjangoModelFactory):
+
+    name = Faker("word")
+    author = SubFactory(UserFactory)
+
+    class Meta:
+        model = Category
+
+
+class QuestionFactory(DjangoModelFactory):
+
+    content = Faker("sentence")
+    category = SubFactory(CategoryFactory)
+    author = SubFactory(UserFactory)
+
+    class Meta:
+        model = Question
+
+
+class RankingFactory(DjangoModelFactory):
+
+    hash_id = Sequence(lambda n: "hash{}".format(n))
+
+    class Meta:
+        model = Ranking
@@ -0,0 +1,161 @@
+import numpy as np
+import pytest
+from django.urls import reverse
+
+from ranker.analytics import (
+    CODES,
+    RANK_CODES,
+    bootstrap_ranks,
+    category_counts,
+    group_counts,
+    importance_statistics,
+    load_ranks,
+    question_statistics,
+    rank_counts,
+    summary_counts,
+)
+from ranker.models import RankingEntry
+from ranker.summary import rebuild_summary
+from .factories import CategoryFactory, QuestionFactory, RankingFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def count_matrix(*rows):
+    """Build count matrix from dictionaries rank -> count."""
+    counts = np.zeros((len(rows), CODES), dtype=np.int_)
+    for i, row in enumerate(rows):
+        for rank, count in row.items():
+            counts[i, RANK_CODES[rank]] = count
+    return counts
+
+
+@pytest.fixture
+def questions():
+    category = CategoryFactory()
+    questions = QuestionFactory.create_batch(2, category=category)
+    questions.append(QuestionFactory())
+    ranks = [
+        ['vimportant', 'important', None],
+        ['unimportant', 'dont_understand', None],
+        ['important', 'important', 'vunimportant'],
+    ]
+    for ranking, row in zip(RankingFactory.create_batch(3), ranks):
+        for question, rank in zip(questions, row):
+            RankingEntry.objects.create(ranking=ranking, question=question,
+                                        rank=RANK_CODES.get(rank), stage=1)
+    return questions
+
+
+def test_load_ranks(questions):
+    question_ids, codes = load_ranks(chunk_size=2)
+
+    assert codes.dtype == np.int8
+    assert sorted(zip(question_ids.tolist(), codes.tolist())) == sorted(
+        (entry.question_id, entry.rank or 0)
+        for entry in RankingEntry.objects.all()
+    )
+
+
+def test_rank_counts(questions):
+    ids, counts = rank_counts(*load_ranks())
+
+    assert ids.tolist() == [q.pk for q in questions]
+    assert counts.sum(axis=1).tolist() == [3, 3, 3]
+    assert counts[1, RANK_CODES['important']] == 2
+    assert counts[2, 0] == 2  # unranked
+
+
+def test_rank_counts_no_entries():
+    ids, counts = rank_counts(*load_ranks())
+
+    assert len(ids) == 0
+    assert counts.shape == (0, CODES)
+
+
+def test_summary_counts_match_entries(questions):
+    rebuild_summary()
+
+    ids, counts = summary_counts()
+    entry_ids, entry_counts = rank_counts(*load_ranks())
+
+    assert ids.tolist() == entry_ids.tolist()
+    # unranked entries aren't counted in the summary
+    assert (counts[:, 1:] == entry_counts[:, 1:]).all()
+
+
+def test_importance_statistics():
+    counts = count_matrix(
+        {'vimportant': 2, 'important': 1, 'vunimportant': 1},
+        {'indifferent': 1, 'dont_understand': 3},
+        {},
+    )
+
+    statistics = importance_statistics(counts)
+
+    assert statistics['n'].tolist() == [4, 1, 0]
+    assert statistics['mean'][0] == pytest.approx(np.mean([5, 5, 4, 1]))
+    assert statistics['variance'][0] == pytest.approx(
+        np.var([5, 5, 4, 1], ddof=1))
+    assert statistics['ci_low'][0] < statistics['mean'][0] \
+        < statistics['ci_high'][0]
+    assert statistics['mean'][1] == 3
+    # variance is undefined for a single answer, everything for none
+    assert np.isnan(statistics['variance'][1])
+    assert np.isnan(statistics['mean'][2])
+    assert statistics['dont_understand'][1] == 0.75
+
+
+def test_bootstrap_ranks():
+    counts = count_matrix(
+        {'unimportant': 50},
+        {'vimportant': 50},
+        {'important': 25, 'indifferent': 25},
+        {},
+    )
+
+    ranks = bootstrap_ranks(counts, resamples=200, seed=0)
+
+    assert ranks['rank'].tolist() == [3, 1, 2, 4]
+    assert ranks['rank_low'][1] == ranks['rank_high'][1] == 1
+    assert ranks['rank_low'][3] == 4
+
+
+def test_group_counts():
+    counts = count_matrix({'important': 1}, {'important': 2}, {'vimportant': 1})
+
+    labels, grouped = group_counts(counts, np.array([7, 3, 7]))
+
+    assert labels.tolist() == [3, 7]
+    assert grouped[1, RANK_CODES['important']] == 1
+    assert grouped[1, RANK_CODES['vimportant']] == 1
+
+
+def test_category_counts(questions):
+    categories, counts = category_counts(*rank_counts(*load_ranks()))
+
+    assert categories.tolist() == sorted({q.category_id for q in questions})
+    assert counts.sum() == 9
+
+
+def test_question_statistics(questions):
+    rows = list(question_statistics(*rank_counts(*load_ranks())))
+
+    assert rows[0]['question_id'] == questions[0].pk
+    assert rows[1]['important_count'] == 2
+    assert rows[1]['n'] == 2
+    assert isinstance(rows[0]['mean'], float)
+    # NaN statistics become None, so that rows can be serialized
+    assert rows[2]['variance'] is None
+
+
+def test_admin_summary(admin_client, questions):
+    rebuild_summary()
+
+    response = admin_client.get(
+        reverse('admin:ranker_questionsummary_changelist'),
+    )
+
+    summary = {q.pk: q for q in response.context['summary']}
+    assert summary[questions[0].pk].mean == pytest.approx(11 / 3)
+    assert len(response.context['category_summary']) == 2
@@ -0,0 +1,198 @@
+import json
+
+import pytest
+from django.test import Client
+from django.urls import reverse
+
+from ranker.benchmarks import demographic_data
+from ranker.models import DrawEntry, QuestionRankSummary, Ranking, RankingEntry
+from .factories import RankingFactory
+
+pytestmark = pytest.mark.django_db
+
+EMAIL = {'email': '', 'draw': False, 'paper': False}
+
+
+@pytest.fixture
+def ranking(questions):
+    return RankingFactory(stage=0)
+
+
+def get_survey(client, ranking):
+    response = client.get(reverse('survey_api', args=[ranking.hash_id]))
+    assert response.status_code == 200
+    return response.json()
+
+
+def submit(client, ranking, payload):
+    return client.post(reverse('survey_api', args=[ranking.hash_id]),
+                       json.dumps(payload), content_type='application/json')
+
+
+def all_ranks(survey, rank=RankingEntry.IMPORTANT):
+    return {pk: rank for stage in ('2', '3')
+            for pk, _, _ in survey['questions'][stage]}
+
+
+def test_survey_payload(client, ranking):
+    survey = get_survey(client, ranking)
+
+    assert survey['stage'] == 0
+    assert len(survey['questions']['2']) == len(survey['questions']['3']) == 20
+    assert [c[0] for c in survey['choices']['rank']] == [1, 2, 3, 4, 5, 6]
+    assert set(survey['choices']['demographic']) == set(demographic_data())
+    assert ranking.rankingentry_set.count() == 40
+
+
+def test_payload_keeps_assignment(client, ranking):
+    first = get_survey(client, ranking)
+
+    assert get_survey(client, ranking)['questions'] == first['questions']
+
+
+def test_whole_survey_in_single_submission(client, ranking,
+                                           django_assert_max_num_queries):
+    survey = get_survey(client, ranking)
+
+    with django_assert_max_num_queries(20):
+        response = submit(client, ranking, {
+            'email': EMAIL,
+            'ranks': all_ranks(survey),
+            'demographic': demographic_data(),
+        })
+
+    ranking.refresh_from_db()
+    assert response.json() == {'stage': 4}
+    assert ranking.stage == 4
+    assert ranking.daily_broadband == demographic_data()['daily_broadband']
+    assert ranking.rankingentry_set.filter(
+        rank=RankingEntry.IMPORTANT,
+    ).count() == 40
+    assert DrawEntry.objects.count() == 1
+    assert sum(QuestionRankSummary.objects.values_list(
+        'important_count', flat=True)) == 40
+
+
+def test_survey_in_two_submissions(client, ranking):
+    survey = get_survey(client, ranking)
+    first_stage = {pk: RankingEntry.IMPORTANT
+                   for pk, _, _ in survey['questions']['2']}
+
+    first = submit(client, ranking, {'email': EMAIL, 'ranks': first_stage})
+    second = submit(client, ranking, {
+        'ranks': all_ranks(survey), 'demographic': demographic_data(),
+    })
+
+    assert first.json() == {'stage': 2}
+    assert second.json() == {'stage': 4}
+
+
+def test_repeated_submission_changes_nothing(client, ranking):
+    survey = get_survey(client, ranking)
+    payload = {'email': EMAIL, 'ranks': all_ranks(survey)}
+    submit(client, ranking, payload)
+
+    response = submit(client, ranking, dict(
+        payload, ranks=all_ranks(survey, RankingEntry.VIMPORTANT),
+    ))
+
+    assert response.json() == {'stage': 3}
+    assert DrawEntry.objects.count() == 1
+    assert not RankingEntry.objects.filter(
+        rank=RankingEntry.VIMPORTANT,
+    ).exists()
+
+
+def test_invalid_stage_keeps_previous_ones(client, ranking):
+    survey = get_survey(client, ranking)
+    ranks = all_ranks(survey)
+    missing = survey['questions']['3'][0][0]
+    del ranks[missing]
+
+    response = submit(client, ranking, {'email': EMAIL, 'ranks': ranks})
+
+    ranking.refresh_from_db()
+    assert response.status_code == 400
+    assert response.json()['stage'] == 2
+    assert list(response.json()['errors']) == [str(missing)]
+    assert ranking.stage == 2
+
+
+def test_stages_cant_be_skipped(client, ranking):
+    survey = get_survey(client, ranking)
+
+    response = submit(client, ranking, {'ranks': all_ranks(survey)})
+
+    assert response.status_code == 400
+    assert Ranking.objects.get(pk=ranking.pk).stage == 0
+
+
+def test_invalid_email_answers(client, ranking):
+    response = submit(client, ranking, {'email': dict(EMAIL, draw=True)})
+
+    assert response.status_code == 400
+    assert response.json()['errors'] == {'draw': ["No e-mail provided."]}
+
+
+def test_invalid_email_address(client, ranking):
+    response = submit(client, ranking, {
+        'email': dict(EMAIL, email='x', draw=True),
+    })
+
+    assert response.status_code == 400
+    assert list(response.json()['errors']) == ['email']
+
+
+@pytest.mark.parametrize('key', ['\u00b2', '1' * 30])
+def test_invalid_entry_ids(client, ranking, key):
+    get_survey(client, ranking)
+
+    response = submit(client, ranking, {'email': EMAIL, 'ranks': {key: 3}})
+
+    assert response.status_code == 400
+    assert response.json()['errors'] == {key: ["Unknown entry."]}
+    assert Ranking.objects.get(pk=ranking.pk).stage == 0
+
+
+def test_entries_of_other_rankings(client, ranking):
+    other = RankingFactory(stage=0)
+    survey = get_survey(client, other)
+    get_survey(client, ranking)
+
+    response = submit(client, ranking, {
+        'email': EMAIL, 'ranks': all_ranks(survey),
+    })
+
+    assert response.status_code == 400
+    assert not RankingEntry.objects.filter(rank__isnull=False).exists()
+
+
+def test_invalid_payload(client, ranking):
+    response = client.post(reverse('survey_api', args=[ranking.hash_id]),
+                           '[1', content_type='application/json')
+
+    assert response.status_code == 400
+
+
+def test_csrf_token_is_provided(ranking):
+    client = Client(enforce_csrf_checks=True)
+    survey = get_survey(client, ranking)
+
+    response = client.post(
+        reverse('survey_api', args=[ranking.hash_id]),
+        json.dumps({'email': EMAIL}), content_type='application/json',
+        HTTP_X_CSRFTOKEN=client.cookies['csrftoken'].value,
+    )
+
+    assert survey['stage'] == 0
+    assert response.status_code == 200
+    assert response.json() == {'stage': 1}
+
+
+def test_post_without_csrf_token_is_rejected(ranking):
+    client = Client(enforce_csrf_checks=True)
+    get_survey(client, ranking)
+
+    response = submit(client, ranking, {'email': EMAIL})
+
+    assert response.status_code == 403
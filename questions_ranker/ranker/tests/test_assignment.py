@@ -0,0 +1,206 @@
+import pytest
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import Count
+
+from ranker.assignment import (
+    CANDIDATES_PER_QUESTION,
+    BalancedAssignment,
+    RandomAssignment,
+    StratifiedAssignment,
+    allocate,
+    exposure_counters,
+    get_assignment_engine,
+    preassign_questions,
+)
+from ranker.models import Question, Ranking, RankingEntry
+from ranker.views import assign_questions
+from .factories import CategoryFactory, QuestionFactory, RankingFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def test_allocate_is_proportional():
+    quotas = allocate({'a': 30, 'b': 10, 'c': 10}, 40)
+
+    assert quotas == {'a': 24, 'b': 8, 'c': 8}
+
+
+def test_allocate_distributes_remainders():
+    quotas = allocate({'a': 1, 'b': 1, 'c': 1}, 2)
+
+    assert sum(quotas.values()) == 2
+    assert set(quotas.values()) == {0, 1}
+
+
+def test_allocate_not_enough_questions():
+    with pytest.raises(ValueError):
+        allocate({'a': 1}, 2)
+
+
+class TestExposureCounters:
+
+    def test_seeded_from_ranking_entries(self):
+        q1, q2 = QuestionFactory.create_batch(2)
+        for ranking in RankingFactory.create_batch(3):
+            RankingEntry.objects.create(ranking=ranking, question=q1, stage=1)
+
+        assert exposure_counters.get_many([q1.pk, q2.pk]) == {q1.pk: 3}
+
+    def test_incr_many(self):
+        q1, q2 = QuestionFactory.create_batch(2)
+
+        exposure_counters.incr_many([q1.pk, q2.pk])
+        exposure_counters.incr_many([q1.pk])
+
+        assert exposure_counters.get_many([q1.pk, q2.pk]) == {
+            q1.pk: 2, q2.pk: 1,
+        }
+
+
+class TestBalancedAssignment:
+
+    def test_least_exposed_questions_are_chosen(self):
+        questions = QuestionFactory.create_batch(50)
+        overexposed = {q.pk for q in questions[:10]}
+        exposure_counters.get_many([])  # seed
+        exposure_counters.incr_many(overexposed)
+
+        question_ids = BalancedAssignment().assign(2*20)
+
+        assert len(set(question_ids)) == 40
+        assert not set(question_ids) & overexposed
+
+    # counters are incremented on commit
+    @pytest.mark.django_db(transaction=True)
+    def test_coverage_is_equal(self):
+        QuestionFactory.create_batch(50)
+        engine = BalancedAssignment()
+
+        for _ in range(5):
+            engine.assign(2*20)
+
+        counts = exposure_counters.get_many(
+            q.pk for q in Question.objects.all()
+        )
+        assert set(counts.values()) == {4}
+
+    def test_not_enough_questions(self):
+        QuestionFactory.create_batch(39)
+
+        with pytest.raises(ValueError):
+            BalancedAssignment().assign(2*20)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_counters_are_incremented_on_commit(self):
+        question_ids = [q.pk for q in QuestionFactory.create_batch(40)]
+        exposure_counters.get_many([])  # seed
+        engine = BalancedAssignment()
+
+        with pytest.raises(ValueError), transaction.atomic():
+            engine.assign(2*20)
+            raise ValueError("rolled back")
+        with transaction.atomic():
+            engine.assign(2*20)
+            assert exposure_counters.get_many(question_ids) == {}
+
+        assert set(exposure_counters.get_many(question_ids).values()) == {1}
+
+    def test_uncommitted_assignments_are_balanced(self):
+        QuestionFactory.create_batch(80)
+        engine = BalancedAssignment()
+
+        first, second = engine.assign(2*20), engine.assign(2*20)
+
+        assert not set(first) & set(second)
+
+    def test_only_candidates_are_compared(self, monkeypatch):
+        QuestionFactory.create_batch(200)
+        compared = []
+        monkeypatch.setattr(exposure_counters, 'get_many',
+                            lambda ids: compared.extend(ids) or {})
+
+        question_ids = BalancedAssignment().assign(2*20)
+
+        assert len(set(question_ids)) == 40
+        assert len(compared) == CANDIDATES_PER_QUESTION * 40
+        assert set(question_ids) <= set(compared)
+
+
+def test_stratified_assignment_follows_category_shares():
+    big, small = CategoryFactory(), CategoryFactory()
+    QuestionFactory.create_batch(60, category=big)
+    QuestionFactory.create_batch(20, category=small)
+
+    question_ids = StratifiedAssignment().assign(2*20)
+
+    categories = list(
+        Question.objects.filter(pk__in=question_ids)
+                        .values_list('category', flat=True)
+    )
+    assert categories.count(big.pk) == 30
+    assert categories.count(small.pk) == 10
+
+
+def test_engine_from_settings(settings):
+    assert isinstance(get_assignment_engine(), RandomAssignment)
+
+    settings.RANKER_ASSIGNMENT_ENGINE = 'ranker.assignment.StratifiedAssignment'
+    assert isinstance(get_assignment_engine(), StratifiedAssignment)
+
+
+class TestPreassignQuestions:
+
+    def test_assigns_both_stages_in_chunks(self):
+        QuestionFactory.create_batch(45)
+        rankings = RankingFactory.create_batch(5)
+
+        progress = list(preassign_questions(chunk_size=2))
+
+        assert progress == [2, 4, 5]
+        for ranking in rankings:
+            stages = dict(
+                ranking.rankingentry_set.order_by()
+                                        .values_list('stage')
+                                        .annotate(Count('pk'))
+            )
+            assert stages == {1: 20, 2: 20}
+
+    def test_skips_assigned_rankings(self):
+        QuestionFactory.create_batch(45)
+        assigned, unassigned = RankingFactory.create_batch(2)
+        list(preassign_questions(Ranking.objects.filter(pk=assigned.pk)))
+        entries = set(assigned.rankingentry_set.values_list('pk', flat=True))
+
+        assert list(preassign_questions()) == [1]
+        assert set(
+            assigned.rankingentry_set.values_list('pk', flat=True)
+        ) == entries
+        assert unassigned.rankingentry_set.count() == 40
+
+    def test_skips_rankings_assigned_before_lock(self, monkeypatch):
+        QuestionFactory.create_batch(45)
+        visited, unvisited = RankingFactory.create_batch(2)
+
+        class Transaction:
+            @staticmethod
+            def atomic(*args, **kwargs):
+                # a first visit assigns questions after the chunk's ids are
+                # read but before its transaction starts
+                if not visited.rankingentry_set.exists():
+                    assign_questions(visited)
+                return transaction.atomic(*args, **kwargs)
+
+        monkeypatch.setattr('ranker.assignment.transaction', Transaction)
+
+        assert list(preassign_questions()) == [2]
+        assert visited.rankingentry_set.count() == 40
+        assert unvisited.rankingentry_set.count() == 40
+
+    def test_command(self):
+        QuestionFactory.create_batch(40)
+        RankingFactory.create_batch(3)
+
+        call_command('assign_questions', chunk_size=2)
+
+        assert RankingEntry.objects.count() == 3 * 40
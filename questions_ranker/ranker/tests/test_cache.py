@@ -0,0 +1,170 @@
+import threading
+import time
+
+import pytest
+
+from ranker import cache as ranker_cache
+from ranker.cache import SHARED_MAX_ENTRIES, StateCache, TieredCache
+from .factories import CategoryFactory, QuestionFactory
+
+
+@pytest.fixture
+def location(tmpdir):
+    return str(tmpdir.join('cache'))
+
+
+def tiered_cache(location, **options):
+    return TieredCache(location, {'OPTIONS': options})
+
+
+def test_shared_between_processes(location):
+    first, second = tiered_cache(location), tiered_cache(location)
+
+    first.set('key', 'value')
+
+    assert second.get('key') == 'value'
+    assert second.get('missing', 'default') == 'default'
+
+
+def test_local_tier_serves_reads(location):
+    cache = tiered_cache(location)
+    cache.set('key', 'value')
+
+    cache.shared.delete('key')
+
+    assert cache.get('key') == 'value'
+    assert cache.has_key('key')
+
+
+def test_local_tier_expires(location):
+    first = tiered_cache(location, LOCAL_TIMEOUT=0.01)
+    second = tiered_cache(location, LOCAL_TIMEOUT=0.01)
+    first.set('key', 'old')
+    assert second.get('key') == 'old'
+
+    first.set('key', 'new')
+    time.sleep(0.02)
+
+    assert second.get('key') == 'new'
+
+
+def test_local_tier_evicts_least_recently_used(location):
+    cache = tiered_cache(location, LOCAL_MAX_ENTRIES=2)
+    for key in ['a', 'b', 'c']:
+        cache.set(key, key)
+
+    assert len(cache.local) == 2
+    assert list(cache.local) == [cache.make_key('b'), cache.make_key('c')]
+
+
+def test_invalidate_local_reaches_other_processes(location):
+    first, second = tiered_cache(location), tiered_cache(location)
+    first.set('key', 'old')
+    assert second.get('key') == 'old'
+
+    first.set('key', 'new')
+    assert second.get('key') == 'old'
+    first.invalidate_local()
+
+    assert second.get('key') == 'new'
+
+
+def test_incr_uses_shared_tier(location):
+    first, second = tiered_cache(location), tiered_cache(location)
+    first.set('counter', 1)
+    assert second.get('counter') == 1
+
+    first.incr('counter')
+    second.incr('counter')
+
+    assert first.get('counter') == 3
+    with pytest.raises(ValueError):
+        first.incr('missing')
+
+
+def test_add_and_delete(location):
+    first, second = tiered_cache(location), tiered_cache(location)
+
+    assert first.add('key', 'value')
+    assert not second.add('key', 'other')
+    second.delete('key')
+
+    assert second.get('key') is None
+    assert first.shared.get('key') is None
+
+
+def test_shared_tier_max_entries(location):
+    assert tiered_cache(location).shared._max_entries == SHARED_MAX_ENTRIES
+    assert tiered_cache(location, MAX_ENTRIES=10).shared._max_entries == 10
+
+
+def state_cache(location, **options):
+    return StateCache(location, {'OPTIONS': options})
+
+
+def test_state_is_never_culled(location):
+    cache = state_cache(location, MAX_ENTRIES=2, CULL_FREQUENCY=1)
+
+    for key in ['a', 'b', 'c', 'd']:
+        cache.set(key, key, timeout=None)
+
+    assert cache.get_many(['a', 'b', 'c', 'd']) == {
+        key: key for key in ['a', 'b', 'c', 'd']}
+
+
+def test_state_incr_keeps_expiry(location):
+    cache = state_cache(location, TIMEOUT=0.01)
+    cache.add('counter', 1, timeout=None)
+    cache.set('expiring', 1, timeout=0.01)
+
+    assert cache.incr('counter') == 2
+    cache.incr('expiring')
+    time.sleep(0.02)
+
+    assert cache.get('counter') == 2
+    assert cache.get('expiring') is None
+    with pytest.raises(ValueError):
+        cache.incr('expiring')
+
+
+def test_state_incr_is_atomic(location):
+    caches = [state_cache(location) for _ in range(4)]
+    caches[0].add('counter', 0, timeout=None)
+
+    def increment(cache):
+        for _ in range(25):
+            cache.incr('counter')
+
+    threads = [threading.Thread(target=increment, args=(cache,))
+               for cache in caches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert caches[0].get('counter') == 100
+
+
+def test_clear(location):
+    first, second = tiered_cache(location), tiered_cache(location)
+    first.set('key', 'value')
+    assert second.get('key') == 'value'
+
+    first.clear()
+
+    assert second.get('key') is None
+
+
+# local tiers are invalidated once the change is committed
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('factory', [CategoryFactory, QuestionFactory])
+def test_catalog_changes_invalidate_local_tiers(location, monkeypatch,
+                                                factory):
+    cache = tiered_cache(location)
+    monkeypatch.setattr(ranker_cache, 'cache', cache)
+    cache.set('key', 'value')
+
+    factory()
+
+    assert not cache.local
+    assert cache.current_generation() is not None
@@ -0,0 +1,153 @@
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+
+from ranker.crosstab import (
+    CACHE_KEY,
+    COMPLETED_STAGE,
+    REFRESH_OVERLAP,
+    CrossTab,
+    get_crosstab,
+)
+from ranker.models import Ranking, RankingEntry
+from .factories import QuestionFactory, RankingFactory
+
+pytestmark = pytest.mark.django_db
+
+# codes of demographic answers
+NONE, TENS = 1, 2
+QUARTER = 2
+
+
+def complete_ranking(questions, rank, **answers):
+    ranking = RankingFactory(stage=COMPLETED_STAGE - 1, **answers)
+    for question in questions:
+        RankingEntry.objects.create(ranking=ranking, question=question,
+                                    rank=rank, stage=1)
+    # like the survey does
+    Ranking.objects.advance_stage(ranking.pk, COMPLETED_STAGE)
+    return ranking
+
+
+@pytest.fixture
+def questions():
+    questions = QuestionFactory.create_batch(2)
+    complete_ranking(questions, RankingEntry.IMPORTANT,
+                     teaching_students=NONE, daily_smartphone=QUARTER)
+    complete_ranking(questions, RankingEntry.VIMPORTANT,
+                     teaching_students=TENS, daily_smartphone=QUARTER)
+    # rankings which aren't completed yet are not counted
+    ranking = RankingFactory(stage=3, teaching_students=NONE)
+    RankingEntry.objects.create(ranking=ranking, question=questions[0],
+                                rank=RankingEntry.UNIMPORTANT, stage=1)
+    return questions
+
+
+def counts_of(crosstab, question, rank, field=None, value=None):
+    return crosstab.question_counts([question.pk], field, value)[0][rank]
+
+
+def test_crosstab(questions):
+    crosstab = CrossTab()
+
+    assert crosstab.refresh() == 2
+    assert counts_of(crosstab, questions[0], RankingEntry.IMPORTANT) == 1
+    assert counts_of(crosstab, questions[0], RankingEntry.UNIMPORTANT) == 0
+    assert counts_of(crosstab, questions[1], RankingEntry.VIMPORTANT,
+                     'teaching_students', TENS) == 1
+    assert counts_of(crosstab, questions[1], RankingEntry.VIMPORTANT,
+                     'teaching_students', NONE) == 0
+    assert counts_of(crosstab, questions[1], RankingEntry.IMPORTANT,
+                     'daily_smartphone', QUARTER) == 1
+
+
+def test_crosstab_single_query(questions, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        CrossTab().refresh()
+
+
+def test_crosstab_refresh_is_incremental(questions):
+    crosstab = CrossTab()
+    crosstab.refresh()
+
+    assert crosstab.refresh() == 0
+    complete_ranking(questions[:1], RankingEntry.IMPORTANT,
+                     teaching_students=NONE)
+
+    assert crosstab.refresh() == 1
+    assert counts_of(crosstab, questions[0], RankingEntry.IMPORTANT) == 2
+    assert counts_of(crosstab, questions[1], RankingEntry.IMPORTANT) == 1
+
+
+def test_crosstab_counts_new_questions(questions):
+    crosstab = CrossTab()
+    crosstab.refresh()
+    question = QuestionFactory()
+
+    complete_ranking([question], RankingEntry.IMPORTANT)
+    crosstab.refresh()
+
+    assert counts_of(crosstab, question, RankingEntry.IMPORTANT) == 1
+
+
+def test_only_rankings_near_watermark_are_remembered(questions):
+    old = complete_ranking(questions, RankingEntry.IMPORTANT)
+    Ranking.objects.filter(pk=old.pk).update(
+        last_updated_at=timezone.now() - 2 * REFRESH_OVERLAP,
+    )
+    crosstab = CrossTab()
+
+    assert crosstab.refresh() == 3
+    assert old.pk not in crosstab.recent
+    assert len(crosstab.recent) == 2
+    assert crosstab.refresh() == 0
+
+
+def test_get_crosstab_is_cached(questions):
+    get_crosstab()
+    complete_ranking(questions[:1], RankingEntry.IMPORTANT)
+
+    crosstab = get_crosstab()
+
+    assert counts_of(crosstab, questions[0], RankingEntry.IMPORTANT) == 2
+    assert counts_of(cache.get(CACHE_KEY), questions[0],
+                     RankingEntry.IMPORTANT) == 2
+
+
+def test_deleting_ranking_invalidates_crosstab(questions):
+    get_crosstab()
+
+    RankingEntry.objects.first().ranking.delete()
+
+    assert cache.get(CACHE_KEY) is None
+
+
+def test_saving_completed_ranking_invalidates_crosstab(questions):
+    get_crosstab()
+
+    RankingEntry.objects.first().ranking.save()
+
+    assert cache.get(CACHE_KEY) is None
+
+
+def test_admin_view(admin_client, questions):
+    url = reverse('admin:ranker_questiondemographicsummary_changelist')
+
+    response = admin_client.get(
+        url, {'field': 'teaching_students', 'value': TENS},
+    )
+
+    summary = {q.pk: q for q in response.context['summary']}
+    assert summary[questions[0].pk].vimportant_count == 1
+    assert summary[questions[0].pk].total_ranks == 1
+    assert summary[questions[0].pk].mean == 5
+
+
+def test_admin_view_ignores_unknown_filter(admin_client, questions):
+    url = reverse('admin:ranker_questiondemographicsummary_changelist')
+
+    response = admin_client.get(url, {'field': 'hash_id', 'value': 'x'})
+
+    summary = {q.pk: q for q in response.context['summary']}
+    assert summary[questions[0].pk].total_ranks == 2
@@ -0,0 +1,20 @@
+import io
+
+import pytest
+from django.core.management import call_command
+
+from ranker.models import Ranking
+
+pytestmark = pytest.mark.django_db
+
+
+def test_explain_queries_uses_indexes():
+    stdout = io.StringIO()
+
+    call_command('explain_queries', rankings=50, stdout=stdout)
+
+    output = stdout.getvalue()
+    assert 'stage entries' in output
+    assert 'ranker_rank_ranking_245ec6_idx' in output
+    # generated data is rolled back
+    assert not Ranking.objects.exists()
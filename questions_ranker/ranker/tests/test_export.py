@@ -0,0 +1,139 @@
+import csv
+import io
+import json
+import os
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.urls import reverse
+
+from ranker.export import (
+    COLUMNS,
+    SMALL_INTEGER_COLUMNS,
+    csv_lines,
+    export_rows,
+    jsonl_lines,
+)
+from ranker.models import Ranking, RankingEntry
+from .factories import QuestionFactory, RankingFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def rankings():
+    questions = QuestionFactory.create_batch(2)
+    rankings = RankingFactory.create_batch(2)
+    for ranking in rankings:
+        for stage, question in enumerate(questions, start=1):
+            RankingEntry.objects.create(ranking=ranking, question=question,
+                                        stage=stage,
+                                        rank=RankingEntry.IMPORTANT)
+    return rankings
+
+
+def as_dicts(rows):
+    return [dict(zip(COLUMNS, row)) for row in rows]
+
+
+def test_export_rows(rankings):
+    rows = as_dicts(export_rows(chunk_size=1))
+
+    assert len(rows) == 4
+    assert [row['hash_id'] for row in rows] == [
+        rankings[0].hash_id, rankings[0].hash_id,
+        rankings[1].hash_id, rankings[1].hash_id,
+    ]
+    entry = RankingEntry.objects.select_related('question__category') \
+                                .get(pk=rows[0]['entry_id'])
+    assert rows[0]['rank'] == RankingEntry.IMPORTANT
+    assert rows[0]['question_content'] == entry.question.content
+    assert rows[0]['category_name'] == entry.question.category.name
+
+
+def test_export_rows_of_selected_rankings(rankings):
+    rows = as_dicts(export_rows(Ranking.objects.filter(pk=rankings[1].pk)))
+
+    assert {row['ranking_id'] for row in rows} == {rankings[1].pk}
+
+
+def test_csv_lines(rankings):
+    reader = csv.DictReader(io.StringIO(''.join(csv_lines(export_rows()))))
+
+    assert reader.fieldnames == COLUMNS
+    assert [row['rank'] for row in reader] == \
+        [str(RankingEntry.IMPORTANT)] * 4
+
+
+def test_jsonl_lines(rankings):
+    lines = list(jsonl_lines(export_rows()))
+
+    assert len(lines) == 4
+    assert json.loads(lines[0])['hash_id'] == rankings[0].hash_id
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'jsonl'])
+def test_command(rankings, tmpdir, fmt):
+    output = tmpdir.join('export.' + fmt)
+
+    call_command('export_rankings', format=fmt, output=str(output),
+                 chunk_size=3, stderr=io.StringIO())
+
+    # header line in CSV
+    assert len(output.readlines()) == 4 + (fmt == 'csv')
+
+
+def test_command_to_stdout(rankings):
+    stdout = io.StringIO()
+
+    call_command('export_rankings', format='jsonl', stdout=stdout,
+                 stderr=io.StringIO())
+
+    assert len(stdout.getvalue().splitlines()) == 4
+
+
+def test_command_parquet(rankings, tmpdir):
+    if os.environ.get('CI'):
+        # pyarrow is installed in CI (requirements/local.txt)
+        import pyarrow.parquet as pq
+    else:
+        pq = pytest.importorskip('pyarrow.parquet')
+    output = tmpdir.join('export.parquet')
+
+    call_command('export_rankings', format='parquet', output=str(output),
+                 chunk_size=3, stderr=io.StringIO())
+
+    table = pq.read_table(str(output))
+    assert table.num_rows == 4
+    assert table.column_names == COLUMNS
+    assert {str(table.schema.field_by_name(name).type)
+            for name in SMALL_INTEGER_COLUMNS} == {'int16'}
+    assert table.column('rank').to_pylist() == [RankingEntry.IMPORTANT] * 4
+
+
+def test_command_parquet_needs_output(rankings):
+    with pytest.raises(CommandError):
+        call_command('export_rankings', format='parquet')
+
+
+def test_admin_action(admin_client, rankings):
+    response = admin_client.post(
+        reverse('admin:ranker_ranking_changelist'),
+        {'action': 'export_csv', '_selected_action': [rankings[0].pk]},
+    )
+
+    assert response.streaming
+    lines = b''.join(response.streaming_content).decode().splitlines()
+    assert len(lines) == 1 + 2
+
+
+def test_command_statistics(rankings):
+    stdout = io.StringIO()
+
+    call_command('export_rankings', format='jsonl', statistics=True,
+                 stdout=stdout, stderr=io.StringIO())
+
+    rows = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    assert [row['important_count'] for row in rows] == [2, 2]
+    assert rows[0]['mean'] == 4
+    assert rows[0]['rank'] == 1
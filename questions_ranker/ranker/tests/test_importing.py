@@ -0,0 +1,196 @@
+import io
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from questions_ranker.users.tests.factories import UserFactory
+from ranker.importing import (
+    generate_hash_ids,
+    hash_id_lines,
+    import_hash_ids,
+    import_questions,
+    valid_hash_id,
+)
+from ranker.models import Category, Question, QuestionRankSummary, Ranking
+from ranker.sampling import active_question_ids
+from .factories import CategoryFactory, RankingFactory
+
+pytestmark = pytest.mark.django_db
+
+CSV = '''ID,Category,Question
+1,Cat A,"First, question"
+2,Cat B,Second
+3,Cat A,Third
+'''
+
+
+def run_import(text, author, **kwargs):
+    stats = {}
+    for stats in import_questions(io.StringIO(text), author, **kwargs):
+        pass
+    return stats
+
+
+@pytest.fixture
+def author():
+    return UserFactory(username='admin')
+
+
+def test_import_creates_questions_and_categories(author):
+    existing = CategoryFactory(name='Cat A')
+
+    stats = run_import(CSV, author)
+
+    assert stats['created'] == 3
+    assert stats['categories_created'] == 1
+    assert list(Question.objects.order_by('pk').values_list(
+        'pk', 'category__name', 'content',
+    )) == [(1, 'Cat A', 'First, question'), (2, 'Cat B', 'Second'),
+           (3, 'Cat A', 'Third')]
+    assert Question.objects.get(pk=1).category == existing
+    # what `post_save` signals would do
+    assert QuestionRankSummary.objects.count() == 3
+    assert len(active_question_ids.get()) == 3
+
+
+def test_import_query_count_doesnt_depend_on_rows(
+        author, django_assert_max_num_queries):
+    # few enough rows for SQLite to insert them in a single query
+    rows = ''.join('{0},Cat {1},Question {0}\n'.format(pk, pk % 7)
+                   for pk in range(1, 101))
+
+    # savepoint, categories, existing questions, new categories (insert and
+    # select), questions, summaries, sequence reset, release
+    with django_assert_max_num_queries(9):
+        run_import('ID,Category,Question\n' + rows, author)
+
+    assert Question.objects.count() == 100
+
+
+def test_existing_questions_are_skipped(author):
+    run_import(CSV, author)
+
+    stats = run_import(CSV.replace('Second', 'Changed'), author)
+
+    assert stats['skipped'] == 3
+    assert Question.objects.get(pk=2).content == 'Second'
+
+
+def test_update(author):
+    run_import(CSV, author)
+
+    stats = run_import(
+        CSV.replace('2,Cat B,Second', '2,Cat C,Changed') + '4,Cat A,New\n',
+        author, update=True, batch_size=2,
+    )
+
+    assert (stats['created'], stats['updated'], stats['unchanged']) == (1, 1, 2)
+    question = Question.objects.get(pk=2)
+    assert (question.category.name, question.content) == ('Cat C', 'Changed')
+    assert Question.objects.filter(pk=4).exists()
+
+
+def test_dry_run_is_rolled_back(author):
+    stats = run_import(CSV, author, dry_run=True)
+
+    assert stats['created'] == 3
+    assert not Question.objects.exists()
+    assert not Category.objects.exists()
+
+
+@pytest.mark.parametrize('text', [
+    'ID,Question\n1,First\n',
+    'ID,Category,Question\nx,Cat A,First\n',
+    'ID,Category,Question\n1,,First\n',
+])
+def test_invalid_csv(author, text):
+    with pytest.raises(ValueError):
+        run_import(text, author)
+
+    assert not Question.objects.exists()
+
+
+def test_command(author, tmpdir):
+    path = tmpdir.join('questions.csv')
+    path.write(CSV)
+    stdout = io.StringIO()
+
+    call_command('import_questions', str(path), stdout=stdout)
+
+    assert '3 created' in stdout.getvalue()
+    assert Question.objects.count() == 3
+
+
+def test_command_unknown_author(tmpdir):
+    path = tmpdir.join('questions.csv')
+    path.write(CSV)
+
+    with pytest.raises(CommandError):
+        call_command('import_questions', str(path), author='nobody')
+
+
+def run_hash_id_import(hash_ids, **kwargs):
+    stats = {}
+    for stats in import_hash_ids(hash_ids, **kwargs):
+        pass
+    return stats
+
+
+def test_hash_id_lines_skip_blank_lines():
+    lines = io.StringIO('abc\n\n  \ndef\r\n')
+
+    assert list(hash_id_lines(lines)) == ['abc', 'def']
+
+
+def test_import_hash_ids():
+    RankingFactory(hash_id='existing')
+
+    stats = run_hash_id_import(
+        ['abc', 'Upper', 'with-dash', 'x' * 256, 'abc', 'existing', 'def',
+         'def'],
+        batch_size=5,
+    )
+
+    assert set(Ranking.objects.values_list('hash_id', flat=True)) == {
+        'existing', 'abc', 'def',
+    }
+    assert Ranking.objects.get(hash_id='abc').stage == 0
+    assert dict(stats) == {'rows': 8, 'created': 2, 'invalid': 3,
+                           'duplicate': 2, 'existing': 1}
+
+
+def test_generate_hash_ids():
+    output = io.StringIO()
+
+    stats = run_hash_id_import(generate_hash_ids(10), output=output)
+
+    hash_ids = output.getvalue().split()
+    assert stats['created'] == 10
+    assert len(set(hash_ids)) == 10
+    assert all(valid_hash_id(hash_id) for hash_id in hash_ids)
+    assert set(Ranking.objects.values_list('hash_id', flat=True)) == \
+        set(hash_ids)
+
+
+def test_import_rankings_command(tmpdir):
+    path = tmpdir.join('hash_ids.txt')
+    path.write('abc\ndef\n\nabc\n')
+    stdout = io.StringIO()
+
+    call_command('import_rankings', str(path), stdout=stdout)
+
+    assert '2 created, 0 existing, 1 duplicate, 0 invalid' in \
+        stdout.getvalue()
+    assert Ranking.objects.count() == 2
+
+
+def test_import_rankings_command_generates_ids(tmpdir, questions):
+    path = tmpdir.join('hash_ids.txt')
+
+    call_command('import_rankings', generate=3, output=str(path),
+                 assign=True, stdout=io.StringIO())
+
+    hash_ids = path.read().split()
+    assert len(hash_ids) == 3
+    for ranking in Ranking.objects.filter(hash_id__in=hash_ids):
+        assert ranking.rankingentry_set.count() == 40
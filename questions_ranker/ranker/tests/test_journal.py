@@ -0,0 +1,204 @@
+import fcntl
+import os
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+
+from ranker.assignment import assignment_entries
+from ranker.benchmarks import demographic_data, stage_data
+from ranker.journal import (
+    AlreadyApplying,
+    Journal,
+    apply_journal,
+    apply_pending,
+    get_journal,
+)
+from ranker.models import QuestionRankSummary, Ranking, RankingEntry
+from .factories import QuestionFactory, RankingFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def journal(settings, tmpdir):
+    settings.RANKER_JOURNAL_DIR = str(tmpdir)
+    return get_journal()
+
+
+@pytest.fixture
+def ranking():
+    ranking = RankingFactory(stage=1)
+    RankingEntry.objects.bulk_create(assignment_entries(
+        ranking.pk, [q.pk for q in QuestionFactory.create_batch(40)],
+    ))
+    return ranking
+
+
+def submit_stage(client, ranking, stage):
+    return client.post(reverse('rank_stage', args=[ranking.hash_id, stage]),
+                       stage_data(ranking.hash_id, stage))
+
+
+def apply_all(journal):
+    stats = {}
+    for stats in apply_journal(journal):
+        pass
+    return stats
+
+
+def test_submission_is_journaled(client, journal, ranking):
+    response = submit_stage(client, ranking, 2)
+
+    ranking.refresh_from_db()
+    assert response.url == reverse('rank_stage', args=[ranking.hash_id, 3])
+    assert ranking.stage == 1
+    assert not RankingEntry.objects.filter(rank__isnull=False).exists()
+    assert [r['stage'] for r in journal.pending(ranking.hash_id)] == [2]
+
+
+def test_pending_submissions_are_read(client, journal, ranking):
+    submit_stage(client, ranking, 2)
+
+    start = client.get(reverse('rank_start', args=[ranking.hash_id]))
+    page = client.get(reverse('rank_stage', args=[ranking.hash_id, 3]))
+    resubmitted = submit_stage(client, ranking, 2)
+
+    assert start.url == reverse('rank_stage', args=[ranking.hash_id, 3])
+    assert page.status_code == 200
+    assert resubmitted.url == reverse('rank_start', args=[ranking.hash_id])
+    assert len(journal.pending(ranking.hash_id)) == 1
+
+
+def test_journal_is_applied(client, journal, ranking):
+    submit_stage(client, ranking, 2)
+    submit_stage(client, ranking, 3)
+
+    stats = apply_all(journal)
+
+    ranking.refresh_from_db()
+    assert stats['applied'] == 2
+    assert ranking.stage == 3
+    assert ranking.rankingentry_set.filter(
+        rank=RankingEntry.IMPORTANT,
+    ).count() == 40
+    assert set(QuestionRankSummary.objects.values_list(
+        'important_count', flat=True)) == {1}
+    # everything applied, the journal starts over
+    assert os.path.getsize(journal.path) == 0
+    assert journal.checkpoint() == 0
+    assert journal.pending(ranking.hash_id) == []
+    assert os.listdir(journal.pending_directory) == []
+
+
+def test_pending_records_are_indexed_per_ranking(client, journal, ranking,
+                                                  monkeypatch):
+    other = RankingFactory(stage=1)
+    journal.append({'hash_id': other.hash_id, 'ranking': other.pk,
+                    'stage': 2, 'ranks': {}})
+    submit_stage(client, ranking, 2)
+    monkeypatch.setattr(Journal, 'records', None)
+
+    assert [r['stage'] for r in journal.pending(ranking.hash_id)] == [2]
+    assert [r['hash_id'] for r in journal.pending(other.hash_id)] == [
+        other.hash_id]
+
+
+def test_apply_pending_clears_index(client, journal, ranking):
+    submit_stage(client, ranking, 2)
+
+    apply_pending(ranking)
+
+    assert ranking.stage == 2
+    assert journal.pending(ranking.hash_id) == []
+
+
+def test_replay_after_crash_applies_nothing(client, journal, ranking):
+    submit_stage(client, ranking, 2)
+    submit_stage(client, ranking, 3)
+    for _ in apply_journal(journal):
+        # crash before the checkpoint: both records are applied again
+        journal.set_checkpoint(0)
+
+    stats = apply_all(journal)
+
+    assert stats['skipped'] == 2
+    assert set(QuestionRankSummary.objects.values_list(
+        'important_count', flat=True)) == {1}
+
+
+def test_duplicated_submissions_are_applied_once(journal, ranking):
+    data = stage_data(ranking.hash_id, 2)
+    record = {
+        'hash_id': ranking.hash_id, 'ranking': ranking.pk, 'stage': 2,
+        'ranks': {data['form-{}-id'.format(i)]: RankingEntry.IMPORTANT
+                  for i in range(20)},
+    }
+    journal.append(record)
+    journal.append(dict(record, ranks={
+        pk: RankingEntry.VIMPORTANT for pk in record['ranks']
+    }))
+
+    stats = apply_all(journal)
+
+    assert stats['applied'] == 1
+    assert stats['skipped'] == 1
+    assert set(ranking.rankingentry_set.filter(stage=1)
+                      .values_list('rank', flat=True)) == {
+        RankingEntry.IMPORTANT}
+
+
+def test_torn_record_is_skipped(tmpdir):
+    journal = Journal(str(tmpdir))
+    journal.append({'hash_id': 'a'})
+    with open(journal.path, 'a') as f:
+        # crash in the middle of a write
+        f.write('\n{"hash_id": "b", "rank')
+    journal.append({'hash_id': 'c'})
+
+    assert [r['hash_id'] for _, r in journal.records()] == ['a', 'c']
+
+
+def test_records_appended_later_are_left_for_next_read(tmpdir):
+    journal = Journal(str(tmpdir))
+    journal.append({'hash_id': 'a'})
+    journal.append({'hash_id': 'b'})
+
+    records = journal.records()
+    next(records)
+    journal.append({'hash_id': 'c'})
+
+    assert [r['hash_id'] for _, r in records] == ['b']
+    assert [r['hash_id'] for _, r in journal.records()] == ['a', 'b', 'c']
+
+
+def test_demographic_applies_pending_stage(client, journal, ranking):
+    submit_stage(client, ranking, 2)
+    submit_stage(client, ranking, 3)
+
+    response = client.post(
+        reverse('rank_demographic', args=[ranking.hash_id]),
+        demographic_data(),
+    )
+
+    ranking.refresh_from_db()
+    assert response.status_code == 302
+    assert ranking.stage == 4
+    assert ranking.rankingentry_set.filter(rank__isnull=False).count() == 40
+
+
+def test_single_applier(journal):
+    with open(journal.lock_path, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        with pytest.raises(AlreadyApplying):
+            apply_all(journal)
+
+
+def test_command(client, journal, ranking, capsys):
+    submit_stage(client, ranking, 2)
+
+    call_command('apply_journal', once=True)
+
+    assert Ranking.objects.get(pk=ranking.pk).stage == 2
+    assert 'Applied 1 and skipped 0' in capsys.readouterr().out
@@ -0,0 +1,144 @@
+import time
+
+import pytest
+from django.core.management import call_command
+from django.db import OperationalError
+
+from ranker import loadtest
+from ranker.loadtest import (
+    ClientDriver,
+    LoadTest,
+    create_rankings,
+    is_lock_error,
+    journey_email,
+)
+from ranker.models import DrawEntry, QuestionRankSummary, Ranking
+from ranker.summary import rebuild_summary
+
+# respondents run in their own threads, with their own connections; one
+# at a time, tables of in-memory SQLite database are locked by writers
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def summary_counts():
+    return dict(QuestionRankSummary.objects.values_list('question_id',
+                                                        'total_ranks'))
+
+
+def test_respondents_complete_survey(questions):
+    hash_ids = create_rankings(2)
+
+    rows = LoadTest(hash_ids, concurrency=1).run().report()
+
+    total = rows[-1]
+    assert total['view'] == 'total'
+    assert total['failed'] == 0
+    assert total['lock_errors'] == 0
+    assert total['journeys_per_s'] > 0
+    assert set(Ranking.objects.filter(hash_id__in=hash_ids)
+                              .values_list('stage', flat=True)) == {4}
+    assert set(DrawEntry.objects.values_list('email', flat=True)) == {
+        journey_email(hash_id) for hash_id in hash_ids}
+
+
+def test_concurrent_respondents_lock_errors(questions):
+    hash_ids = create_rankings(4)
+
+    test = LoadTest(hash_ids, concurrency=4).run()
+
+    total = test.report()[-1]
+    # a journey ends early on its only failure, which may be a lock error
+    # of the in-memory SQLite database only
+    assert total['failed'] == total['lock_errors']
+    assert total['server_errors'] == 0
+    assert (round(total['journeys_per_s'] * test.duration)
+            == len(hash_ids) - total['failed'])
+
+
+class RetryingDriver(ClientDriver):
+    """Driver sending requests failed on a lock error again, i.e. as if
+    the database waited for the lock."""
+
+    def request(self, method, url, data=None):
+        while True:
+            try:
+                return super().request(method, url, data)
+            except OperationalError as e:
+                # the request's transaction is rolled back
+                assert is_lock_error(e)
+                time.sleep(0.01)
+
+
+def test_concurrent_respondents(questions):
+    hash_ids = create_rankings(4)
+
+    rows = LoadTest(hash_ids, driver=RetryingDriver, concurrency=4,
+                    think_time=0.01, seed=0).run().report()
+
+    assert rows[-1]['failed'] == 0
+    assert set(Ranking.objects.filter(hash_id__in=hash_ids)
+                              .values_list('stage', flat=True)) == {4}
+    assert set(DrawEntry.objects.values_list('email', flat=True)) == {
+        journey_email(hash_id) for hash_id in hash_ids}
+    # concurrent updates of rank counts don't get lost
+    summaries = summary_counts()
+    rebuild_summary()
+    assert summary_counts() == summaries
+
+
+class RejectingDriver:
+    """Driver of a server showing every form again, i.e. with errors."""
+
+    def request(self, method, url, data=None):
+        return 200
+
+
+def test_rejected_submission_fails_journey(questions):
+    hash_ids = create_rankings(1)
+
+    rows = LoadTest(hash_ids, driver=RejectingDriver).run().report()
+
+    assert rows[-1]['failed'] == 1
+    assert rows[-1]['requests'] == 4
+    assert rows[-1]['journeys_per_s'] == 0
+
+
+def test_lock_errors():
+    assert is_lock_error(Exception("database is locked"))
+    assert is_lock_error(Exception("deadlock detected"))
+    assert not is_lock_error(Exception("division by zero"))
+
+
+def test_command_cleans_up(questions, capsys):
+    # a count left by a change made behind the summary's back, which a
+    # rebuild would reset
+    QuestionRankSummary.objects.filter(question=questions[0]).update(
+        total_ranks=7,
+    )
+    summaries = summary_counts()
+
+    call_command('loadtest', respondents=2, concurrency=1)
+
+    assert not Ranking.objects.exists()
+    assert not DrawEntry.objects.exists()
+    assert summary_counts() == summaries
+    assert 'view=total' in capsys.readouterr().out
+
+
+def test_command_keeps_real_draw_entries(questions, monkeypatch):
+    def create_rankings(count):
+        # real respondents enter the draw (or not) during the test
+        DrawEntry.objects.create(email='respondent@example.com', draw=True)
+        DrawEntry.objects.create()
+        return loadtest.create_rankings(count)
+
+    monkeypatch.setattr(
+        'ranker.management.commands.loadtest.create_rankings',
+        create_rankings,
+    )
+
+    call_command('loadtest', respondents=1, concurrency=1)
+
+    assert list(DrawEntry.objects.order_by('pk')
+                                 .values_list('email', flat=True)) == [
+        'respondent@example.com', '']
@@ -0,0 +1,98 @@
+import pytest
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+
+from questions_ranker.users.tests.factories import UserFactory
+
+# migrations run outside of the test transaction
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture
+def migrate():
+    """Migrate ranker app to given migration and return historical models
+    (as of that migration); migrate it forward again after the test."""
+    def migrate(name):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('ranker', name)])
+        return executor.loader.project_state(('ranker', name)).apps
+
+    yield migrate
+
+    executor = MigrationExecutor(connection)
+    executor.migrate(executor.loader.graph.leaf_nodes('ranker'))
+
+
+def create_questions(apps, count):
+    Category = apps.get_model('ranker', 'Category')
+    Question = apps.get_model('ranker', 'Question')
+    author_id = UserFactory().pk
+    category = Category.objects.create(name="Category", author_id=author_id)
+    return [
+        Question.objects.create(content="Question {}".format(i),
+                                category=category, author_id=author_id)
+        for i in range(count)
+    ]
+
+
+def test_duplicate_entries_are_removed(migrate):
+    apps = migrate('0009_auto_20181025_1759')
+    Ranking = apps.get_model('ranker', 'Ranking')
+    RankingEntry = apps.get_model('ranker', 'RankingEntry')
+    first, second = create_questions(apps, 2)
+    ranking = Ranking.objects.create(hash_id='abc')
+    unranked = [
+        RankingEntry.objects.create(ranking=ranking, question=first, stage=1)
+        for _ in range(2)
+    ]
+    RankingEntry.objects.create(ranking=ranking, question=second, stage=1)
+    ranked = RankingEntry.objects.create(ranking=ranking, question=second,
+                                         stage=2, rank='important')
+
+    apps = migrate('0010_rankingentry_unique_question')
+
+    RankingEntry = apps.get_model('ranker', 'RankingEntry')
+    assert set(RankingEntry.objects.values_list('pk', flat=True)) == {
+        unranked[0].pk, ranked.pk}
+
+
+def test_integer_codes(migrate):
+    apps = migrate('0012_questiondemographicsummary')
+    Ranking = apps.get_model('ranker', 'Ranking')
+    RankingEntry = apps.get_model('ranker', 'RankingEntry')
+    first, second, third = create_questions(apps, 3)
+    ranking = Ranking.objects.create(
+        hash_id='abc', teaching_students='hundreds',
+        daily_broadband='quertertothree', comp_research_involvement='primary',
+    )
+    for question, rank in ((first, 'vunimportant'),
+                           (second, 'dont_understand'), (third, None)):
+        RankingEntry.objects.create(ranking=ranking, question=question,
+                                    stage=1, rank=rank)
+
+    apps = migrate('0013_integer_codes')
+
+    Ranking = apps.get_model('ranker', 'Ranking')
+    RankingEntry = apps.get_model('ranker', 'RankingEntry')
+    answers = Ranking.objects.values().get()
+    assert answers['teaching_students'] == 3
+    assert answers['daily_broadband'] == 3
+    assert answers['comp_research_involvement'] == 5
+    # not answered yet
+    assert answers['teaching_adults'] is None
+    assert list(RankingEntry.objects.order_by('question_id')
+                                    .values_list('rank', flat=True)) == [
+        1, 6, None]
+
+    apps = migrate('0012_questiondemographicsummary')
+
+    Ranking = apps.get_model('ranker', 'Ranking')
+    RankingEntry = apps.get_model('ranker', 'RankingEntry')
+    answers = Ranking.objects.values().get()
+    assert answers['teaching_students'] == 'hundreds'
+    assert answers['daily_broadband'] == 'quertertothree'
+    assert answers['comp_research_involvement'] == 'primary'
+    assert answers['teaching_adults'] == ''
+    assert list(RankingEntry.objects.order_by('question_id')
+                                    .values_list('rank', flat=True)) == [
+        'vunimportant', 'dont_understand', None]
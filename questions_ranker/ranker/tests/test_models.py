@@ -0,0 +1,81 @@
+import pytest
+
+from ranker.models import DrawEntry, Ranking, RankingEntry
+from .factories import QuestionFactory, RankingFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class TestRankingQuerySet:
+
+    def test_advance_stage_in_single_query(self, django_assert_num_queries):
+        ranking = RankingFactory(stage=3)
+
+        with django_assert_num_queries(1):
+            advanced = Ranking.objects.advance_stage(ranking.pk, 4,
+                                                     daily_broadband=2)
+
+        updated = Ranking.objects.get(pk=ranking.pk)
+        assert advanced
+        assert updated.stage == 4
+        assert updated.daily_broadband == 2
+        assert updated.last_updated_at > ranking.last_updated_at
+
+    def test_advance_stage_only_from_previous_stage(self):
+        ranking = RankingFactory(stage=2)
+
+        assert not Ranking.objects.advance_stage(ranking.pk, 2)
+        assert not Ranking.objects.advance_stage(ranking.pk, 4,
+                                                 daily_broadband=2)
+        ranking.refresh_from_db()
+        assert ranking.stage == 2
+        assert ranking.daily_broadband is None
+
+
+class TestRankingEntryQuerySet:
+
+    def test_set_ranks_in_single_query(self, django_assert_num_queries):
+        ranking = RankingFactory()
+        entries = [
+            RankingEntry.objects.create(ranking=ranking, question=question,
+                                        stage=1)
+            for question in QuestionFactory.create_batch(3)
+        ]
+        ranks = {
+            entries[0].pk: RankingEntry.IMPORTANT,
+            entries[1].pk: RankingEntry.VUNIMPORTANT,
+            entries[2].pk: RankingEntry.IMPORTANT,
+        }
+
+        with django_assert_num_queries(1):
+            updated = RankingEntry.objects.set_ranks(ranks)
+
+        assert updated == 3
+        assert dict(
+            RankingEntry.objects.values_list('pk', 'rank')
+        ) == ranks
+
+    def test_set_ranks_limited_to_queryset(self):
+        ranking, other = RankingFactory.create_batch(2)
+        question = QuestionFactory()
+        entry = RankingEntry.objects.create(ranking=ranking,
+                                            question=question, stage=1)
+        other_entry = RankingEntry.objects.create(ranking=other,
+                                                  question=question, stage=1)
+
+        updated = ranking.rankingentry_set.set_ranks({
+            entry.pk: RankingEntry.IMPORTANT,
+            other_entry.pk: RankingEntry.IMPORTANT,
+        })
+
+        other_entry.refresh_from_db()
+        assert updated == 1
+        assert other_entry.rank is None
+
+
+def test_models_without_receivers_are_fast_deleted(django_assert_num_queries):
+    DrawEntry.objects.bulk_create([DrawEntry(), DrawEntry()])
+
+    # a single DELETE, no SELECT of rows to send signals for
+    with django_assert_num_queries(1):
+        DrawEntry.objects.all().delete()
@@ -0,0 +1,77 @@
+import pytest
+from django.contrib.auth.models import AnonymousUser, Permission
+from django.template import engines
+from django.test import RequestFactory
+from django.urls import reverse
+
+from questions_ranker.users.tests.factories import UserFactory
+from ranker.templatetags import navigation
+
+pytestmark = pytest.mark.django_db
+
+PERMED = ('{% load navigation %}'
+          '{% navbar_element_permed "Questions" "home" "ranker.change_question" %}')
+
+
+def render(template, user=None, path='/'):
+    request = RequestFactory().get(path)
+    request.user = user or AnonymousUser()
+    return engines['django'].from_string(template).render({}, request)
+
+
+def test_navbar_element_marks_active_link():
+    html = render('{% load navigation %}{% navbar_element "Home" "home" %}',
+                  path=reverse('home'))
+
+    assert 'nav-item active' in html
+    assert 'href="{}"'.format(reverse('home')) in html
+
+
+def test_navbar_element_url():
+    html = render('{% load navigation %}'
+                  '{% navbar_element_url "About" "/about/" True %}')
+
+    assert html.startswith('<a class="dropdown-item')
+    assert 'active' not in html
+
+
+def test_navbar_element_permed_disables_link():
+    assert 'disabled' in render(PERMED)
+
+
+def test_navbar_element_permed_enables_link():
+    user = UserFactory()
+    user.user_permissions.add(
+        Permission.objects.get(codename='change_question'),
+    )
+
+    assert 'disabled' not in render(PERMED, user)
+
+
+def test_permissions_are_checked_once_per_request(monkeypatch):
+    user = UserFactory()
+    checked = []
+    monkeypatch.setattr(user, 'has_perm', checked.append)
+
+    html = render(PERMED * 3, user)
+
+    assert html.count('disabled') == 3
+    assert checked == ['ranker.change_question']
+
+
+def test_reverse_is_memoized():
+    navigation.memoized_reverse.cache_clear()
+
+    render('{% load navigation %}{% navbar_element "Home" "home" %}' * 2)
+
+    info = navigation.memoized_reverse.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+
+def test_navbar_element_without_request():
+    # e.g. in the server error page
+    html = engines['django'].from_string(
+        '{% load navigation %}{% navbar_element "Home" "home" %}',
+    ).render({})
+
+    assert 'active' not in html
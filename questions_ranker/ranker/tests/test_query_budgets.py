@@ -0,0 +1,92 @@
+"""Query budgets of the survey views.
+
+The whole respondent journey is replayed against `actual_data_fixture.json`
+questions; every request must stay within its budget of SQL queries.  Set
+`RANKER_QUERY_BUDGET_REPORT` environment variable to a file path to get the
+measurements (queries and wall time per request) as JSON."""
+import json
+import os
+
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+
+from questions_ranker.users.tests.factories import UserFactory
+from ranker.benchmarks import run_journey
+from ranker.models import Ranking, RankingEntry
+from ranker.sampling import active_question_ids
+
+pytestmark = pytest.mark.django_db
+
+# (view, stage, method, valid) -> max. number of queries; counts include
+# savepoints of the test transaction, request transaction and view's own
+# `transaction.atomic` (`rank_start` opts out of the request transaction)
+QUERY_BUDGETS = {
+    ('home', None, 'GET', True): 2,
+    ('rank_start', 0, 'GET', True): 6,
+    ('rank_email', 1, 'GET', True): 4,
+    ('rank_email', 1, 'POST', False): 4,
+    ('rank_email', 1, 'POST', True): 5,
+    ('rank_stage', 2, 'GET', True): 4,
+    ('rank_stage', 2, 'POST', False): 4,
+    ('rank_stage', 2, 'POST', True): 7,
+    ('rank_stage', 3, 'GET', True): 4,
+    ('rank_stage', 3, 'POST', False): 4,
+    ('rank_stage', 3, 'POST', True): 7,
+    ('rank_demographic', 4, 'GET', True): 3,
+    ('rank_demographic', 4, 'POST', False): 3,
+    ('rank_demographic', 4, 'POST', True): 4,
+    ('rank_start', 5, 'GET', True): 3,
+}
+
+
+@pytest.fixture
+def actual_data():
+    # questions and categories in the fixture are authored by user #1
+    UserFactory(pk=1)
+    call_command(
+        'loaddata', str(settings.ROOT_DIR.path('actual_data_fixture.json')),
+        verbosity=0,
+    )
+
+
+@pytest.fixture
+def journey(client, actual_data):
+    ranking = Ranking.objects.create(hash_id='budget')
+    # measure steady state: the sampler snapshot is loaded once per process
+    active_question_ids.get()
+    records = run_journey(client, ranking.hash_id)
+
+    report = os.environ.get('RANKER_QUERY_BUDGET_REPORT')
+    if report:
+        with open(report, 'w') as f:
+            json.dump(records, f, indent=2)
+    return records
+
+
+def test_journey_completes(journey):
+    ranking = Ranking.objects.get(hash_id='budget')
+
+    assert ranking.stage == 4
+    assert ranking.rankingentry_set.filter(
+        rank=RankingEntry.IMPORTANT,
+    ).count() == 40
+    assert [r['status'] for r in journey if r['valid']] == [
+        200, 200, 200, 302, 200, 302, 200, 302, 200, 302, 200,
+    ]
+    assert all(r['status'] == 200 for r in journey if not r['valid'])
+
+
+def test_every_request_is_within_budget(journey):
+    measured = {
+        (r['view'], r['stage'], r['method'], r['valid']): r['queries']
+        for r in journey
+    }
+
+    assert measured.keys() == QUERY_BUDGETS.keys()
+    over_budget = {
+        key: (queries, QUERY_BUDGETS[key])
+        for key, queries in measured.items()
+        if queries > QUERY_BUDGETS[key]
+    }
+    assert not over_budget
@@ -0,0 +1,72 @@
+import pytest
+from django.db import transaction
+
+from ranker.benchmarks import sampler_benchmark
+from ranker.cache import state_cache
+from ranker.sampling import VERSION_CACHE_KEY, ActiveQuestionIds
+from .factories import QuestionFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class TestActiveQuestionIds:
+
+    def test_sample_returns_distinct_active_ids(self):
+        active = {q.pk for q in QuestionFactory.create_batch(45)}
+        inactive = {q.pk for q in QuestionFactory.create_batch(5, active=False)}
+        sampler = ActiveQuestionIds()
+
+        ids = sampler.sample(2*20)
+
+        assert len(ids) == len(set(ids)) == 40
+        assert set(ids) <= active
+        assert not set(ids) & inactive
+
+    def test_not_enough_questions(self):
+        QuestionFactory.create_batch(39)
+        sampler = ActiveQuestionIds()
+
+        with pytest.raises(ValueError):
+            sampler.sample(2*20)
+
+    def test_snapshot_is_reused(self, django_assert_num_queries):
+        QuestionFactory.create_batch(3)
+        sampler = ActiveQuestionIds()
+        sampler.get()
+
+        with django_assert_num_queries(0):
+            sampler.sample(3)
+
+    # snapshots are invalidated once the change is committed
+    @pytest.mark.django_db(transaction=True)
+    def test_deactivating_question_invalidates_snapshot(self):
+        questions = QuestionFactory.create_batch(3)
+        sampler = ActiveQuestionIds()
+        assert len(sampler.get()) == 3
+
+        questions[0].active = False
+        questions[0].save()
+
+        assert list(sampler.get()) == [questions[1].pk, questions[2].pk]
+
+    @pytest.mark.django_db(transaction=True)
+    def test_snapshot_is_invalidated_after_commit(self):
+        question = QuestionFactory()
+        sampler = ActiveQuestionIds()
+        sampler.get()
+        version = state_cache().get(VERSION_CACHE_KEY)
+
+        with transaction.atomic():
+            question.active = False
+            question.save()
+            assert state_cache().get(VERSION_CACHE_KEY) == version
+
+        assert state_cache().get(VERSION_CACHE_KEY) != version
+        assert list(sampler.get()) == []
+
+
+def test_sampler_benchmark():
+    results = sampler_benchmark(repeat=10, sizes=(100, 1000))
+
+    assert [row['size'] for row in results] == [100, 1000]
+    assert all(row['sampler_us'] > 0 for row in results)
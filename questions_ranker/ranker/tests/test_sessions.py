@@ -0,0 +1,54 @@
+import pytest
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import connection
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from questions_ranker.users.tests.factories import UserFactory
+from ranker.benchmarks import run_journey
+from ranker.sessions import NoSession, SessionFreeMiddleware
+from .factories import QuestionFactory, RankingFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def test_middleware_skips_survey_pages(rf):
+    middleware = SessionFreeMiddleware(lambda request: HttpResponse())
+    survey = rf.get('/rank/abc/', HTTP_COOKIE='sessionid=abc')
+    other = rf.get('/', HTTP_COOKIE='sessionid=abc')
+
+    middleware.process_request(survey)
+    middleware.process_request(other)
+
+    assert isinstance(survey.session, NoSession)
+    assert not survey.session.keys()
+    assert isinstance(other.session, SessionStore)
+
+
+def test_journey_doesnt_touch_sessions(client):
+    QuestionFactory.create_batch(45)
+    ranking = RankingFactory(stage=0)
+    # e.g. a researcher logged in to the admin
+    client.force_login(UserFactory())
+
+    with CaptureQueriesContext(connection) as queries:
+        records = run_journey(client, ranking.hash_id)
+
+    ranking.refresh_from_db()
+    assert ranking.stage == 4
+    assert all(record['status'] < 400 for record in records)
+    assert not [query for query in queries.captured_queries
+                if 'django_session' in query['sql']]
+
+
+def test_messages_are_carried_in_cookie(client):
+    ranking = RankingFactory(stage=0)
+
+    response = client.post(
+        reverse('rank_email', args=[ranking.hash_id]),
+        {'email': '', 'draw': False, 'paper': False}, follow=True,
+    )
+
+    assert 'Questions 1-20 (out of 40).' in response.content.decode()
+    assert 'sessionid' not in response.cookies
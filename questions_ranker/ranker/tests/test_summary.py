@@ -0,0 +1,133 @@
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+
+from ranker.models import QuestionRankSummary, RankingEntry
+from ranker.summary import (
+    rank_changes,
+    rebuild_summary,
+    removal_changes,
+    update_summary,
+)
+from .factories import QuestionFactory, RankingFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def summary_of(question):
+    return QuestionRankSummary.objects.filter(question=question).values(
+        'important_count', 'vimportant_count', 'total_ranks',
+    ).get()
+
+
+@pytest.fixture
+def entries():
+    question = QuestionFactory()
+    return [
+        RankingEntry.objects.create(ranking=ranking, question=question,
+                                    stage=1)
+        for ranking in RankingFactory.create_batch(3)
+    ]
+
+
+def state(entries):
+    return [(e.pk, e.question_id, e.rank) for e in entries]
+
+
+def test_rank_changes(entries):
+    entries[0].rank = RankingEntry.IMPORTANT
+    question_id = entries[0].question_id
+
+    changes = rank_changes(state(entries), {
+        entries[0].pk: RankingEntry.VIMPORTANT,
+        entries[1].pk: RankingEntry.VIMPORTANT,
+    })
+
+    assert +changes == {
+        (question_id, 'vimportant_count'): 2,
+        (question_id, 'total_ranks'): 1,
+    }
+    assert -changes == {(question_id, 'important_count'): 1}
+
+
+def test_update_summary_creates_missing_rows(entries):
+    question = entries[0].question
+    QuestionRankSummary.objects.all().delete()
+    ranks = {
+        entries[0].pk: RankingEntry.IMPORTANT,
+        entries[1].pk: RankingEntry.VIMPORTANT,
+    }
+
+    update_summary(rank_changes(state(entries), ranks))
+    update_summary(rank_changes(state(entries[2:]),
+                                {entries[2].pk: RankingEntry.IMPORTANT}))
+
+    assert summary_of(question) == {
+        'important_count': 2, 'vimportant_count': 1, 'total_ranks': 3,
+    }
+
+
+def test_update_summary_single_query(entries, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        update_summary(rank_changes(state(entries),
+                                    {entries[0].pk: RankingEntry.IMPORTANT}))
+
+
+def test_removal_changes(entries):
+    question = entries[0].question
+    RankingEntry.objects.set_ranks({
+        entries[0].pk: RankingEntry.IMPORTANT,
+        entries[1].pk: RankingEntry.VIMPORTANT,
+    })
+    rebuild_summary()
+    removed = RankingEntry.objects.filter(pk__in=[entries[0].pk,
+                                                  entries[2].pk])
+
+    update_summary(removal_changes(removed))
+    removed.delete()
+
+    assert summary_of(question) == {
+        'important_count': 0, 'vimportant_count': 1, 'total_ranks': 1,
+    }
+
+
+def test_rebuild_summary(entries):
+    question = entries[0].question
+    RankingEntry.objects.set_ranks({
+        entries[0].pk: RankingEntry.IMPORTANT,
+        entries[1].pk: RankingEntry.IMPORTANT,
+    })
+    unranked = QuestionFactory()
+    QuestionRankSummary.objects.filter(question=unranked).update(
+        total_ranks=5,
+    )
+
+    assert rebuild_summary() == 2
+    assert summary_of(unranked)['total_ranks'] == 0
+    assert summary_of(question) == {
+        'important_count': 2, 'vimportant_count': 0, 'total_ranks': 2,
+    }
+
+
+def test_rebuild_command(entries):
+    RankingEntry.objects.set_ranks({entries[0].pk: RankingEntry.VIMPORTANT})
+
+    call_command('rebuild_question_summary')
+
+    assert summary_of(entries[0].question)['vimportant_count'] == 1
+
+
+def test_admin_summary_page(admin_client, entries):
+    RankingEntry.objects.set_ranks({entries[0].pk: RankingEntry.VIMPORTANT})
+    rebuild_summary()
+    QuestionRankSummary.objects.filter(question=QuestionFactory()).delete()
+
+    response = admin_client.get(
+        reverse('admin:ranker_questionsummary_changelist'),
+    )
+
+    summary = {q.pk: q for q in response.context['summary']}
+    question = summary[entries[0].question_id]
+    assert response.status_code == 200
+    assert question.vimportant_count == question.total_ranks == 1
+    assert all(q.total_ranks == 0 for q in summary.values() if q != question)
@@ -0,0 +1,382 @@
+import threading
+import time
+
+import pytest
+from django.db import IntegrityError, OperationalError, connections
+from django.urls import reverse
+
+from ranker.assignment import assignment_entries
+from ranker.benchmarks import demographic_data, stage_data
+from ranker.loadtest import ThreadClient, is_lock_error
+from ranker.models import DrawEntry, QuestionRankSummary, Ranking, RankingEntry
+from ranker.sampling import active_question_ids
+from ranker.views import assign_questions
+from .factories import RankingFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class TestRankStart:
+
+    def test_first_visit_assigns_questions(self, client, questions):
+        ranking = RankingFactory()
+
+        response = client.get(reverse('rank_start', args=[ranking.hash_id]))
+
+        assert response.status_code == 200
+        assert ranking.rankingentry_set.filter(stage=1).count() == 20
+        assert ranking.rankingentry_set.filter(stage=2).count() == 20
+
+    def test_next_visit_keeps_questions(self, client, questions):
+        ranking = RankingFactory()
+        url = reverse('rank_start', args=[ranking.hash_id])
+        client.get(url)
+        entries = set(ranking.rankingentry_set.values_list('pk', flat=True))
+
+        client.get(url)
+
+        assert set(
+            ranking.rankingentry_set.values_list('pk', flat=True)
+        ) == entries
+
+    def test_first_visit_query_count(self, client, questions,
+                                     django_assert_num_queries):
+        ranking = RankingFactory()
+        url = reverse('rank_start', args=[ranking.hash_id])
+        active_question_ids.get()  # warm up sampler snapshot
+
+        # view transaction (savepoint, release), select ranking, check for
+        # entries with the lock held, insert entries
+        with django_assert_num_queries(5):
+            client.get(url)
+
+    def test_next_visit_query_count(self, client, questions,
+                                    django_assert_num_queries):
+        ranking = RankingFactory()
+        url = reverse('rank_start', args=[ranking.hash_id])
+        client.get(url)
+
+        # view transaction (savepoint, release), select ranking
+        with django_assert_num_queries(3):
+            client.get(url)
+
+    def test_completed_ranking_is_served_from_cache(
+            self, client, django_assert_num_queries):
+        ranking = RankingFactory(stage=4)
+        url = reverse('rank_start', args=[ranking.hash_id])
+        first = client.get(url)
+
+        with django_assert_num_queries(0):
+            response = client.get(url)
+
+        assert response.status_code == 200
+        assert response.content == first.content
+        assert b'Thank you very much' in response.content
+
+    def test_thankyou_page_shows_pending_messages(self, client):
+        completed = RankingFactory(stage=4)
+        url = reverse('rank_start', args=[completed.hash_id])
+        client.get(url)  # thank-you page is cached now
+        ranking = RankingFactory(stage=3)
+        message = 'Thank you for completing last stage'
+
+        # `rank_demographic` leaves a message for the thank-you page
+        response = client.post(
+            reverse('rank_demographic', args=[ranking.hash_id]),
+            demographic_data(), follow=True,
+        )
+
+        assert message in response.content.decode()
+        assert message not in client.get(url).content.decode()
+
+    def test_reopened_ranking_isnt_served_from_cache(self, client,
+                                                     questions):
+        ranking = RankingFactory(stage=4)
+        url = reverse('rank_start', args=[ranking.hash_id])
+        client.get(url)
+
+        ranking.stage = 0
+        ranking.save()
+        response = client.get(url)
+
+        assert b'Click here to start' in response.content
+
+    def test_deleted_ranking_isnt_served_from_cache(self, client):
+        ranking = RankingFactory(stage=4)
+        url = reverse('rank_start', args=[ranking.hash_id])
+        client.get(url)
+
+        ranking.delete()
+
+        assert client.get(url).status_code == 404
+
+    def test_assigned_once_when_visited_concurrently(self, questions):
+        ranking = RankingFactory()
+        assign_questions(ranking)
+        entries = set(ranking.rankingentry_set.values_list('pk', flat=True))
+
+        # a visit which read `has_entries` before the first one committed
+        assign_questions(ranking)
+
+        assert set(
+            ranking.rankingentry_set.values_list('pk', flat=True)
+        ) == entries
+
+    def test_not_enough_questions(self, client):
+        ranking = RankingFactory()
+
+        response = client.get(reverse('rank_start', args=[ranking.hash_id]))
+
+        assert response.status_code == 404
+
+    def test_question_assigned_once(self, questions):
+        ranking = RankingFactory()
+        RankingEntry.objects.create(ranking=ranking, question=questions[0],
+                                    stage=1)
+
+        with pytest.raises(IntegrityError):
+            RankingEntry.objects.create(ranking=ranking,
+                                        question=questions[0], stage=2)
+
+
+class TestRankStage:
+
+    @pytest.fixture
+    def ranking(self, questions):
+        ranking = RankingFactory(stage=1)
+        RankingEntry.objects.bulk_create(
+            assignment_entries(ranking.pk, [q.pk for q in questions[:40]]),
+        )
+        return ranking
+
+    def test_renders_all_questions(self, client, ranking):
+        response = client.get(reverse('rank_stage', args=[ranking.hash_id, 2]))
+
+        content = response.content.decode()
+        assert response.status_code == 200
+        assert content.count('type="radio"') == 20 * 6
+        for entry in ranking.rankingentry_set.filter(stage=1):
+            assert entry.question.content in content
+            assert 'value="{}"'.format(entry.pk) in content
+
+    def test_invalid_submission_keeps_selected_ranks(self, client, ranking):
+        data = stage_data(ranking.hash_id, 2)
+        del data['form-3-rank']
+
+        response = client.post(
+            reverse('rank_stage', args=[ranking.hash_id, 2]), data,
+        )
+
+        content = response.content.decode()
+        assert response.status_code == 200
+        assert content.count('table-danger') == 1
+        assert content.count(' checked') == 19
+        assert not ranking.rankingentry_set.filter(rank__isnull=False).exists()
+
+    def test_submission_saves_ranks(self, client, ranking,
+                                    django_assert_num_queries):
+        url = reverse('rank_stage', args=[ranking.hash_id, 2])
+        data = stage_data(ranking.hash_id, 2)
+
+        # request transaction (savepoint and release), select ranking,
+        # select entries, update entries, update summary, update ranking
+        with django_assert_num_queries(7):
+            response = client.post(url, data)
+
+        ranking.refresh_from_db()
+        assert response.status_code == 302
+        assert ranking.stage == 2
+        assert set(
+            ranking.rankingentry_set.filter(stage=1)
+                                    .values_list('rank', flat=True)
+        ) == {RankingEntry.IMPORTANT}
+        assert not ranking.rankingentry_set.filter(
+            stage=2, rank__isnull=False,
+        ).exists()
+
+    def test_incomplete_submission_is_rejected(self, client, ranking):
+        data = stage_data(ranking.hash_id, 2)
+        data['form-TOTAL_FORMS'] = data['form-INITIAL_FORMS'] = 19
+
+        response = client.post(
+            reverse('rank_stage', args=[ranking.hash_id, 2]), data,
+        )
+
+        ranking.refresh_from_db()
+        assert response.status_code == 200
+        assert ranking.stage == 1
+
+    def test_entries_from_other_stage_are_rejected(self, client, ranking):
+        data = stage_data(ranking.hash_id, 2)
+        data['form-0-id'] = ranking.rankingentry_set.filter(stage=2)[0].pk
+
+        response = client.post(
+            reverse('rank_stage', args=[ranking.hash_id, 2]), data,
+        )
+
+        ranking.refresh_from_db()
+        assert response.status_code == 200
+        assert ranking.stage == 1
+        assert not ranking.rankingentry_set.filter(
+            rank__isnull=False,
+        ).exists()
+
+    def test_resubmission_isnt_saved_twice(self, client, ranking):
+        url = reverse('rank_stage', args=[ranking.hash_id, 2])
+        data = stage_data(ranking.hash_id, 2)
+        client.post(url, data)
+
+        response = client.post(url, data)
+
+        ranking.refresh_from_db()
+        assert response.status_code == 302
+        assert response.url == reverse('rank_start', args=[ranking.hash_id])
+        assert ranking.stage == 2
+        assert set(QuestionRankSummary.objects.filter(
+            important_count__gt=0,
+        ).values_list('important_count', flat=True)) == {1}
+
+
+class TestRankEmail:
+
+    def test_resubmission_isnt_saved_twice(self, client):
+        ranking = RankingFactory(stage=0)
+        url = reverse('rank_email', args=[ranking.hash_id])
+        data = {'email': 'a@example.org', 'draw': True, 'paper': False}
+        client.post(url, data)
+
+        response = client.post(url, data, follow=True)
+
+        assert DrawEntry.objects.count() == 1
+        assert "already been submitted" in response.content.decode()
+
+
+class TestRankDemographic:
+
+    def test_submission_saves_answers(self, client,
+                                      django_assert_num_queries):
+        ranking = RankingFactory(stage=3)
+        url = reverse('rank_demographic', args=[ranking.hash_id])
+
+        # request transaction (savepoint and release), select ranking,
+        # a single update of answers and stage
+        with django_assert_num_queries(4):
+            response = client.post(url, demographic_data())
+
+        ranking.refresh_from_db()
+        assert response.status_code == 302
+        assert ranking.stage == 4
+        assert all(getattr(ranking, field) == value
+                   for field, value in demographic_data().items())
+
+    def test_resubmission_isnt_saved_twice(self, client):
+        ranking = RankingFactory(stage=3)
+        url = reverse('rank_demographic', args=[ranking.hash_id])
+        client.post(url, demographic_data())
+        data = dict(demographic_data(), daily_broadband=4)
+
+        response = client.post(url, data)
+
+        ranking.refresh_from_db()
+        assert response.status_code == 302
+        assert ranking.daily_broadband == demographic_data()['daily_broadband']
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_submissions_of_stage():
+    ranking = RankingFactory(stage=0)
+    url = reverse('rank_email', args=[ranking.hash_id])
+    data = {'email': 'a@example.org', 'draw': True, 'paper': False}
+    submissions = 8
+    barrier = threading.Barrier(submissions)
+    redirects = []
+
+    def submit():
+        client = ThreadClient()
+        barrier.wait()
+        try:
+            while True:
+                try:
+                    response = client.post(url, data)
+                except OperationalError as e:
+                    # SQLite locks the database for writes; a lock error
+                    # means the stage wasn't submitted yet, so retry
+                    assert is_lock_error(e)
+                    time.sleep(0.01)
+                    continue
+                redirects.append(response.url)
+                return
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=submit) for _ in range(submissions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert Ranking.objects.get(pk=ranking.pk).stage == 1
+    assert DrawEntry.objects.count() == 1
+    assert sorted(redirects) == sorted(
+        [reverse('rank_stage', args=[ranking.hash_id, 2])]
+        + [reverse('rank_start', args=[ranking.hash_id])] * (submissions - 1)
+    )
+
+
+# stored results are saved on commit of the request transaction
+@pytest.mark.django_db(transaction=True)
+class TestSubmissionKeys:
+
+    def test_forms_carry_submission_keys(self, client, questions):
+        ranking = RankingFactory(stage=0)
+        client.get(reverse('rank_start', args=[ranking.hash_id]))
+        urls = [
+            reverse('rank_email', args=[ranking.hash_id]),
+            reverse('rank_stage', args=[ranking.hash_id, 2]),
+            reverse('rank_demographic', args=[ranking.hash_id]),
+        ]
+        for url, stage in zip(urls, (0, 1, 3)):
+            Ranking.objects.filter(pk=ranking.pk).update(stage=stage)
+            content = client.get(url).content.decode()
+            assert content.count('name="submission_key"') == 1
+
+    def test_repeated_submission_is_replayed(self, client,
+                                             django_assert_num_queries):
+        ranking = RankingFactory(stage=0)
+        url = reverse('rank_email', args=[ranking.hash_id])
+        data = {'email': 'a@example.org', 'draw': True, 'paper': False,
+                'submission_key': 'k' * 22}
+        first = client.post(url, data)
+
+        with django_assert_num_queries(0):
+            response = client.post(url, data)
+
+        assert response.status_code == 302
+        assert response.url == first.url
+        assert DrawEntry.objects.count() == 1
+
+    def test_rejected_submission_isnt_stored(self, client):
+        ranking = RankingFactory(stage=3)
+        url = reverse('rank_demographic', args=[ranking.hash_id])
+        data = dict(demographic_data(), submission_key='k' * 22)
+        incomplete = dict(data)
+        del incomplete['daily_broadband']
+
+        rejected = client.post(url, incomplete)
+        response = client.post(url, data)
+
+        ranking.refresh_from_db()
+        assert 'value="{}"'.format('k' * 22) in rejected.content.decode()
+        assert response.status_code == 302
+        assert ranking.stage == 4
+
+    def test_keys_are_per_ranking(self, client):
+        ranking, other = RankingFactory.create_batch(2, stage=0)
+        data = {'email': '', 'draw': False, 'paper': False,
+                'submission_key': 'k' * 22}
+        client.post(reverse('rank_email', args=[ranking.hash_id]), data)
+
+        client.post(reverse('rank_email', args=[other.hash_id]), data)
+
+        assert set(Ranking.objects.values_list('stage', flat=True)) == {1}
+        assert DrawEntry.objects.count() == 2
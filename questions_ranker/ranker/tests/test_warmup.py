@@ -0,0 +1,36 @@
+import io
+
+from django.core.management import call_command
+from django.template import engines
+
+from ranker.benchmarks import template_engine
+from ranker.warmup import page_contexts, precompile_templates, template_names
+
+
+def test_template_names():
+    directory = engines['django'].engine.dirs[0]
+
+    names = set(template_names(directory))
+
+    assert {'base.html', 'ranker/stage.html'} <= names
+
+
+def test_precompile_fills_cached_loader():
+    engine = template_engine(cached=True)
+    loader = engine.engine.template_loaders[0]
+
+    compiled = precompile_templates(engine)
+
+    assert compiled == len(set(template_names(engine.engine.dirs[0])))
+    assert len(loader.get_template_cache) == compiled
+
+
+def test_warm_templates_renders_every_page():
+    stdout = io.StringIO()
+
+    call_command('warm_templates', stdout=stdout)
+
+    output = stdout.getvalue()
+    for name, _ in page_contexts():
+        assert name in output
+    assert 'Templates are warm.' in output
@@ -1,8 +1,6 @@
-import random
-
 from django.contrib import messages
 from django.db import transaction
-from django.forms import modelformset_factory
+from django.db.models import Exists, OuterRef
 from django.http import Http404
 from django.shortcuts import (
     render,
@@ -21,10 +19,23 @@ from .models import (
 )
 
 from .forms import (
-    RankingEntryForm,
+    RankingEntryFormset,
     DrawEntryForm,
     RankingDemographicForm,
+    RANK_CHOICES,
+    ranking_rows,
+)
+from .assignment import assignment_entries, get_assignment_engine
+from .crosstab import COMPLETED_STAGE
+from .idempotency import form_submission_key, idempotent
+from .journal import (
+    apply_pending,
+    journal_enabled,
+    journal_ranks,
+    pending_stage,
 )
+from .pages import is_completed, mark_completed, render_thankyou
+from .summary import rank_changes, update_summary
 
 
 def home(request):
@@ -32,60 +43,72 @@ def home(request):
     return render(request, "pages/home.html")
 
 
-@transaction.atomic
+@transaction.non_atomic_requests
 def rank_start(request, hash_id):
     """Generate questions for the ranking; show [start] button.
     If the ranking is complete, show the thank-you page."""
+    # completed rankings never change, so they're served without the
+    # database (see `ranker.pages`)
+    if is_completed(hash_id):
+        return render_thankyou(request)
+    return start_ranking(request, hash_id)
+
+
+def get_started_ranking(hash_id):
+    """Return ranking `hash_id`, locked and annotated with `has_entries`,
+    with the stage including pending submissions (see `ranker.journal`)."""
+    # lock the ranking, so that concurrent first visits (e.g. two tabs)
+    # don't assign questions twice
     ranking = get_object_or_404(
-        Ranking.objects.prefetch_related('entries'),
+        Ranking.objects.select_for_update().annotate(
+            has_entries=Exists(
+                RankingEntry.objects.filter(ranking=OuterRef('pk')),
+            ),
+        ),
         hash_id=hash_id,
     )
+    ranking.stage = pending_stage(ranking)
+    return ranking
+
+
+def assign_questions(ranking):
+    """Pick questions and assign them to `ranking` (locked, see
+    `get_started_ranking`) unless it has some already."""
+    # `has_entries` may have been read before the lock was granted, i.e.
+    # before a concurrent first visit committed its assignment; a query
+    # made with the lock held sees it
+    if RankingEntry.objects.filter(ranking=ranking).exists():
+        return
+
+    try:
+        # choose 2*20 ids with the configured assignment engine
+        question_ids = get_assignment_engine().assign(2*20)
+    except ValueError:
+        raise Http404("Not enough questions to choose from.")
+
+    # questions in stages 1 and 2
+    # create M2M links (through-table entries) in a single query
+    RankingEntry.objects.bulk_create(
+        assignment_entries(ranking.pk, question_ids),
+    )
+
+
+@transaction.atomic
+def start_ranking(request, hash_id):
+    ranking = get_started_ranking(hash_id)
 
     # if ranking stage is >=4, show the "thank you" page
-    if ranking.stage >= 4:
-        context = {
-            'title': _("Thank you for participation"),
-            'page_header': _("Thank you!"),
-        }
-        return render(request, "ranker/thankyou.html", context)
+    if ranking.stage >= COMPLETED_STAGE:
+        mark_completed(hash_id)
+        return render_thankyou(request)
 
     elif ranking.stage > 0:
         next_stage = ranking.stage + 1
         return redirect(reverse('rank_stage',
                                 args=[hash_id, next_stage]))
 
-    if not ranking.rankingentry_set.all():
-        # pick questions at random and assign them to the user
-        q_ids = Question.objects.filter(active=True).values_list('pk', flat=True)
-
-        try:
-            # randomly choose 2*20 ids
-            random_ids = random.sample(list(q_ids), 2*20)
-        except ValueError:
-            raise Http404("Not enough questions to choose from.")
-
-        # questions in stage 1
-        # create an M2M link (through-table entry)
-        RankingEntry.objects.bulk_create([
-            RankingEntry(
-                ranking=ranking,
-                question_id=question_id,
-                rank=None,
-                stage=1,
-            )
-            for question_id in random_ids[:20]
-        ])
-        # questions in stage 2
-        # create an M2M link (through-table entry)
-        RankingEntry.objects.bulk_create([
-            RankingEntry(
-                ranking=ranking,
-                question_id=question_id,
-                rank=None,
-                stage=2,
-            )
-            for question_id in random_ids[20:]
-        ])
+    if not ranking.has_entries:
+        assign_questions(ranking)
 
     # show [start] button page
     context = {
@@ -96,24 +119,44 @@ def rank_start(request, hash_id):
     return render(request, "ranker/start.html", context)
 
 
+def already_submitted(request, hash_id):
+    """Respond to a submission of a stage that was submitted before (e.g. in
+    another tab, or by a retried request): nothing is saved, the respondent
+    continues from their current stage."""
+    messages.info(request, _("This page has already been submitted."))
+    return redirect(reverse('rank_start', args=[hash_id]))
+
+
+def get_stage_ranking(request, hash_id, stage):
+    """Return ranking `hash_id` if it's ready for `stage`, i.e. in the
+    previous stage, or `None` when `stage` was already submitted and this is
+    another submission.  Raise `Http404` otherwise."""
+    ranking = get_object_or_404(Ranking, hash_id=hash_id)
+    ranking.stage = pending_stage(ranking)
+    if request.method == "POST" and ranking.stage >= stage:
+        return None
+    if ranking.stage != stage - 1:
+        raise Http404("No Ranking matches the given query.")
+    return ranking
+
+
+@idempotent
 def rank_email(request, hash_id):
     """Display draw entry form, save potential email address in the database."""
     stage = 1
-    ranking = get_object_or_404(
-        Ranking,
-        hash_id=hash_id,
-        stage=stage - 1,
-    )
+    ranking = get_stage_ranking(request, hash_id, stage)
+    if ranking is None:
+        return already_submitted(request, hash_id)
 
     if request.method == "POST":
         form = DrawEntryForm(request.POST)
 
         if form.is_valid():
+            # increment stage in ranking, unless it was done concurrently
+            if not Ranking.objects.advance_stage(ranking.pk, stage):
+                return already_submitted(request, hash_id)
             # accept user entry
-            obj = form.save()
-            # increment stage in ranking
-            ranking.stage = stage
-            ranking.save()
+            form.save()
 
             messages.success(
                 request,
@@ -129,7 +172,9 @@ def rank_email(request, hash_id):
                            extra_tags="danger")
 
     else:
-        form = DrawEntryForm()
+        form = DrawEntryForm(
+            initial={'submission_key': form_submission_key(request)},
+        )
 
     page_header = _("Page {} of 4").format(1)
     questions_num = ranking.entries.count()
@@ -147,24 +192,28 @@ def rank_email(request, hash_id):
     return render(request, "ranker/email.html", context)
 
 
+@idempotent
 def rank_demographic(request, hash_id):
     """Display demographic questions form, save as part of ranking entry object."""
     stage = 4
-    ranking = get_object_or_404(
-        Ranking,
-        hash_id=hash_id,
-        stage=stage - 1,
-    )
+    ranking = get_stage_ranking(request, hash_id, stage)
+    if ranking is None:
+        return already_submitted(request, hash_id)
 
     if request.method == "POST":
         form = RankingDemographicForm(request.POST, instance=ranking)
 
         if form.is_valid():
-            # accept user entry
-            obj = form.save()
-            # increment stage in ranking
-            obj.stage = stage
-            obj.save()
+            # accept user entry and increment stage in ranking in a single
+            # query, writing only the answered (changed) columns
+            answers = {name: getattr(form.instance, name)
+                       for name in form.changed_data
+                       if name in form._meta.fields}
+            # the last stage may still be in the write-behind journal
+            apply_pending(ranking)
+            if not Ranking.objects.advance_stage(ranking.pk, stage,
+                                                 **answers):
+                return already_submitted(request, hash_id)
 
             messages.success(request,
                              _("Thank you for completing last stage of the ranking."))
@@ -178,7 +227,10 @@ def rank_demographic(request, hash_id):
                            extra_tags="danger")
 
     else:
-        form = RankingDemographicForm(instance=ranking)
+        form = RankingDemographicForm(
+            instance=ranking,
+            initial={'submission_key': form_submission_key(request)},
+        )
 
     page_header = _("Page {} of 4").format(4)
 
@@ -192,6 +244,7 @@ def rank_demographic(request, hash_id):
     return render(request, "ranker/demographic.html", context)
 
 
+@idempotent
 def rank_stage(request, hash_id, stage):
     """Show questionnaire for selected stage; validate stage number."""
     try:
@@ -208,36 +261,40 @@ def rank_stage(request, hash_id, stage):
     elif stage == 4:
         return redirect(reverse('rank_demographic', args=[hash_id]))
 
-    ranking = get_object_or_404(
-        Ranking.objects.prefetch_related('entries'),
-        hash_id=hash_id,
-        stage=stage - 1,
-    )
+    ranking = get_stage_ranking(request, hash_id, stage)
+    if ranking is None:
+        return already_submitted(request, hash_id)
 
     entries_stage = (
         ranking.rankingentry_set
             .filter(stage=ranking.stage)
             .select_related('question', 'question__category')
+            # ordered queryset is used by the formset as is, so its results
+            # fetched below are reused
+            .order_by('pk')
     )
     if not entries_stage:
         raise Http404("No questions matching this ranking.")
 
-    # build a Formset with initial questions
-    RankingEntryFormset = modelformset_factory(
-        RankingEntry,
-        form=RankingEntryForm,
-        extra=0, max_num=0,
-    )
-
     if request.method == "POST":
+        # validation overwrites ranks of the entries, remember current ones
+        # for the summary update
+        previous = [(e.pk, e.question_id, e.rank) for e in entries_stage]
         formset = RankingEntryFormset(request.POST, queryset=entries_stage)
 
         if formset.is_valid():
-            # accept user entries
-            formset.save()
-            # update ranking stage
-            ranking.stage = stage
-            ranking.save()
+            ranks = formset.ranks()
+            if journal_enabled():
+                # saved later, in batches (see `ranker.journal`)
+                journal_ranks(ranking, stage, ranks)
+            # update ranking stage first: ranks of a stage submitted
+            # concurrently must not be written (or counted) twice
+            elif not Ranking.objects.advance_stage(ranking.pk, stage):
+                return already_submitted(request, hash_id)
+            else:
+                # accept user entries, all in a single query
+                entries_stage.set_ranks(ranks)
+                update_summary(rank_changes(previous, ranks))
 
             if stage == 2:
                 messages.success(
@@ -275,8 +332,11 @@ def rank_stage(request, hash_id, stage):
         'title': _("Questions for Computing Education Researchers"),
         'hash_id': hash_id,
         'formset': formset,
+        'rows': ranking_rows(formset),
+        'rank_choices': RANK_CHOICES,
         'page_header': page_header,
         'stage': stage,
+        'submission_key': form_submission_key(request),
     }
 
     return render(request, "ranker/stage.html", context)
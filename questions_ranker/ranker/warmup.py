@@ -0,0 +1,90 @@
+"""Template precompilation and warm-up of survey pages.
+
+With `django.template.loaders.cached.Loader` (see production settings) every
+template is looked up and compiled once per process, on its first render.
+`precompile_templates` moves that cost to the startup of a process: it's run
+from `RankerConfig.ready()` when `RANKER_PRECOMPILE_TEMPLATES` is set.
+
+`warm_up_pages` additionally renders every ranker page once, which also
+compiles templates of third-party apps (e.g. crispy forms field templates)
+and fills the template fragment cache (see `ranker.pages`).  Pages are
+rendered with minimal contexts and no database queries.  It's available as
+`warm_templates` command.
+"""
+import os
+import time
+
+from django.template import engines
+from django.test import RequestFactory
+from django.utils.translation import ugettext as _
+
+from .forms import RANK_CHOICES, DrawEntryForm, RankingDemographicForm
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt')
+
+
+def template_names(directory):
+    """Yield names (relative paths) of all templates under `directory`."""
+    for root, _dirs, files in os.walk(directory):
+        for name in sorted(files):
+            if name.endswith(TEMPLATE_EXTENSIONS):
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, directory).replace(os.sep, '/')
+
+
+def precompile_templates(engine=None):
+    """Compile all templates found in `DIRS` of the Django template engine;
+    return number of compiled templates.
+
+    Compiled templates are kept only if the engine uses the cached loader."""
+    engine = engine or engines['django']
+    compiled = 0
+    for directory in engine.engine.dirs:
+        for name in template_names(directory):
+            engine.get_template(name)
+            compiled += 1
+    return compiled
+
+
+def page_contexts(hash_id='warmup'):
+    """Return (template name, context) pairs of every ranker page."""
+    base = {
+        'title': _("Questions for Computing Education Researchers"),
+        'hash_id': hash_id,
+    }
+    return [
+        ('ranker/start.html', dict(base, page_header=_("Survey"))),
+        ('ranker/email.html', dict(
+            base, form=DrawEntryForm(),
+            page_header=_("Page {} of 4").format(1),
+        )),
+        ('ranker/stage.html', dict(
+            base, rows=[], rank_choices=RANK_CHOICES, stage=2,
+            page_header=_("Page {} of 4").format(2),
+        )),
+        ('ranker/stage.html', dict(
+            base, rows=[], rank_choices=RANK_CHOICES, stage=3,
+            page_header=_("Page {} of 4").format(3),
+        )),
+        ('ranker/demographic.html', dict(
+            base, form=RankingDemographicForm(),
+            page_header=_("Page {} of 4").format(4),
+        )),
+        ('ranker/thankyou.html', {
+            'title': _("Thank you for participation"),
+            'page_header': _("Thank you!"),
+        }),
+    ]
+
+
+def warm_up_pages(engine=None):
+    """Render every ranker page once; return list of (template name, render
+    time in seconds) pairs."""
+    engine = engine or engines['django']
+    request = RequestFactory().get('/')
+    timings = []
+    for name, context in page_contexts():
+        start = time.perf_counter()
+        engine.get_template(name).render(context, request)
+        timings.append((name, time.perf_counter() - start))
+    return timings
@@ -1,43 +1,28 @@
-import csv
-from django.db import transaction
-from ranker.models import Category, Question, Ranking
+from ranker.assignment import preassign_questions
+from ranker.importing import hash_id_lines, import_hash_ids, import_questions
 from questions_ranker.users.models import User
 
 
-@transaction.atomic
 def bulk_add_questions(filename, update=False):
+    """Import questions from CSV file, see `ranker.importing`; return
+    import statistics."""
     admin = User.objects.get(username="admin")
-    with open(filename, 'r') as f:
-        reader = csv.DictReader(f, delimiter=',', quotechar='"')
-        results = []
-        for row in reader:
-            cat, _ = Category.objects.get_or_create(name=row['Category'],
-                                                    defaults=dict(author=admin))
-            if update:
-                res = Question.objects.filter(id=int(row['ID'])).update(
-                    category=cat,
-                    content=row['Question'],
-                    author=admin,
-                )
-            else:
-                res = Question.objects.create(
-                    id=int(row['ID']),
-                    content=row['Question'],
-                    category=cat,
-                    author=admin,
-                )
-            results.append(res)
-    return results
+    stats = {}
+    with open(filename, 'r', newline='') as f:
+        for stats in import_questions(f, admin, update=update):
+            pass
+    return stats
 
 
-@transaction.atomic
-def bulk_add_rankings(filename, update=False):
+def bulk_add_rankings(filename, update=False, assign=False):
+    """Create rankings from a file with one hash id per line, see
+    `ranker.importing`; return import statistics."""
+    stats = {}
     with open(filename, 'r') as f:
-        lines = f.readlines()
-        Ranking.objects.bulk_create(
-            [
-                Ranking(hash_id=line.strip(), stage=0)
-                for line in lines
-                if line
-            ]
-        )
+        for stats in import_hash_ids(hash_id_lines(f)):
+            pass
+    if assign:
+        # pre-assign questions, so that first visit is just a read
+        for _ in preassign_questions():
+            pass
+    return stats